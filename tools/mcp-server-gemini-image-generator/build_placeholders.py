@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Compute BlurHash, inline WebP previews and dominant colours for product images
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.lqip import build_placeholders
+from mcp_server_gemini_image_generator.utils import get_public_dir
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--public-dir", type=Path, default=None,
+                        help="Site public directory (default: repository public/)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompute images whose content is unchanged")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Compute without writing the collections")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    
+    public_dir = args.public_dir or get_public_dir()
+    print(f"🎨 Building image placeholders for {public_dir / 'data' / 'products.json'}")
+    print("=" * 60)
+    
+    counts = build_placeholders(public_dir, max_workers=args.workers, force=args.force, dry_run=args.dry_run)
+    
+    print(f"📊 {counts['images']} images: {counts['computed']} computed, "
+          f"{counts['unchanged']} unchanged, {counts['unreadable']} unreadable")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Build the prefix-sharded search index under public/data/search
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.search_index import build_search_index
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--public-dir", type=Path, default=None,
+                        help="Site public directory (default: repository public/)")
+    parser.add_argument("--force", action="store_true", help="Reindex every document")
+    args = parser.parse_args()
+    
+    print("🔎 Building search index")
+    print("=" * 60)
+    
+    stats = build_search_index(args.public_dir, force=args.force)
+    
+    print(f"📄 Documents: {stats['documents']} ({stats['reindexed']} reindexed)")
+    print(f"🧩 Shards: {stats['shards']}")
+    print(f"💾 Files written: {stats['written']}")
+
+if __name__ == "__main__":
+    main()
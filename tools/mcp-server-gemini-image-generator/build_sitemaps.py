@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Build sitemap.xml, image sitemaps and per-page JSON-LD from public/data
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.sitemap_builder import MAX_URLS_PER_SITEMAP, build_sitemaps
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--public-dir", type=Path, default=None,
+                        help="Site public directory (default: repository public/)")
+    parser.add_argument("--site-url", default=None,
+                        help="Absolute site origin (default: SITE_URL or https://newindiatimber.com)")
+    parser.add_argument("--max-urls", type=int, default=MAX_URLS_PER_SITEMAP, help="URLs per sitemap shard")
+    parser.add_argument("--force", action="store_true", help="Regenerate every JSON-LD document")
+    args = parser.parse_args()
+    
+    print("🗺️  Building sitemaps and structured data")
+    print("=" * 60)
+    
+    stats = build_sitemaps(args.public_dir, site_url=args.site_url, max_urls=args.max_urls, force=args.force)
+    
+    print(f"📄 Pages: {stats['pages']}")
+    print(f"🧩 Sitemaps: {stats['sitemaps']}")
+    print(f"🔖 JSON-LD regenerated: {stats['jsonld']}")
+    print(f"💾 Files written: {stats['written']}")
+
+if __name__ == "__main__":
+    main()
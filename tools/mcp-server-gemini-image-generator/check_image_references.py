@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Check that every image referenced in public/data exists and matches its metadata
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.image_references import check_image_references
+from mcp_server_gemini_image_generator.utils import get_public_dir
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--public-dir", type=Path, default=None,
+                        help="Site public directory (default: repository public/)")
+    parser.add_argument("--workers", type=int, default=16, help="Probe threads")
+    parser.add_argument("--json", action="store_true", help="Print issues as JSON")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    
+    public_dir = args.public_dir or get_public_dir()
+    references, issues = check_image_references(public_dir, max_workers=args.workers)
+    errors = [issue for issue in issues if issue.is_error]
+    
+    if args.json:
+        print(json.dumps([
+            {"kind": issue.kind, "source": issue.reference.source, "url": issue.reference.url, "detail": issue.detail}
+            for issue in issues
+        ], indent=2))
+    else:
+        print(f"🔍 Checked {len(references)} image references under {public_dir}")
+        print("=" * 60)
+        for issue in issues:
+            icon = "❌" if issue.is_error else "⚠️ "
+            print(f"{icon} {issue.kind}: {issue.reference.source} -> {issue.reference.url} ({issue.detail})")
+        print(f"📊 {len(errors)} errors, {len(issues) - len(errors)} warnings")
+    
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate generated images and products that share an image
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.phash_index import get_phash_index
+from mcp_server_gemini_image_generator.utils import get_public_dir
+
+OUTPUT_DIR = Path(__file__).parent / "generated-images"
+
+def product_image_owners(public_dir: Path) -> dict:
+    """Map resolved image paths to the ids of products that reference them"""
+    with open(public_dir / "data" / "products.json", "r", encoding="utf-8") as f:
+        products = json.load(f)
+
+    owners = {}
+    for product in products:
+        urls = [image.get("url") for image in product.get("images", [])]
+        urls.append(product.get("primaryImage"))
+        for url in filter(None, urls):
+            path = str((public_dir / url.lstrip("/")).resolve())
+            owners.setdefault(path, set()).add(product["id"])
+    return owners
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--max-distance", type=int, default=3,
+                        help="Largest Hamming distance (of 64 bits) treated as a duplicate")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes")
+    args = parser.parse_args()
+
+    public_dir = get_public_dir()
+    directories = [OUTPUT_DIR, public_dir / "generated-images", public_dir / "images" / "products"]
+
+    print("🔍 Near-duplicate image scan")
+    print("=" * 60)
+
+    index = get_phash_index(OUTPUT_DIR)
+    hashed = index.update(directories, max_workers=args.workers)
+    index.save()
+    print(f"📇 Indexed {len(index.paths)} images ({hashed} re-hashed)")
+
+    owners = product_image_owners(public_dir)
+
+    shared = {path: ids for path, ids in owners.items() if len(ids) > 1}
+    if shared:
+        print("\n⚠️  Images referenced by more than one product:")
+        for path, ids in sorted(shared.items()):
+            print(f"   {Path(path).name}: {', '.join(sorted(ids))}")
+
+    groups = index.find_duplicates(args.max_distance)
+    if not groups:
+        print("\n✅ No near-duplicate images found")
+        return
+
+    print(f"\n🧬 {len(groups)} groups of near-identical images:")
+    for group in groups:
+        products = set()
+        for path in group:
+            products |= owners.get(path, set())
+        suffix = f"  ← products: {', '.join(sorted(products))}" if len(products) > 1 else ""
+        print(f" • {len(group)} images{suffix}")
+        for path in group:
+            print(f"     {path}")
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,22 @@ Generate all remaining AI images and organize them properly
 import asyncio
 import os
 import sys
-import shutil
 from pathlib import Path
 
 # Add the src directory to Python path
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-from mcp_server_gemini_image_generator.kie_client import get_kie_client
-from mcp_server_gemini_image_generator.utils import save_image
+from mcp_server_gemini_image_generator.kie_client import close_kie_client, get_kie_client
+from mcp_server_gemini_image_generator.utils import save_image, get_public_dir
+from mcp_server_gemini_image_generator.blob_store import get_blob_store
+from mcp_server_gemini_image_generator.asset_registry import export_media_assets, get_asset_registry
 
 # Product configurations
 PRODUCTS = [
     {
         "name": "burma_teak_grade_a_timber",
+        "product_id": "burma-teak-grade-a-timber",
         "prompt": "Professional product photography of Burma Teak Grade A Timber, superior grain patterns, premium quality, workshop setting, commercial grade, high resolution"
     }
 ]
@@ -31,7 +33,7 @@ async def generate_all_remaining_images():
     print("=" * 60)
     
     # Check API key
-    if not os.environ.get("KIE_API_KEY"):
+    if not (os.environ.get("KIE_API_KEY") or os.environ.get("KIE_API_KEYS")):
         print("❌ KIE_API_KEY not set!")
         return False
     
@@ -45,14 +47,16 @@ async def generate_all_remaining_images():
             print(f"\n🚀 Generating {product['name']}...")
             print(f"📝 Prompt: {product['prompt']}")
             
-            image_data, image_url = await client.generate_image(
+            image_data, image_url, task_id = await client.generate_image(
                 prompt=product['prompt'],
                 output_format="png",
                 image_size="16:9"
             )
             
             filename = f"{product['name']}.png"
-            file_path = save_image(image_data, filename=filename, output_dir=str(output_dir))
+            file_path = save_image(image_data, filename=filename, output_dir=str(output_dir),
+                                   prompt=product['prompt'], provider="kie", task_id=task_id,
+                                   product_id=product['product_id'])
             
             print(f"✅ Generated: {file_path}")
             print(f"📊 Size: {len(image_data)} bytes")
@@ -63,12 +67,10 @@ async def generate_all_remaining_images():
         
         # Source and destination directories
         source_dir = Path(__file__).parent / "generated-images"
-        public_dir = Path(__file__).parent.parent / "public" / "generated-images"
-        images_dir = Path(__file__).parent.parent / "public" / "images" / "products"
-        
-        # Create destination directories
-        public_dir.mkdir(parents=True, exist_ok=True)
-        images_dir.mkdir(parents=True, exist_ok=True)
+        public_dir = get_public_dir() / "generated-images"
+        images_dir = get_public_dir() / "images" / "products"
+        store = get_blob_store(source_dir)
+        registry = get_asset_registry(source_dir)
         
         # List of all generated images
         all_images = [
@@ -80,22 +82,29 @@ async def generate_all_remaining_images():
             "burma_teak_grade_a_timber.png"
         ]
         
-        # Copy all images to both locations
+        # Store each image once and link it into both locations
         for image_name in all_images:
             source_file = source_dir / image_name
             if source_file.exists():
-                # Copy to public/generated-images
-                public_file = public_dir / image_name
-                shutil.copy2(source_file, public_file)
-                print(f"📋 Copied to public/generated-images/: {image_name}")
+                digest = store.put_file(source_file)
+                source = registry.find_by_path(source_file) or registry.register(source_file)
                 
-                # Copy to public/images/products
-                product_file = images_dir / image_name
-                shutil.copy2(source_file, product_file)
-                print(f"📋 Copied to public/images/products/: {image_name}")
+                for dest_dir, label in ((public_dir, "public/generated-images/"),
+                                        (images_dir, "public/images/products/")):
+                    published = store.publish(digest, dest_dir / image_name)
+                    registry.register(dest_dir / image_name, parent_id=source["id"], variant="published")
+                    if published:
+                        print(f"🔗 Linked to {label}: {image_name}")
+                    else:
+                        print(f"✔️  Up to date in {label}: {image_name}")
             else:
                 print(f"⚠️  Not found: {image_name}")
         
+        store.save_index()
+        exported = export_media_assets(registry)
+        if exported:
+            print(f"🗂️  Updated {exported} entries in media-assets.json")
+        
         print(f"\n🎉 All images generated and organized successfully!")
         print(f"📁 Generated images: {len(all_images)}")
         print(f"📂 Public directory: {public_dir}")
@@ -106,6 +115,8 @@ async def generate_all_remaining_images():
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
+    finally:
+        await close_kie_client()
 
 if __name__ == "__main__":
     asyncio.run(generate_all_remaining_images())
@@ -41,8 +41,10 @@ async def generate_timber_door_image():
     if not check_setup():
         return False
     
+    client = None
     try:
         from mcp_server_gemini_image_generator.kie_client import get_kie_client
+        from mcp_server_gemini_image_generator.utils import save_image
         
         print("\n🚀 Starting image generation...")
         
@@ -60,7 +62,7 @@ async def generate_timber_door_image():
         print(f"Prompt: {prompt[:100]}...")
         
         # Generate the image
-        image_data, image_url = await client.generate_image(
+        image_data, image_url, task_id = await client.generate_image(
             prompt=prompt,
             output_format="png",
             image_size="16:9"
@@ -74,9 +76,9 @@ async def generate_timber_door_image():
         output_dir = Path(__file__).parent.parent / "generated-images"
         output_dir.mkdir(exist_ok=True)
         
-        output_file = output_dir / "burma_teak_door.png"
-        with open(output_file, "wb") as f:
-            f.write(image_data)
+        output_file = Path(save_image(image_data, filename="burma_teak_door.png", output_dir=str(output_dir),
+                                      prompt=prompt, provider="kie", task_id=task_id,
+                                      product_id="burma-teak-door"))
         
         print(f"💾 Image saved to: {output_file}")
         print(f"📁 Full path: {output_file.absolute()}")
@@ -90,6 +92,9 @@ async def generate_timber_door_image():
         print("2. Ensure you have internet connection")
         print("3. Check KIE.ai service status")
         return False
+    finally:
+        if client is not None:
+            await client.close()
 
 def main():
     """Main function"""
@@ -12,7 +12,7 @@ from pathlib import Path
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-from mcp_server_gemini_image_generator.kie_client import get_kie_client
+from mcp_server_gemini_image_generator.kie_client import close_kie_client, get_kie_client
 from mcp_server_gemini_image_generator.utils import save_image
 
 async def generate_teak_hardwood_log_image():
@@ -22,7 +22,7 @@ async def generate_teak_hardwood_log_image():
     print("=" * 50)
     
     # Check API key
-    if not os.environ.get("KIE_API_KEY"):
+    if not (os.environ.get("KIE_API_KEY") or os.environ.get("KIE_API_KEYS")):
         print("❌ KIE_API_KEY not set!")
         return False
     
@@ -34,7 +34,7 @@ async def generate_teak_hardwood_log_image():
         prompt = "Professional product photography of premium Teak Hardwood Log, natural grain patterns, sustainable forestry, workshop background, high resolution, commercial quality"
         print(f"📝 Generating image for prompt: '{prompt}'")
         
-        image_data, image_url = await client.generate_image(
+        image_data, image_url, task_id = await client.generate_image(
             prompt=prompt,
             output_format="png",
             image_size="16:9"
@@ -45,7 +45,9 @@ async def generate_teak_hardwood_log_image():
         output_dir.mkdir(exist_ok=True)
         
         filename = f"teak_hardwood_log.png"
-        file_path = save_image(image_data, filename=filename, output_dir=str(output_dir))
+        file_path = save_image(image_data, filename=filename, output_dir=str(output_dir),
+                               prompt=prompt, provider="kie", task_id=task_id,
+                               product_id="hardwood-log-teak")
         
         print(f"✅ Image generated and saved to: {file_path}")
         print(f"🔗 Original image URL: {image_url}")
@@ -56,6 +58,8 @@ async def generate_teak_hardwood_log_image():
     except Exception as e:
         print(f"❌ Error generating image: {e}")
         return False
+    finally:
+        await close_kie_client()
 
 if __name__ == "__main__":
     asyncio.run(generate_teak_hardwood_log_image())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Queue-based catalog image generation
+
+Fill a shared job queue from products.json, then start as many workers as
+needed (in separate processes or on other hosts sharing the queue file):
+
+    python generate_worker.py enqueue
+    python generate_worker.py work --concurrency 4
+    python generate_worker.py status
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import sys
+import uuid
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.asset_registry import export_media_assets, get_asset_registry
+from mcp_server_gemini_image_generator.blob_store import get_blob_store
+from mcp_server_gemini_image_generator.catalog_jobs import load_catalog_jobs, template_jobs
+from mcp_server_gemini_image_generator.job_queue import JobQueue, get_job_queue
+from mcp_server_gemini_image_generator.utils import get_public_dir, save_image
+
+OUTPUT_DIR = Path(__file__).parent / "generated-images"
+
+async def heartbeat(queue: JobQueue, job_key: str, worker_id: str, lease_seconds: float) -> None:
+    """Keep a lease alive until cancelled; returns only when the lease is lost"""
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            if not await asyncio.to_thread(queue.heartbeat, job_key, worker_id, lease_seconds):
+                return
+        except sqlite3.OperationalError as e:
+            # e.g. "database is locked" while other workers write; try again next beat
+            print(f"⚠️  Heartbeat for {job_key} failed ({e}); retrying")
+
+async def run_uninterrupted(func, *args):
+    """Run func in a thread, waiting for it to finish even if cancelled
+
+    A thread cannot be stopped halfway, so a cancellation only propagates
+    once the call is done, as server.save_image_async does.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        while not task.done():
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                continue
+        raise
+
+def register_published(registry, source_path: str, published_path: Path, product_id: str) -> None:
+    """Record a published copy as a variant of the saved asset"""
+    source = registry.find_by_path(source_path)
+    registry.register(published_path, product_id=product_id,
+                      parent_id=source["id"] if source else None, variant="published")
+
+def store_image(store, registry, job, image_data: bytes, task_id: str):
+    """Save, store, publish and register a generated image; returns (path, sha256)"""
+    file_path = save_image(image_data, job.filename, str(OUTPUT_DIR), job.prompt, "kie", task_id, job.product_id)
+    digest = store.put_file(file_path)
+    published_path = get_public_dir() / "images" / "products" / job.filename
+    store.publish(digest, published_path)
+    register_published(registry, file_path, published_path, job.product_id)
+    return file_path, digest
+
+async def process_job(queue: JobQueue, client, store, registry, lease: dict, worker_id: str) -> None:
+    """Generate, store and publish the image for one leased job"""
+    from mcp_server_gemini_image_generator.kie_client import KIETaskFailedError
+
+    job = lease["job"]
+    task_id = lease["task_id"]
+
+    try:
+        if task_id:
+            print(f"🔁 Resuming {job.key} (task {task_id})")
+        else:
+            print(f"🚀 Generating {job.key}")
+            task_id = await client.create_task(
+                prompt=job.prompt,
+                output_format=job.output_format,
+                image_size=job.image_size
+            )
+            if not await asyncio.to_thread(queue.record_task, job.key, worker_id, task_id):
+                print(f"⚠️  Lease on {job.key} lost before task was recorded; abandoning")
+                return
+
+        image_data, image_url = await client.fetch_result(task_id)
+
+        # A lost lease must not leave the image half published
+        file_path, digest = await run_uninterrupted(store_image, store, registry, job, image_data, task_id)
+
+        result = {"path": file_path, "sha256": digest, "url": image_url, "taskId": task_id, "bytes": len(image_data)}
+        if await asyncio.to_thread(queue.complete, job.key, worker_id, result):
+            print(f"✅ {job.key}: {len(image_data)} bytes")
+        else:
+            print(f"⚠️  {job.key} finished after its lease was lost")
+
+    except KIETaskFailedError as e:
+        # The remote task is dead; the next attempt has to create a new one
+        print(f"❌ {job.key}: {e}")
+        await asyncio.to_thread(queue.fail, job.key, worker_id, str(e), task_failed=True)
+
+    except Exception as e:
+        # Timeouts, network, download and save errors keep the task for the next attempt
+        print(f"❌ {job.key}: {e}")
+        await asyncio.to_thread(queue.fail, job.key, worker_id, str(e))
+
+async def run_job(queue: JobQueue, client, store, registry, lease: dict, worker_id: str, lease_seconds: float) -> None:
+    """Process a leased job, stopping as soon as its lease is lost"""
+    job_key = lease["job"].key
+    job = asyncio.create_task(process_job(queue, client, store, registry, lease, worker_id))
+    beat = asyncio.create_task(heartbeat(queue, job_key, worker_id, lease_seconds))
+
+    try:
+        await asyncio.wait({job, beat}, return_when=asyncio.FIRST_COMPLETED)
+        if not job.done():
+            error = beat.exception()
+            if error is None:
+                print(f"⚠️  Lost lease on {job_key}; stopping (another worker may resume the task)")
+                job.cancel()
+            else:
+                # The lease is not known to be lost; finish the job without heartbeats
+                print(f"⚠️  Heartbeat for {job_key} stopped ({error}); finishing the job")
+        await asyncio.gather(job, return_exceptions=True)
+    finally:
+        beat.cancel()
+        job.cancel()
+        await asyncio.gather(beat, job, return_exceptions=True)
+
+async def worker_loop(queue: JobQueue, client, store, registry, worker_id: str, lease_seconds: float, idle_exit: bool) -> None:
+    """Lease and run jobs until the queue is drained"""
+    while True:
+        lease = await asyncio.to_thread(queue.lease, worker_id, lease_seconds)
+        if lease is None:
+            if idle_exit:
+                return
+            await asyncio.sleep(5)
+            continue
+        await run_job(queue, client, store, registry, lease, worker_id, lease_seconds)
+
+async def work(queue: JobQueue, concurrency: int, lease_seconds: float, idle_exit: bool) -> None:
+    """Run several job loops in this process"""
+    from mcp_server_gemini_image_generator.kie_client import get_kie_client
+
+    client = get_kie_client()
+    store = get_blob_store(OUTPUT_DIR)
+    registry = get_asset_registry(OUTPUT_DIR)
+    base_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    try:
+        await asyncio.gather(*(
+            worker_loop(queue, client, store, registry, f"{base_id}-{i}-{uuid.uuid4().hex[:6]}", lease_seconds, idle_exit)
+            for i in range(concurrency)
+        ))
+    finally:
+        await client.close()
+        store.save_index()
+        exported = export_media_assets(registry)
+        if exported:
+            print(f"🗂️  Updated {exported} entries in media-assets.json")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Queue-based catalog image generation")
+    parser.add_argument("--queue", type=Path, default=None,
+                        help="Queue file (default: JOB_QUEUE_PATH or generated-images/queue.sqlite3)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_cmd = commands.add_parser("enqueue", help="Add catalog jobs from products.json")
+    enqueue_cmd.add_argument("--reset", action="store_true", help="Re-queue jobs that already exist")
+    enqueue_cmd.add_argument("--styles", default=None,
+                             help="Comma-separated styles; builds the full template matrix instead of "
+                                  "using placeholder prompts (e.g. professional,minimalist)")
+
+    work_cmd = commands.add_parser("work", help="Process jobs from the queue")
+    work_cmd.add_argument("--concurrency", type=int, default=2, help="Concurrent jobs in this process")
+    work_cmd.add_argument("--lease-seconds", type=float, default=60.0, help="Lease length between heartbeats")
+    work_cmd.add_argument("--wait", action="store_true", help="Keep waiting for new jobs instead of exiting")
+
+    commands.add_parser("status", help="Show job counts by state")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.queue) if args.queue else get_job_queue(OUTPUT_DIR)
+
+    if args.command == "enqueue":
+        if args.styles:
+            jobs = template_jobs(styles=[style.strip() for style in args.styles.split(",") if style.strip()])
+        else:
+            jobs = load_catalog_jobs()
+        added = queue.enqueue(jobs, reset=args.reset)
+        print(f"📋 Queued {added} of {len(jobs)} catalog jobs in {queue.path}")
+
+    elif args.command == "work":
+        if not (os.environ.get("KIE_API_KEY") or os.environ.get("KIE_API_KEYS")):
+            print("❌ KIE_API_KEY not set!")
+            sys.exit(1)
+        asyncio.run(work(queue, args.concurrency, args.lease_seconds, idle_exit=not args.wait))
+
+    for state, count in queue.stats().items():
+        print(f"📊 {state}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Inspect and maintain the generated-image asset registry
+
+    python manage_assets.py find --product burma-teak-door
+    python manage_assets.py find --file public/images/products/burma-teak-door-villa.png
+    python manage_assets.py scan generated-images
+    python manage_assets.py export
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.asset_registry import AssetRegistry, export_media_assets, get_asset_registry
+from mcp_server_gemini_image_generator.blob_store import hash_file
+from mcp_server_gemini_image_generator.phash_index import IMAGE_EXTENSIONS
+
+OUTPUT_DIR = Path(__file__).parent / "generated-images"
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Inspect and maintain the asset registry",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__.split("\n\n", 1)[1])
+    parser.add_argument("--registry", type=Path, default=None,
+                        help="Registry file (default: ASSET_REGISTRY_PATH or generated-images/assets.sqlite3)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    find_cmd = commands.add_parser("find", help="Look up assets")
+    lookup = find_cmd.add_mutually_exclusive_group(required=True)
+    lookup.add_argument("--id")
+    lookup.add_argument("--product")
+    lookup.add_argument("--hash")
+    lookup.add_argument("--prompt")
+    lookup.add_argument("--task")
+    lookup.add_argument("--file", type=Path, help="Find assets with the same content as this file")
+
+    scan_cmd = commands.add_parser("scan", help="Register image files that are not yet recorded")
+    scan_cmd.add_argument("directories", nargs="+", type=Path)
+
+    commands.add_parser("export", help="Merge published assets into public/data/media-assets.json")
+    commands.add_parser("prune", help="Forget assets whose files no longer exist")
+
+    args = parser.parse_args()
+    registry = AssetRegistry(args.registry) if args.registry else get_asset_registry(OUTPUT_DIR)
+
+    if args.command == "find":
+        if args.id:
+            assets = [a for a in [registry.get(args.id)] if a]
+        elif args.product:
+            assets = registry.find_by_product(args.product)
+        elif args.hash:
+            assets = registry.find_by_hash(args.hash)
+        elif args.prompt:
+            assets = registry.find_by_prompt(args.prompt)
+        elif args.task:
+            assets = registry.find_by_task(args.task)
+        else:
+            assets = registry.find_by_hash(hash_file(args.file))
+        print(json.dumps(assets, indent=2, ensure_ascii=False))
+        print(f"📊 {len(assets)} assets", file=sys.stderr)
+
+    elif args.command == "scan":
+        added = 0
+        for directory in args.directories:
+            for path in sorted(directory.rglob("*")):
+                if path.suffix.lower() in IMAGE_EXTENSIONS and path.is_file() and not path.name.startswith("."):
+                    if registry.find_by_path(path) is None:
+                        registry.register(path)
+                        added += 1
+        print(f"✅ Registered {added} new files")
+
+    elif args.command == "export":
+        print(f"🗂️  Updated {export_media_assets(registry)} entries in media-assets.json")
+
+    elif args.command == "prune":
+        print(f"🧹 Removed {registry.prune_missing()} missing assets")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Evict old and least recently used generated images to stay within a quota
+
+Files referenced from products.json or by registered product assets are kept.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.asset_registry import AssetRegistry, get_asset_registry_path
+from mcp_server_gemini_image_generator.storage_manager import StorageManager, parse_size
+
+OUTPUT_DIR = Path(__file__).parent / "generated-images"
+
+def format_bytes(size: int) -> str:
+    """Human-readable byte count"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help="Generated images directory (default: OUTPUT_IMAGE_PATH or generated-images)")
+    parser.add_argument("--max-size", type=parse_size, default=None,
+                        help="Size quota, e.g. 5G (default: OUTPUT_MAX_BYTES)")
+    parser.add_argument("--max-age-days", type=float, default=None,
+                        help="Evict files unused for longer than this (default: OUTPUT_MAX_AGE_DAYS)")
+    parser.add_argument("--archive", action="store_true",
+                        help="Keep evicted PNGs as lossless WebP under .archive/")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would be evicted")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    
+    output_dir = args.output_dir or Path(os.environ.get("OUTPUT_IMAGE_PATH", OUTPUT_DIR))
+    registry_path = get_asset_registry_path(output_dir)
+    registry = AssetRegistry(registry_path) if registry_path.exists() else None
+    manager = StorageManager(output_dir, registry, max_bytes=args.max_size, max_age_days=args.max_age_days)
+    
+    if manager.max_bytes is None and manager.max_age_days is None:
+        print("❌ No quota set; use --max-size/--max-age-days or OUTPUT_MAX_BYTES/OUTPUT_MAX_AGE_DAYS")
+        sys.exit(1)
+    
+    plan = manager.plan()
+    print(f"💾 {output_dir}: {format_bytes(plan.total_bytes)} in use, {plan.protected} files protected")
+    print("=" * 60)
+    
+    for stored in plan.evict:
+        print(f"🗑️  {stored.path.relative_to(output_dir)} ({format_bytes(stored.size)})")
+    
+    if args.dry_run:
+        print(f"📊 Would evict {len(plan.evict)} files, leaving {format_bytes(plan.bytes_after)}")
+        return
+    
+    result = manager.apply(plan, archive=args.archive)
+    print(f"✅ Deleted {result['deleted']}, archived {result['archived']}, freed {format_bytes(result['freed'])}")
+
+if __name__ == "__main__":
+    main()
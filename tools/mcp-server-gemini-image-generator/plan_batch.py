@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Dry-run a catalog generation batch: predict calls, time and cost
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.batch_planner import (
+    find_cached_jobs,
+    load_latency_history,
+    plan_batch,
+)
+from mcp_server_gemini_image_generator.catalog_jobs import load_catalog_jobs, template_jobs
+from mcp_server_gemini_image_generator.job_queue import QueueReader, get_job_queue_path
+
+OUTPUT_DIR = Path(__file__).parent / "generated-images"
+
+def format_duration(seconds: float) -> str:
+    """Format seconds as h/m/s"""
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--queue", type=Path, default=None,
+                        help="Queue file with past runs (default: JOB_QUEUE_PATH or generated-images/queue.sqlite3)")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Provider requests per minute (default: KIE_RATE_LIMIT_RPM or 60)")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Highest concurrency to consider")
+    parser.add_argument("--cost-per-image", type=float, default=None,
+                        help="Price per generated image (default: KIE_COST_PER_IMAGE or 0.02)")
+    parser.add_argument("--styles", default=None,
+                        help="Comma-separated styles; plans the full template matrix instead of placeholder prompts")
+    args = parser.parse_args()
+
+    # Only read an existing queue; a dry run must not create or migrate one
+    queue_path = args.queue or get_job_queue_path(OUTPUT_DIR)
+    queue = QueueReader(queue_path) if queue_path.exists() else None
+    if args.styles:
+        jobs = template_jobs(styles=[style.strip() for style in args.styles.split(",") if style.strip()])
+    else:
+        jobs = load_catalog_jobs()
+    cached = find_cached_jobs(jobs, queue=queue)
+    history = load_latency_history(queue)
+
+    plan = plan_batch(
+        jobs,
+        cached_keys=cached,
+        latency_history=history,
+        rate_limit_per_minute=args.rate_limit,
+        max_concurrency=args.max_concurrency,
+        cost_per_image=args.cost_per_image,
+    )
+
+    print("🧮 Catalog Generation Plan (dry run)")
+    print("=" * 60)
+    print(f"📋 Jobs: {plan.total_jobs} total, {plan.cached_jobs} cached, {plan.remote_jobs} to generate")
+    source = f"{plan.latency_samples} past tasks" if plan.latency_samples else "default, no history"
+    print(f"⏱️  Task latency: mean {plan.mean_latency:.1f}s, p95 {plan.p95_latency:.1f}s ({source})")
+    print(f"📡 Remote calls: {plan.remote_calls} (~{plan.calls_per_job:.1f} per job)")
+    print(f"💰 Expected cost: {plan.expected_cost:.2f}")
+    print()
+    print(f"{'concurrency':>11}  {'wall clock':>10}  {'req/min':>8}")
+    for estimate in plan.estimates:
+        flag = "  (rate limited)" if estimate.rate_limited else ""
+        marker = "👉" if estimate is plan.recommended else "  "
+        print(f"{marker}{estimate.concurrency:>9}  {format_duration(estimate.wall_clock_seconds):>10}"
+              f"  {estimate.requests_per_minute:>8.1f}{flag}")
+    print()
+    print(f"✅ Recommended concurrency: {plan.recommended.concurrency} "
+          f"(~{format_duration(plan.recommended.wall_clock_seconds)})")
+
+if __name__ == "__main__":
+    main()
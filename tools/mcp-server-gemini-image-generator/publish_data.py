@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Publish public/data collections as minified, precompressed, content-hashed files
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.data_publisher import publish_collections
+from mcp_server_gemini_image_generator.utils import get_public_dir
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--public-dir", type=Path, default=None,
+                        help="Site public directory (default: repository public/)")
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help="Publish directory (default: public/data/published)")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompress every collection")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    
+    public_dir = args.public_dir or get_public_dir()
+    print(f"📦 Publishing collections from {public_dir / 'data'}")
+    print("=" * 60)
+    
+    result = publish_collections(public_dir, args.output_dir, force=args.force)
+    
+    for name in result["published"]:
+        print(f"📝 Published: {name}")
+    for name in result["removed"]:
+        print(f"🗑️  Removed: {name}")
+    print(f"✅ {len(result['published'])} published, {len(result['unchanged'])} unchanged")
+
+if __name__ == "__main__":
+    main()
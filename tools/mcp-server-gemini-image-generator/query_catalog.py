@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Query the public/data collections
+
+Example: active teak products serving Whitefield that still lack a real image
+
+    python query_catalog.py products category=teak serviceAreas=Whitefield \\
+        isActive=true hasRealImage=false
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.catalog import COLLECTION_FILES, Catalog
+
+def parse_filter(text: str) -> tuple:
+    """Parse field=value (or field=a,b for any-of) into a filter"""
+    field, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected field=value, got: {text}")
+    values = [json.loads(v) if v in ("true", "false", "null") else v for v in value.split(",")]
+    return field, values[0] if len(values) == 1 else values
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Query the public/data collections",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__.split("\n\n", 1)[1])
+    parser.add_argument("collection", choices=sorted(COLLECTION_FILES))
+    parser.add_argument("filters", nargs="*", type=parse_filter, help="field=value filters")
+    parser.add_argument("--sort", default=None, help="Field to sort by")
+    parser.add_argument("--desc", action="store_true", help="Sort descending")
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print full records as JSON")
+    args = parser.parse_args()
+
+    catalog = Catalog(collections=[args.collection])
+    result = catalog.query(args.collection, where=dict(args.filters), sort_by=args.sort,
+                           descending=args.desc, offset=args.offset, limit=args.limit)
+
+    if args.json:
+        print(json.dumps(result.items, indent=2, ensure_ascii=False))
+        return
+
+    for record in result.items:
+        print(f"{record.get('id')}\t{record.get('name') or record.get('title')}")
+    print(f"📊 {len(result.items)} of {result.total} matches")
+
+if __name__ == "__main__":
+    main()
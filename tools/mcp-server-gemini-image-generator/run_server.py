@@ -13,9 +13,9 @@ src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
 # Set up environment variables if not already set
-if not os.environ.get("GEMINI_API_KEY"):
+if not (os.environ.get("GEMINI_API_KEY") or os.environ.get("GEMINI_API_KEYS")):
     print("Warning: GEMINI_API_KEY not set")
-if not os.environ.get("KIE_API_KEY"):
+if not (os.environ.get("KIE_API_KEY") or os.environ.get("KIE_API_KEYS")):
     print("Warning: KIE_API_KEY not set")
 if not os.environ.get("OUTPUT_IMAGE_PATH"):
     output_path = Path(__file__).parent.parent / "generated-images"
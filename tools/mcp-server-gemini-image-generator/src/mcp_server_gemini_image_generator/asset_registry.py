@@ -0,0 +1,363 @@
+"""
+Registry of generated image assets
+
+Every saved image is recorded in a SQLite database with its content hash,
+location, size, dimensions and provenance (prompt, provider, task id,
+product). Derived files (published copies, resized or transcoded versions)
+are recorded as variants of their source asset. Lookups by id, path,
+product, hash, prompt and task id are served from indexes.
+
+Assets published under public/ are exported to ``media-assets.json`` in the
+shape of the site's ``MediaAsset`` type.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:
+    from .blob_store import hash_file
+    from .collection_store import CollectionStore
+    from .image_probe import probe_image, probe_image_bytes
+    from .utils import get_public_dir
+except ImportError:
+    from blob_store import hash_file
+    from collection_store import CollectionStore
+    from image_probe import probe_image, probe_image_bytes
+    from utils import get_public_dir
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mime_type TEXT,
+    width INTEGER,
+    height INTEGER,
+    product_id TEXT,
+    prompt TEXT,
+    prompt_hash TEXT,
+    provider TEXT,
+    task_id TEXT,
+    parent_id TEXT REFERENCES assets (id) ON DELETE SET NULL,
+    variant TEXT,
+    metadata TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_sha256 ON assets (sha256);
+CREATE INDEX IF NOT EXISTS assets_product ON assets (product_id);
+CREATE INDEX IF NOT EXISTS assets_prompt ON assets (prompt_hash);
+CREATE INDEX IF NOT EXISTS assets_task ON assets (task_id);
+CREATE INDEX IF NOT EXISTS assets_parent ON assets (parent_id);
+"""
+
+
+def prompt_hash(prompt: str) -> str:
+    """Key used to look assets up by prompt (whitespace-insensitive)."""
+    return hashlib.sha256(" ".join(prompt.split()).encode("utf-8")).hexdigest()
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class AssetRegistry:
+    """Indexed record of every generated image file."""
+
+    def __init__(self, path: Union[str, Path]):
+        """Open (and create if needed) a registry database.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        asset = dict(row)
+        asset["metadata"] = json.loads(asset["metadata"]) if asset["metadata"] else {}
+        return asset
+
+    def register(self,
+                 path: Union[str, Path],
+                 data: Optional[bytes] = None,
+                 product_id: Optional[str] = None,
+                 prompt: Optional[str] = None,
+                 provider: Optional[str] = None,
+                 task_id: Optional[str] = None,
+                 parent_id: Optional[str] = None,
+                 variant: Optional[str] = None,
+                 metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Record a file, or refresh the record if the path is already known.
+
+        Provenance fields that are not given keep their recorded values.
+
+        Args:
+            path: Image file
+            data: The file's bytes, if already in memory (avoids re-reading it)
+            product_id: Catalog product the image belongs to
+            prompt: Prompt the image was generated from
+            provider: Image provider, e.g. "kie" or "gemini"
+            task_id: Provider task id
+            parent_id: Asset this file was derived from
+            variant: Kind of derivative, e.g. "published" or "thumbnail"
+            metadata: Extra fields merged into the stored metadata
+
+        Returns:
+            The stored asset record
+        """
+        path = Path(path).resolve()
+        if data is not None:
+            digest = hashlib.sha256(data).hexdigest()
+            info = probe_image_bytes(data)
+            size = len(data)
+        else:
+            digest = hash_file(path)
+            info = probe_image(path)
+            size = path.stat().st_size
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = conn.execute("SELECT * FROM assets WHERE path = ?", (str(path),)).fetchone()
+                merged = dict(existing) if existing else {"id": f"asset-{uuid.uuid4().hex[:16]}", "created_at": now}
+                stored_metadata = json.loads(merged.get("metadata") or "{}")
+                stored_metadata.update(metadata or {})
+                provenance = {
+                    "product_id": product_id, "prompt": prompt, "provider": provider,
+                    "task_id": task_id, "parent_id": parent_id, "variant": variant,
+                }
+                for key, value in provenance.items():
+                    if value is not None or key not in merged:
+                        merged[key] = value
+                merged.update({
+                    "path": str(path),
+                    "filename": path.name,
+                    "sha256": digest,
+                    "size": size,
+                    "mime_type": info.mime_type if info else None,
+                    "width": info.width if info else None,
+                    "height": info.height if info else None,
+                    "prompt_hash": prompt_hash(merged["prompt"]) if merged["prompt"] else None,
+                    "metadata": json.dumps(stored_metadata) if stored_metadata else None,
+                    "updated_at": now,
+                })
+                columns = list(merged)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO assets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [merged[c] for c in columns],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        merged["metadata"] = stored_metadata
+        return merged
+
+    def _select(self, where: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM assets WHERE {where} ORDER BY created_at", params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def get(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        """Look up an asset by id."""
+        rows = self._select("id = ?", (asset_id,))
+        return rows[0] if rows else None
+
+    def find_by_path(self, path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Look up the asset recorded for a file."""
+        rows = self._select("path = ?", (str(Path(path).resolve()),))
+        return rows[0] if rows else None
+
+    def find_by_hash(self, sha256: str) -> List[Dict[str, Any]]:
+        """Assets with the given content hash."""
+        return self._select("sha256 = ?", (sha256,))
+
+    def find_by_product(self, product_id: str) -> List[Dict[str, Any]]:
+        """Assets generated for a product."""
+        return self._select("product_id = ?", (product_id,))
+
+    def find_by_prompt(self, prompt: str) -> List[Dict[str, Any]]:
+        """Assets generated from the given prompt."""
+        return self._select("prompt_hash = ?", (prompt_hash(prompt),))
+
+    def find_by_task(self, task_id: str) -> List[Dict[str, Any]]:
+        """Assets produced by a provider task."""
+        return self._select("task_id = ?", (task_id,))
+
+    def variants(self, asset_id: str) -> List[Dict[str, Any]]:
+        """Files derived from an asset."""
+        return self._select("parent_id = ?", (asset_id,))
+
+    def updated_since(self, timestamp: float) -> List[Dict[str, Any]]:
+        """Assets registered or updated after a Unix timestamp."""
+        return self._select("updated_at > ?", (timestamp,))
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every recorded asset, oldest first."""
+        return self._select("1", ())
+
+    def referenced_paths(self) -> List[str]:
+        """Paths of every recorded asset."""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT path FROM assets")]
+
+    def remove(self, path: Union[str, Path]) -> bool:
+        """Forget the asset recorded for a path (the file is left alone)."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM assets WHERE path = ?", (str(Path(path).resolve()),))
+            return cursor.rowcount > 0
+
+    def prune_missing(self) -> int:
+        """Forget assets whose files no longer exist.
+
+        Returns:
+            Number of records removed
+        """
+        missing = [path for path in self.referenced_paths() if not os.path.exists(path)]
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM assets WHERE path = ?", [(path,) for path in missing])
+        return len(missing)
+
+    def to_media_assets(self, public_dir: Union[str, Path]) -> List[Dict[str, Any]]:
+        """Assets stored under public/ in the MediaAsset shape used by the site.
+
+        Provenance is kept under ``metadata``; variants of a source asset that
+        itself lives outside public/ inherit its prompt, provider and task id.
+        """
+        public_dir = Path(public_dir).resolve()
+        assets = self.all()
+        by_id = {asset["id"]: asset for asset in assets}
+
+        exported = []
+        for asset in assets:
+            try:
+                relative = Path(asset["path"]).relative_to(public_dir)
+            except ValueError:
+                continue
+            source = by_id.get(asset["parent_id"]) or {}
+            metadata = dict(asset["metadata"])
+            metadata.update({
+                key: value for key, value in {
+                    "sha256": asset["sha256"],
+                    "prompt": asset["prompt"] or source.get("prompt"),
+                    "provider": asset["provider"] or source.get("provider"),
+                    "taskId": asset["task_id"] or source.get("task_id"),
+                    "sourceAssetId": asset["parent_id"],
+                    "variant": asset["variant"],
+                    "variants": [v["path"] for v in self.variants(asset["id"])] or None,
+                }.items() if value is not None
+            })
+            product_id = asset["product_id"] or source.get("product_id")
+            record = {
+                "id": asset["id"],
+                "filename": asset["filename"],
+                "path": relative.as_posix(),
+                "url": "/" + relative.as_posix(),
+                "mimeType": asset["mime_type"] or "application/octet-stream",
+                "size": asset["size"],
+                "uploadedAt": _iso(asset["created_at"]),
+                "updatedAt": _iso(asset["updated_at"]),
+                "metadata": metadata,
+            }
+            if asset["width"] and asset["height"]:
+                record["dimensions"] = {"width": asset["width"], "height": asset["height"]}
+            if product_id:
+                record["usage"] = [product_id]
+            exported.append(record)
+        return exported
+
+
+def export_media_assets(registry: AssetRegistry, public_dir: Optional[Path] = None) -> int:
+    """Merge the registry into public/data/media-assets.json.
+
+    Entries are matched by url. Fields already present on an entry (such as
+    placeholder data) are kept unless the registry has a newer value.
+
+    Returns:
+        Number of entries added or changed
+    """
+    public_dir = Path(public_dir or get_public_dir())
+    store = CollectionStore(public_dir / "data")
+    current = {asset.get("url"): asset for asset in store.get("media-assets")}
+    merged = {url: json.loads(json.dumps(asset)) for url, asset in current.items()}
+
+    changed = 0
+    for record in registry.to_media_assets(public_dir):
+        existing = merged.get(record["url"])
+        if existing is None:
+            merged[record["url"]] = record
+            changed += 1
+            continue
+        updated = dict(existing)
+        metadata = dict(existing.get("metadata") or {})
+        metadata.update(record.pop("metadata"))
+        updated.update({key: value for key, value in record.items() if key not in ("id", "uploadedAt")})
+        updated["usage"] = sorted(set(existing.get("usage") or []) | set(record.get("usage") or []))
+        updated["metadata"] = metadata
+        # Only bump updatedAt when something other than the timestamp changed
+        if {k: v for k, v in updated.items() if k != "updatedAt"} != {k: v for k, v in existing.items() if k != "updatedAt"}:
+            merged[record["url"]] = updated
+            changed += 1
+
+    if changed:
+        store.replace("media-assets", sorted(merged.values(), key=lambda asset: asset["url"]))
+    return changed
+
+
+def get_asset_registry_path(output_dir: Optional[Union[str, Path]] = None) -> Path:
+    """Registry location: ASSET_REGISTRY_PATH, or <output_dir>/assets.sqlite3."""
+    path = os.environ.get("ASSET_REGISTRY_PATH")
+    if path:
+        return Path(path)
+    if output_dir is None:
+        output_dir = os.environ.get("OUTPUT_IMAGE_PATH", "generated-images")
+    return Path(output_dir) / "assets.sqlite3"
+
+
+_registries: Dict[Path, AssetRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_asset_registry(output_dir: Optional[Union[str, Path]] = None) -> AssetRegistry:
+    """Get the shared registry at ASSET_REGISTRY_PATH, or <output_dir>/assets.sqlite3.
+
+    One instance is kept per database file, so the schema is only set up on
+    first use rather than on every save. Each operation opens its own
+    connection, so the instance can be shared between threads.
+    """
+    path = get_asset_registry_path(output_dir).resolve()
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = _registries[path] = AssetRegistry(path)
+    return registry
@@ -0,0 +1,195 @@
+"""
+Dry-run planner for catalog image generation
+
+Predicts how many remote calls a batch will make, how long it will take at
+each concurrency level and what it will cost, using the job list, which
+images already exist, the provider rate limit and task latencies recorded
+by previous queue runs. Nothing is sent to any provider.
+"""
+
+import heapq
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+try:
+    from .catalog_jobs import ImageJob, load_products
+    from .catalog_writeback import discover_generated_images
+    from .image_probe import probe_image
+    from .job_queue import JobQueue, QueueReader
+    from .utils import get_public_dir
+except ImportError:
+    from catalog_jobs import ImageJob, load_products
+    from catalog_writeback import discover_generated_images
+    from image_probe import probe_image
+    from job_queue import JobQueue, QueueReader
+    from utils import get_public_dir
+
+# Anything with JobQueue.completed(); dry runs use the read-only QueueReader
+QueueSource = Union[JobQueue, QueueReader]
+
+# Used when no previous run has recorded any latencies
+DEFAULT_TASK_LATENCY = 30.0
+
+# Matches KIEAPIClient.wait_for_completion
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+class ConcurrencyEstimate(NamedTuple):
+    """Predicted run time at one concurrency level."""
+    concurrency: int
+    wall_clock_seconds: float
+    requests_per_minute: float
+    rate_limited: bool
+
+
+class BatchPlan(NamedTuple):
+    """Outcome of a dry run."""
+    total_jobs: int
+    cached_jobs: int
+    remote_jobs: int
+    remote_calls: int
+    calls_per_job: float
+    latency_samples: int
+    mean_latency: float
+    p95_latency: float
+    expected_cost: float
+    estimates: List[ConcurrencyEstimate]
+    recommended: ConcurrencyEstimate
+
+
+def find_cached_jobs(jobs: Sequence[ImageJob],
+                     public_dir: Optional[Path] = None,
+                     queue: Optional[QueueSource] = None,
+                     products: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """Keys of jobs whose image already exists or that a queue already finished.
+
+    An existing file only counts if its header is a real image, so text
+    placeholders saved with image extensions are still scheduled. Besides
+    the job's own filename, images saved under other names are matched to
+    their product and context as the catalog write-back does (e.g.
+    ``benin_teak_logs_villa.png``); those only cover default-style jobs.
+
+    Args:
+        jobs: Jobs to check
+        public_dir: Site public directory (defaults to get_public_dir())
+        queue: Queue whose finished jobs count as cached
+        products: Parsed products.json; loaded from public_dir when omitted
+    """
+    public_dir = public_dir or get_public_dir()
+    images_dir = public_dir / "images" / "products"
+    done = {row["job_key"] for row in queue.completed()} if queue else set()
+    if products is None:
+        products = load_products(public_dir)
+    found = {
+        f"{image.product_id}-{image.context}"
+        for images in discover_generated_images(products, public_dir).values()
+        for image in images
+    }
+
+    cached = []
+    for job in jobs:
+        if job.key in done or job.key in found:
+            cached.append(job.key)
+            continue
+        stem = Path(job.filename).stem
+        if any(path.suffix != ".txt" and probe_image(path) for path in images_dir.glob(f"{stem}.*")):
+            cached.append(job.key)
+    return cached
+
+
+def load_latency_history(queue: Optional[QueueSource]) -> List[float]:
+    """Per-task latencies, in seconds, from jobs a queue has completed."""
+    if queue is None:
+        return []
+    return [
+        row["finished_at"] - row["started_at"]
+        for row in queue.completed()
+        if row["started_at"] and row["finished_at"] and row["attempts"] == 1
+    ]
+
+
+def _simulate(latencies: Sequence[float], jobs: int, concurrency: int) -> float:
+    """Wall-clock time for jobs spread greedily over concurrency slots."""
+    slots = [0.0] * min(concurrency, jobs)
+    for i in range(jobs):
+        start = heapq.heappop(slots)
+        heapq.heappush(slots, start + latencies[i % len(latencies)])
+    return max(slots) if slots else 0.0
+
+
+def plan_batch(jobs: Sequence[ImageJob],
+               cached_keys: Sequence[str] = (),
+               latency_history: Sequence[float] = (),
+               rate_limit_per_minute: Optional[float] = None,
+               max_concurrency: int = 16,
+               cost_per_image: Optional[float] = None,
+               poll_interval: float = DEFAULT_POLL_INTERVAL) -> BatchPlan:
+    """Predict calls, time and cost of a batch and pick a concurrency.
+
+    Each remote job is modelled as one createTask call, one status poll per
+    poll interval until completion and one download. Time at a concurrency
+    level is the larger of the simulated schedule and the time the rate
+    limit allows for all calls.
+
+    Args:
+        jobs: Full job list
+        cached_keys: Jobs that will not need a remote generation
+        latency_history: Observed task latencies in seconds
+        rate_limit_per_minute: Provider request quota (KIE_RATE_LIMIT_RPM by default)
+        max_concurrency: Highest concurrency to consider
+        cost_per_image: Price per generated image (KIE_COST_PER_IMAGE by default)
+        poll_interval: Seconds between status polls
+
+    Returns:
+        BatchPlan; recommended is the lowest concurrency that reaches the
+        shortest predicted wall-clock time
+    """
+    if rate_limit_per_minute is None:
+        rate_limit_per_minute = float(os.environ.get("KIE_RATE_LIMIT_RPM", "60"))
+    if cost_per_image is None:
+        cost_per_image = float(os.environ.get("KIE_COST_PER_IMAGE", "0.02"))
+
+    cached = set(cached_keys)
+    remote_jobs = sum(1 for job in jobs if job.key not in cached)
+
+    latencies = sorted(latency_history) or [DEFAULT_TASK_LATENCY]
+    mean_latency = sum(latencies) / len(latencies)
+    p95_latency = latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+
+    calls_per_job = 2 + sum(math.ceil(latency / poll_interval) for latency in latencies) / len(latencies)
+    remote_calls = math.ceil(remote_jobs * calls_per_job)
+    rate_floor = remote_calls / (rate_limit_per_minute / 60.0) if rate_limit_per_minute > 0 else 0.0
+
+    estimates = []
+    for concurrency in range(1, max(1, max_concurrency) + 1):
+        scheduled = _simulate(latencies, remote_jobs, concurrency)
+        wall_clock = max(scheduled, rate_floor)
+        demand = concurrency * calls_per_job / max(mean_latency, 1e-3) * 60.0
+        estimates.append(ConcurrencyEstimate(
+            concurrency=concurrency,
+            wall_clock_seconds=wall_clock,
+            requests_per_minute=min(demand, rate_limit_per_minute) if rate_limit_per_minute > 0 else demand,
+            rate_limited=rate_limit_per_minute > 0 and demand > rate_limit_per_minute,
+        ))
+
+    fastest = min(estimate.wall_clock_seconds for estimate in estimates)
+    recommended = next(
+        estimate for estimate in estimates
+        if estimate.wall_clock_seconds <= fastest * 1.01 + 1e-9
+    )
+
+    return BatchPlan(
+        total_jobs=len(jobs),
+        cached_jobs=len(jobs) - remote_jobs,
+        remote_jobs=remote_jobs,
+        remote_calls=remote_calls,
+        calls_per_job=calls_per_job,
+        latency_samples=len(latency_history),
+        mean_latency=mean_latency,
+        p95_latency=p95_latency,
+        expected_cost=remote_jobs * cost_per_image,
+        estimates=estimates,
+        recommended=recommended,
+    )
@@ -0,0 +1,241 @@
+"""
+Content-addressed blob store for generated images
+
+Every image is stored once under its SHA-256 digest and published into the
+site's directories as hardlinks (or symlinks, when configured), so the same
+bytes are never duplicated on disk and unchanged files are never rewritten.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+try:
+    from .utils import get_file_mode
+except ImportError:
+    from utils import get_file_mode
+
+logger = logging.getLogger(__name__)
+
+LINK_MODES = ("hardlink", "symlink", "copy")
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """Compute the SHA-256 digest of a file without loading it into memory.
+
+    Args:
+        path: File to hash
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Store image bytes once, keyed by content hash, and link them into place."""
+
+    def __init__(self, root: Union[str, Path], link_mode: Optional[str] = None):
+        """Initialize the blob store.
+
+        Args:
+            root: Directory holding the objects and the stat index
+            link_mode: "hardlink", "symlink" or "copy". Defaults to the
+                BLOB_LINK_MODE environment variable, then "hardlink".
+        """
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        self.link_mode = link_mode or os.environ.get("BLOB_LINK_MODE", "hardlink")
+        if self.link_mode not in LINK_MODES:
+            raise ValueError(f"Unsupported link mode: {self.link_mode}. Expected one of {LINK_MODES}")
+
+        # Maps absolute source path -> [size, mtime_ns, inode, digest] so that
+        # unchanged files are not re-hashed on every run
+        self._index_path = self.root / "index.json"
+        self._index: Dict[str, list] = {}
+        self._index_dirty = False
+        if self._index_path.exists():
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable blob index {self._index_path}: {str(e)}")
+
+    def blob_path(self, digest: str) -> Path:
+        """Get the object path for a digest."""
+        return self.objects_dir / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        """Check whether a digest is already stored."""
+        return self.blob_path(digest).exists()
+
+    def digest_for(self, path: Union[str, Path]) -> str:
+        """Get the digest of a file, reusing the cached value if it is unchanged.
+
+        Args:
+            path: File to identify
+
+        Returns:
+            Hex SHA-256 digest of the file contents
+        """
+        path = Path(path)
+        st = path.stat()
+        key = str(path.resolve())
+        cached = self._index.get(key)
+        if cached and cached[:3] == [st.st_size, st.st_mtime_ns, st.st_ino]:
+            return cached[3]
+
+        digest = hash_file(path)
+        self._index[key] = [st.st_size, st.st_mtime_ns, st.st_ino, digest]
+        self._index_dirty = True
+        return digest
+
+    def put_bytes(self, data: bytes) -> str:
+        """Store raw bytes.
+
+        Args:
+            data: Content to store
+
+        Returns:
+            Hex digest identifying the stored blob
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.chmod(tmp_path, get_file_mode())
+                os.replace(tmp_path, blob)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return digest
+
+    def put_file(self, path: Union[str, Path]) -> str:
+        """Store a file, hardlinking it into the store when possible.
+
+        Args:
+            path: File to ingest
+
+        Returns:
+            Hex digest identifying the stored blob
+        """
+        path = Path(path)
+        digest = self.digest_for(path)
+        blob = self.blob_path(digest)
+        if blob.exists():
+            return digest
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, blob)
+        except OSError:
+            # Cross-device or unsupported filesystem: fall back to one copy
+            shutil.copy2(path, blob)
+        return digest
+
+    def publish(self, digest: str, dest: Union[str, Path]) -> bool:
+        """Link a stored blob to a destination path.
+
+        The destination is left alone when it already points at the blob, or
+        holds identical bytes and cannot share the blob's inode.
+
+        Args:
+            digest: Digest of a stored blob
+            dest: Path the blob should be visible at
+
+        Returns:
+            True if the destination was (re)linked, False if it was already current
+        """
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            raise FileNotFoundError(f"Blob not found in store: {digest}")
+
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if self._is_current(blob, dest, digest):
+            return False
+
+        # Link under a temporary name and swap it in, so readers never see
+        # a missing or partially written file
+        tmp_dest = dest.parent / f".{dest.name}.{os.getpid()}.tmp"
+        if tmp_dest.exists() or tmp_dest.is_symlink():
+            tmp_dest.unlink()
+        self._link(blob, tmp_dest)
+        os.replace(tmp_dest, dest)
+        return True
+
+    def _is_current(self, blob: Path, dest: Path, digest: str) -> bool:
+        """Check whether dest already serves the blob's content."""
+        if not dest.exists():
+            return False
+        if self.link_mode == "symlink":
+            return dest.is_symlink() and dest.resolve() == blob.resolve()
+        if dest.is_symlink():
+            return False
+        if os.path.samefile(blob, dest):
+            return True
+        if self.link_mode == "hardlink" and dest.stat().st_dev == blob.stat().st_dev:
+            # Same bytes in a separate inode still cost a copy; relink to share it
+            return False
+        return dest.stat().st_size == blob.stat().st_size and self.digest_for(dest) == digest
+
+    def _link(self, blob: Path, dest: Path) -> None:
+        """Create dest as a link to blob using the configured mode."""
+        if self.link_mode == "symlink":
+            os.symlink(os.path.relpath(blob, dest.parent), dest)
+            return
+        if self.link_mode == "hardlink":
+            try:
+                os.link(blob, dest)
+                return
+            except OSError as e:
+                logger.warning(f"Hardlink failed for {dest}, copying instead: {str(e)}")
+        shutil.copy2(blob, dest)
+
+    def save_index(self) -> None:
+        """Persist the stat index if it changed."""
+        if not self._index_dirty:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".index-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._index_dirty = False
+
+
+def get_blob_store(output_dir: Optional[Union[str, Path]] = None) -> BlobStore:
+    """Get a blob store rooted in the configured location.
+
+    Args:
+        output_dir: Image output directory; the store defaults to its .store subdirectory
+
+    Returns:
+        BlobStore rooted at BLOB_STORE_PATH, or <output_dir>/.store
+    """
+    root = os.environ.get("BLOB_STORE_PATH")
+    if not root:
+        if output_dir is None:
+            output_dir = os.environ.get("OUTPUT_IMAGE_PATH", "generated-images")
+        root = Path(output_dir) / ".store"
+    return BlobStore(root)
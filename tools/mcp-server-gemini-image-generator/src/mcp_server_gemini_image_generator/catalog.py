@@ -0,0 +1,212 @@
+"""
+In-memory indexed view of the public/data collections
+
+The collections are parsed once and secondary indexes are built over the
+fields tooling filters on, so queries intersect posting sets instead of
+scanning every record. String values are matched case-insensitively; list
+fields (``tags``, ``serviceAreas``) match when any element matches.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+try:
+    from .utils import get_public_dir
+except ImportError:
+    from utils import get_public_dir
+
+COLLECTION_FILES = {
+    "products": "products.json",
+    "blog-posts": "blog-posts.json",
+    "blog-categories": "blog-categories.json",
+    "pages": "pages.json",
+}
+
+
+def _has_real_image(product: Dict[str, Any]) -> bool:
+    return any(not image.get("isPlaceholder", False) for image in product.get("images", []))
+
+
+# Computed fields that can be filtered on like stored ones
+DERIVED_FIELDS: Dict[str, Dict[str, Callable[[Dict[str, Any]], Any]]] = {
+    "products": {"hasRealImage": _has_real_image},
+}
+
+INDEXED_FIELDS = {
+    "products": ("category", "grade", "tags", "serviceAreas", "isActive", "hasRealImage"),
+    "blog-posts": ("status", "tags", "categoryIds", "authorId", "slug"),
+    "blog-categories": ("slug",),
+    "pages": ("slug",),
+}
+
+
+class QueryResult(NamedTuple):
+    """A page of query results."""
+    items: List[Dict[str, Any]]
+    total: int
+    offset: int
+    limit: Optional[int]
+
+    @property
+    def has_more(self) -> bool:
+        return self.limit is not None and self.offset + len(self.items) < self.total
+
+
+def _index_key(value: Any) -> Any:
+    return value.casefold() if isinstance(value, str) else value
+
+
+class Catalog:
+    """Indexed, read-only view of the site's JSON collections."""
+
+    def __init__(self, data_dir: Optional[Path] = None,
+                 collections: Iterable[str] = COLLECTION_FILES):
+        """Load collections and build their indexes.
+
+        Args:
+            data_dir: Directory holding the collection files (defaults to public/data)
+            collections: Names of the collections to load
+        """
+        self.data_dir = Path(data_dir or get_public_dir() / "data")
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_id: Dict[str, Dict[str, int]] = {}
+        self._indexes: Dict[str, Dict[str, Dict[Any, Set[int]]]] = {}
+        self._mtimes: Dict[str, int] = {}
+        for name in collections:
+            self._load(name)
+
+    def _load(self, name: str) -> None:
+        path = self.data_dir / COLLECTION_FILES[name]
+        self._mtimes[name] = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+
+        derived = DERIVED_FIELDS.get(name, {})
+        indexes: Dict[str, Dict[Any, Set[int]]] = {field: {} for field in INDEXED_FIELDS.get(name, ())}
+        for position, record in enumerate(records):
+            for field, postings in indexes.items():
+                value = derived[field](record) if field in derived else record.get(field)
+                values = value if isinstance(value, list) else [value]
+                for item in values:
+                    try:
+                        postings.setdefault(_index_key(item), set()).add(position)
+                    except TypeError:
+                        # Unhashable values (objects) cannot be indexed
+                        continue
+
+        self._records[name] = records
+        self._by_id[name] = {record.get("id"): i for i, record in enumerate(records)}
+        self._indexes[name] = indexes
+
+    def reload(self) -> List[str]:
+        """Reload collections whose file changed since they were loaded.
+
+        Returns:
+            Names of the reloaded collections
+        """
+        changed = [
+            name for name in self._records
+            if os.stat(self.data_dir / COLLECTION_FILES[name]).st_mtime_ns != self._mtimes[name]
+        ]
+        for name in changed:
+            self._load(name)
+        return changed
+
+    def all(self, collection: str) -> List[Dict[str, Any]]:
+        """Every record of a collection, in file order."""
+        return list(self._records[collection])
+
+    def get(self, collection: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a record by id."""
+        position = self._by_id[collection].get(record_id)
+        return None if position is None else self._records[collection][position]
+
+    def values(self, collection: str, field: str) -> List[Any]:
+        """Distinct (case-folded) values of an indexed field."""
+        return sorted(self._indexes[collection][field], key=str)
+
+    def query(self,
+              collection: str,
+              where: Optional[Dict[str, Any]] = None,
+              predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+              sort_by: Optional[str] = None,
+              descending: bool = False,
+              offset: int = 0,
+              limit: Optional[int] = None) -> QueryResult:
+        """Filter, sort and paginate a collection.
+
+        Args:
+            collection: Collection name, e.g. "products"
+            where: Field filters. A scalar must match the field (or one of its
+                list elements); a list, tuple or set matches any of its values.
+                Indexed fields are answered from the index; others are checked
+                record by record on the remaining candidates.
+            predicate: Extra check applied after the field filters
+            sort_by: Field to sort by (records missing it sort last)
+            descending: Reverse the sort order
+            offset: Number of matching records to skip
+            limit: Maximum number of records to return
+
+        Returns:
+            QueryResult with the requested page and the total match count
+
+        Raises:
+            KeyError: If the collection is not loaded
+        """
+        records = self._records[collection]
+        indexes = self._indexes[collection]
+        derived = DERIVED_FIELDS.get(collection, {})
+
+        candidates: Optional[Set[int]] = None
+        residual: Dict[str, Set[Any]] = {}
+        for field, wanted in (where or {}).items():
+            wanted_keys = {_index_key(v) for v in wanted} if isinstance(wanted, (list, tuple, set)) else {_index_key(wanted)}
+            if field not in indexes:
+                residual[field] = wanted_keys
+                continue
+            matches: Set[int] = set()
+            for key in wanted_keys:
+                matches |= indexes[field].get(key, set())
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return QueryResult([], 0, offset, limit)
+
+        positions = sorted(candidates) if candidates is not None else range(len(records))
+
+        def matches_residual(record: Dict[str, Any]) -> bool:
+            for field, wanted_keys in residual.items():
+                value = derived[field](record) if field in derived else record.get(field)
+                values = value if isinstance(value, list) else [value]
+                if not any(_index_key(v) in wanted_keys for v in values if not isinstance(v, (dict, list))):
+                    return False
+            return True
+
+        results = [
+            records[i] for i in positions
+            if matches_residual(records[i]) and (predicate is None or predicate(records[i]))
+        ]
+
+        if sort_by:
+            present = [r for r in results if r.get(sort_by) is not None]
+            missing = [r for r in results if r.get(sort_by) is None]
+            present.sort(key=lambda r: _index_key(r[sort_by]), reverse=descending)
+            results = present + missing
+
+        total = len(results)
+        end = None if limit is None else offset + limit
+        return QueryResult(results[offset:end], total, offset, limit)
+
+
+_catalog: Optional[Catalog] = None
+
+
+def get_catalog() -> Catalog:
+    """Get the shared catalog, reloading any collection whose file changed."""
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog()
+    else:
+        _catalog.reload()
+    return _catalog
@@ -0,0 +1,124 @@
+"""
+Build the catalog's image generation job list
+
+One job is produced per product and context. Prompts come from the
+``<product-id>-<context>.txt`` placeholder files next to the product images,
+falling back to the template engine's expansion for the product. The full
+product × context × style matrix can also be emitted from the templates
+alone.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+try:
+    from .catalog_writeback import IMAGE_CONTEXTS, read_placeholder_prompt
+    from .prompt_templates import DEFAULT_STYLE, PromptEngine, get_prompt_engine
+    from .utils import get_public_dir
+except ImportError:
+    from catalog_writeback import IMAGE_CONTEXTS, read_placeholder_prompt
+    from prompt_templates import DEFAULT_STYLE, PromptEngine, get_prompt_engine
+    from utils import get_public_dir
+
+
+class ImageJob(NamedTuple):
+    """A single image to generate for the catalog."""
+    key: str
+    product_id: str
+    context: str
+    filename: str
+    prompt: str
+    output_format: str = "png"
+    image_size: str = "16:9"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageJob":
+        return cls(**{field: data[field] for field in cls._fields if field in data})
+
+
+def load_products(public_dir: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Load public/data/products.json."""
+    products_path = (public_dir or get_public_dir()) / "data" / "products.json"
+    with open(products_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_catalog_jobs(public_dir: Optional[Path] = None,
+                      products: Optional[List[Dict[str, Any]]] = None,
+                      contexts: tuple = IMAGE_CONTEXTS,
+                      active_only: bool = True) -> List[ImageJob]:
+    """Build one job per active product and context.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        products: Parsed products.json; loaded from public_dir when omitted
+        contexts: Contexts to generate for each product
+        active_only: Skip products whose isActive is false
+
+    Returns:
+        Jobs in catalog order
+    """
+    public_dir = public_dir or get_public_dir()
+    if products is None:
+        products = load_products(public_dir)
+    images_dir = public_dir / "images" / "products"
+    engine = get_prompt_engine()
+
+    jobs: List[ImageJob] = []
+    for product in products:
+        if active_only and not product.get("isActive", True):
+            continue
+        for context in contexts:
+            stem = f"{product['id']}-{context}"
+            prompt = read_placeholder_prompt(images_dir / f"{stem}.txt")
+            if not prompt:
+                prompt = engine.expand(product, context).prompt
+            jobs.append(ImageJob(
+                key=stem,
+                product_id=product["id"],
+                context=context,
+                filename=f"{stem}.png",
+                prompt=prompt,
+            ))
+    return jobs
+
+
+def template_jobs(products: Optional[List[Dict[str, Any]]] = None,
+                  contexts: Sequence[str] = IMAGE_CONTEXTS,
+                  styles: Sequence[str] = (DEFAULT_STYLE,),
+                  active_only: bool = True,
+                  engine: Optional[PromptEngine] = None) -> List[ImageJob]:
+    """Build one job per active product, context and style from the templates.
+
+    Placeholder prompts are ignored, so every job's prompt is the engine's
+    canonical spelling. Jobs in the default style keep the catalog's
+    ``<product-id>-<context>`` key; other styles append ``-<style>``.
+
+    Args:
+        products: Parsed products.json; loaded from the public directory when omitted
+        contexts: Contexts to generate for each product
+        styles: Styles to generate for each context
+        active_only: Skip products whose isActive is false
+        engine: Template engine (defaults to get_prompt_engine())
+
+    Returns:
+        Jobs in catalog order
+    """
+    engine = engine or get_prompt_engine()
+    if products is None:
+        products = load_products()
+    return [
+        ImageJob(
+            key=expansion.key,
+            product_id=expansion.product_id,
+            context=expansion.context,
+            filename=f"{expansion.key}.png",
+            prompt=expansion.prompt,
+            image_size=engine.image_size,
+        )
+        for expansion in engine.matrix(products, contexts, styles, active_only)
+    ]
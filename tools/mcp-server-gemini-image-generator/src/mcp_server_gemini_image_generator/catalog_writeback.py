@@ -0,0 +1,380 @@
+"""
+Write generated image metadata back into public/data/products.json
+
+Generated files under ``public/images/products`` are matched to products
+through the asset registry (by content hash) when it knows them, and
+otherwise by filename, with hyphens and underscores treated alike:
+``<product-id>-<context>.<ext>`` is a context image and a name made of the
+product id's words (``burma_teak_door.png``, ``teak_hardwood_log.png``) is the
+product's showcase image. Their real format, dimensions and byte size are
+read from the image headers, and the changed products are committed through
+the CollectionStore.
+"""
+
+import copy
+import logging
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from .blob_store import hash_file
+    from .image_probe import ImageInfo, probe_image
+    from .utils import get_public_dir
+except ImportError:
+    from blob_store import hash_file
+    from image_probe import ImageInfo, probe_image
+    from utils import get_public_dir
+
+logger = logging.getLogger(__name__)
+
+# Contexts the catalog generates, in display order
+IMAGE_CONTEXTS = ("apartment", "villa", "office", "retail")
+
+# Context of a product shot whose filename names no context; listed first
+SHOWCASE_CONTEXT = "product_showcase"
+
+PRODUCT_IMAGES_URL = "/images/products"
+
+_PROMPT_PATTERN = re.compile(r"^# Generation Prompt:\s*\n#\s*(.+)$", re.MULTILINE)
+
+
+class GeneratedImage(NamedTuple):
+    """A generated image file and how it was produced."""
+    product_id: str
+    context: str
+    path: Path
+    info: ImageInfo
+    prompt: str
+    generated_at: str
+
+
+def utc_now_iso() -> str:
+    """Current time in the ISO format used across public/data."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def read_placeholder_prompt(placeholder_path: Path) -> Optional[str]:
+    """Read the generation prompt recorded in a ``.txt`` placeholder file."""
+    try:
+        text = placeholder_path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+    match = _PROMPT_PATTERN.search(text)
+    return match.group(1).strip() if match else None
+
+
+def _name_words(name: str) -> List[str]:
+    return [word for word in re.split(r"[-_\s]+", name.lower()) if word]
+
+
+def match_image_file(filename: str, product_ids: Iterable[str]) -> Optional[Tuple[str, str]]:
+    """Product and context an image file is named after.
+
+    Hyphens and underscores are treated alike. A trailing context word makes
+    it a context image; any other name is the product's showcase image. A
+    name that is not exactly a product id belongs to the product whose id
+    words all appear in it (``teak_hardwood_log`` is ``hardwood-log-teak``,
+    ``ghana_teak_window_frame`` is ``ghana-teak-window``), preferring the
+    longest id; a tie matches nothing.
+
+    Args:
+        filename: Image file name
+        product_ids: Ids of the catalog products
+
+    Returns:
+        Tuple of (product id, context), or None if no product matches
+    """
+    words = _name_words(Path(filename).stem)
+    context = SHOWCASE_CONTEXT
+    if len(words) > 1 and words[-1] in IMAGE_CONTEXTS:
+        context = words.pop()
+
+    best: List[str] = []
+    best_length = 0
+    for product_id in product_ids:
+        id_words = _name_words(product_id)
+        if id_words == words:
+            return product_id, context
+        if set(id_words) <= set(words):
+            if len(id_words) > best_length:
+                best, best_length = [product_id], len(id_words)
+            elif len(id_words) == best_length:
+                best.append(product_id)
+    if len(best) != 1:
+        if best:
+            logger.warning(f"{filename} matches several products ({', '.join(best)}); skipping it")
+        return None
+    return best[0], context
+
+
+def _iso_from_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def discover_generated_images(products: List[Dict[str, Any]],
+                              public_dir: Optional[Path] = None,
+                              registry: Optional[Any] = None) -> Dict[str, List[GeneratedImage]]:
+    """Find generated images for each product and probe their headers.
+
+    Files whose header is not a recognised image (such as the text
+    placeholders saved with image extensions) are ignored, and so are the
+    stand-in images that products list as placeholders.
+
+    Args:
+        products: Parsed products.json
+        public_dir: Site public directory (defaults to get_public_dir())
+        registry: AssetRegistry to match files by content hash; its product
+            id, prompt and creation time take precedence over the filename
+
+    Returns:
+        Mapping of product id to its generated images, showcase first and
+        then in context order
+    """
+    images_dir = (public_dir or get_public_dir()) / "images" / "products"
+    product_ids = [product["id"] for product in products]
+    placeholders = {
+        Path(entry["url"]).name
+        for product in products
+        for entry in product.get("images", [])
+        if entry.get("isPlaceholder") and entry.get("url")
+    }
+    listed = {
+        product["id"]: {Path(entry.get("url", "")).name for entry in product.get("images", [])}
+        for product in products
+    }
+    contexts = (SHOWCASE_CONTEXT,) + IMAGE_CONTEXTS
+    candidates: Dict[Tuple[str, str], List[Tuple[tuple, Path, ImageInfo, Optional[Dict[str, Any]]]]] = {}
+
+    for path in sorted(images_dir.iterdir()) if images_dir.is_dir() else []:
+        if path.suffix == ".txt" or path.name in placeholders or not path.is_file():
+            continue
+        info = probe_image(path)
+        if info is None:
+            continue
+
+        asset = None
+        if registry is not None:
+            assets = [a for a in registry.find_by_hash(hash_file(path)) if a.get("product_id") in product_ids]
+            asset = assets[-1] if assets else None
+
+        match = match_image_file(path.name, product_ids)
+        if asset is not None:
+            context = match[1] if match and match[0] == asset["product_id"] else SHOWCASE_CONTEXT
+            match = (asset["product_id"], context)
+        if match is None:
+            continue
+        # Prefer registered files, then the file the product already shows, so reruns are stable
+        rank = (asset is None, path.name not in listed.get(match[0], ()), path.name)
+        candidates.setdefault(match, []).append((rank, path, info, asset))
+
+    found: Dict[str, Dict[str, GeneratedImage]] = {}
+    for (product_id, context), matches in candidates.items():
+        _, path, info, asset = min(matches, key=lambda candidate: candidate[0])
+        prompt = (asset or {}).get("prompt") or read_placeholder_prompt(path.with_suffix(".txt")) or ""
+        timestamp = asset["created_at"] if asset else path.stat().st_mtime
+        found.setdefault(product_id, {})[context] = GeneratedImage(
+            product_id=product_id,
+            context=context,
+            path=path,
+            info=info,
+            prompt=prompt,
+            generated_at=_iso_from_timestamp(timestamp),
+        )
+
+    return {
+        product_id: [images[context] for context in contexts if context in images]
+        for product_id, images in found.items()
+    }
+
+
+def _url_to_path(url: str, public_dir: Path) -> Path:
+    return public_dir / url.lstrip("/")
+
+
+def products_with_real_images(products: List[Dict[str, Any]], public_dir: Optional[Path] = None) -> List[str]:
+    """Ids of the products whose primaryImage is an existing, non-placeholder image."""
+    public_dir = public_dir or get_public_dir()
+    real = []
+    for product in products:
+        primary = product.get("primaryImage")
+        entry = next((e for e in product.get("images", []) if e.get("url") == primary), None)
+        if not primary or (entry is not None and entry.get("isPlaceholder")):
+            continue
+        path = _url_to_path(primary, public_dir)
+        if path.is_file() and probe_image(path) is not None:
+            real.append(product["id"])
+    return real
+
+
+def _image_entry(product: Dict[str, Any], image: GeneratedImage,
+                 previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    metadata = dict(previous.get("metadata", {})) if previous else {}
+    metadata.update({
+        "generatedAt": image.generated_at,
+        "prompt": image.prompt or metadata.get("prompt", ""),
+        "format": image.info.format,
+        "fileSize": image.info.size,
+    })
+    metadata.setdefault("optimized", image.info.format == "webp")
+    metadata.setdefault("seoKeywords", list(product.get("tags", [])[:4]))
+
+    if previous:
+        alt_text = previous.get("altText")
+    elif image.context == SHOWCASE_CONTEXT:
+        alt_text = product["name"]
+    else:
+        alt_text = f"{product['name']} - {image.context.title()} Setting"
+
+    return {
+        "id": f"{product['id']}-{image.context.replace('_', '-')}",
+        "productId": product["id"],
+        "url": f"{PRODUCT_IMAGES_URL}/{image.path.name}",
+        "altText": alt_text,
+        "context": image.context,
+        "sequence": 0,
+        "dimensions": {
+            "width": image.info.width,
+            "height": image.info.height,
+            "aspectRatio": image.info.aspect_ratio,
+        },
+        "metadata": metadata,
+        "isActive": True,
+        "isPlaceholder": False,
+    }
+
+
+def apply_image_updates(products: List[Dict[str, Any]],
+                        generated: Dict[str, List[GeneratedImage]],
+                        public_dir: Optional[Path] = None) -> List[str]:
+    """Update each product's ``images[]`` and ``primaryImage`` in place.
+
+    Generated images replace placeholder entries and images borrowed from
+    other products, and become the primary image unless it is already one of
+    the product's own, existing images. Dimensions of every remaining entry
+    are corrected from the file header.
+
+    Args:
+        products: Parsed products.json, modified in place
+        generated: Output of discover_generated_images()
+        public_dir: Site public directory (defaults to get_public_dir())
+
+    Returns:
+        Ids of the products that changed
+    """
+    public_dir = public_dir or get_public_dir()
+    product_ids = [product["id"] for product in products]
+    changed: List[str] = []
+    probes: Dict[str, Optional[ImageInfo]] = {}
+
+    def probe_url(url: str) -> Optional[ImageInfo]:
+        if url not in probes:
+            path = _url_to_path(url, public_dir)
+            probes[url] = probe_image(path) if path.is_file() else None
+        return probes[url]
+
+    for product in products:
+        product_id = product["id"]
+        old_images = product.get("images", [])
+        by_url = {entry.get("url"): entry for entry in old_images}
+        by_context = {entry.get("context"): entry for entry in old_images}
+        new_images: List[Dict[str, Any]] = []
+
+        generated_images = generated.get(product_id, [])
+        for image in generated_images:
+            url = f"{PRODUCT_IMAGES_URL}/{image.path.name}"
+            new_images.append(_image_entry(product, image, by_url.get(url) or by_context.get(image.context)))
+
+        generated_urls = {entry["url"] for entry in new_images}
+        for entry in old_images:
+            url = entry.get("url", "")
+            if url in generated_urls:
+                continue
+            owner = match_image_file(Path(url).name, product_ids)
+            borrowed = owner is None or owner[0] != product_id
+            if generated_images and (entry.get("isPlaceholder") or borrowed):
+                continue
+
+            entry = dict(entry)
+            info = probe_url(url)
+            if info is not None:
+                entry["dimensions"] = {
+                    "width": info.width,
+                    "height": info.height,
+                    "aspectRatio": info.aspect_ratio,
+                }
+                entry["metadata"] = dict(entry.get("metadata", {}), format=info.format, fileSize=info.size)
+            else:
+                logger.warning(f"{product_id}: image {url} is missing or not a valid image")
+            new_images.append(entry)
+
+        for sequence, entry in enumerate(new_images, start=1):
+            entry["sequence"] = sequence
+
+        primary = product.get("primaryImage")
+        kept_urls = {entry.get("url") for entry in new_images}
+        if generated_images and (primary not in kept_urls or probe_url(primary) is None):
+            primary = new_images[0]["url"]
+
+        if new_images != old_images or primary != product.get("primaryImage"):
+            product["images"] = new_images
+            if primary is not None:
+                product["primaryImage"] = primary
+            product["updatedAt"] = utc_now_iso()
+            changed.append(product_id)
+
+    return changed
+
+
+def write_back_images(public_dir: Optional[Path] = None, dry_run: bool = False,
+                      registry: Optional[Any] = None) -> List[str]:
+    """Probe generated images and record them in products.json.
+
+    Each changed product is committed with CollectionStore.update, under the
+    store's lock and journal, so products changed meanwhile by workers or
+    other scripts are not overwritten; only ``images``, ``primaryImage`` and
+    ``updatedAt`` are set. _metadata.json is kept in step by the store.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        dry_run: Compute the changes without writing anything
+        registry: AssetRegistry to match files by content hash (defaults to
+            the server's registry, when one exists)
+
+    Returns:
+        Ids of the products that changed
+    """
+    try:
+        from .asset_registry import AssetRegistry, get_asset_registry_path
+        from .collection_store import CollectionStore
+    except ImportError:
+        from asset_registry import AssetRegistry, get_asset_registry_path
+        from collection_store import CollectionStore
+
+    public_dir = Path(public_dir or get_public_dir())
+    store = CollectionStore(public_dir / "data")
+    products = copy.deepcopy(store.get("products"))
+
+    if registry is None and get_asset_registry_path().exists():
+        registry = AssetRegistry(get_asset_registry_path())
+
+    generated = discover_generated_images(products, public_dir, registry)
+    changed = apply_image_updates(products, generated, public_dir)
+    if not changed:
+        logger.info("products.json is already up to date")
+        return changed
+
+    if dry_run:
+        logger.info(f"Dry run: would update {len(changed)} products")
+        return changed
+
+    by_id = {product["id"]: product for product in products}
+    for product_id in changed:
+        product = by_id[product_id]
+        changes = {"images": product["images"]}
+        if "primaryImage" in product:
+            changes["primaryImage"] = product["primaryImage"]
+        store.update("products", product_id, changes)
+    logger.info(f"Updated {len(changed)} products in products.json")
+    return changed
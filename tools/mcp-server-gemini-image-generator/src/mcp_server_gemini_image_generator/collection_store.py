@@ -0,0 +1,325 @@
+"""
+Journaled store for the public/data JSON collections
+
+Mutations from any number of stores (CLI scripts, the server, workers) are
+serialized with a file lock. Under the lock a store reloads the collection
+if another store rewrote it, replays journal entries a crashed writer left
+behind, applies its change, appends it to the journal and rewrites the
+collection file and ``_metadata.json`` (record count and last update time,
+which is always the newest ``updatedAt`` among the records).
+The journal is truncated once the files are written, so it only ever holds
+commits that did not finish.
+
+The journal and lock file live in the build state directory (see
+utils.get_state_dir), never under public/, so they are not deployed.
+Readers reload only the collections whose file changed (mtime and size)
+since they last loaded them, which also catches files edited by hand.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .catalog_writeback import utc_now_iso
+    from .utils import file_lock, get_public_dir, get_state_dir, write_json_files_atomic
+except ImportError:
+    from catalog_writeback import utc_now_iso
+    from utils import file_lock, get_public_dir, get_state_dir, write_json_files_atomic
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "_metadata.json"
+
+# Applies a change to a collection's records and returns what the journal records
+Mutation = Callable[[List[Dict[str, Any]]], Any]
+
+
+def _replay(records: List[Dict[str, Any]], entry: Dict[str, Any]) -> None:
+    """Apply a journal entry; safe to repeat if the commit had been written after all."""
+    op, record_id, record = entry.get("op"), entry.get("id"), entry.get("record")
+    position = next((i for i, r in enumerate(records) if r.get("id") == record_id), None)
+    if op in ("insert", "update") and record is not None:
+        if position is None:
+            records.append(record)
+        else:
+            records[position] = record
+    elif op == "delete" and position is not None:
+        del records[position]
+    elif op == "replace" and isinstance(record, list):
+        records[:] = record
+
+
+def _last_updated(records: List[Dict[str, Any]], fallback: Optional[str]) -> Optional[str]:
+    """Newest updatedAt (or lastUpdated) among the records, else fallback."""
+    stamps = [r.get("updatedAt") or r.get("lastUpdated") for r in records if isinstance(r, dict)]
+    stamps = [s for s in stamps if isinstance(s, str)]
+    return max(stamps) if stamps else fallback
+
+
+class CollectionStore:
+    """Read and mutate public/data collections through a change journal."""
+
+    def __init__(self, data_dir: Optional[Path] = None, state_dir: Optional[Path] = None):
+        """Open the collections listed in _metadata.json.
+
+        Args:
+            data_dir: Directory holding the collection files (defaults to public/data)
+            state_dir: Directory for the journal and lock file (defaults to get_state_dir())
+        """
+        self.data_dir = Path(data_dir or get_public_dir() / "data")
+        self.metadata_path = self.data_dir / METADATA_FILE
+        # One journal per data directory, so stores of different sites never mix
+        tag = hashlib.sha256(str(self.data_dir.resolve()).encode("utf-8")).hexdigest()[:12]
+        state_dir = Path(state_dir or get_state_dir())
+        self.journal_path = state_dir / f"collections-{tag}.jsonl"
+        self.lock_path = state_dir / f"collections-{tag}.lock"
+
+        with open(self.metadata_path, "r", encoding="utf-8") as f:
+            self.metadata: Dict[str, Any] = json.load(f)
+
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+        self._file_stats: Dict[str, Tuple[int, int]] = {}
+        self.journal_offset = self.journal_path.stat().st_size if self.journal_path.exists() else 0
+
+    @property
+    def collections(self) -> List[str]:
+        """Names of the collections registered in _metadata.json."""
+        return list(self.metadata.get("collections", {}))
+
+    def _path(self, name: str) -> Path:
+        entry = self.metadata["collections"].get(name)
+        if entry is None:
+            raise KeyError(f"Unknown collection: {name}")
+        return self.data_dir / entry["file"]
+
+    def _stat(self, name: str) -> Tuple[int, int]:
+        st = self._path(name).stat()
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, name: str) -> List[Dict[str, Any]]:
+        """Records of a collection, loaded on first use.
+
+        The returned list is the store's own copy; mutate through the store.
+        """
+        if name not in self._records:
+            self._load(name)
+        return self._records[name]
+
+    def _load(self, name: str) -> None:
+        with open(self._path(name), "r", encoding="utf-8") as f:
+            self._records[name] = json.load(f)
+        self._file_stats[name] = self._stat(name)
+
+    # ---- Change tracking ----
+
+    def read_journal(self, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Read journal entries appended after a byte offset.
+
+        Args:
+            offset: Offset returned by a previous call (0 for the whole journal)
+
+        Returns:
+            Tuple of (entries, new offset). A partially written last line is
+            left for the next call.
+        """
+        if not self.journal_path.exists():
+            return [], 0
+        entries = []
+        with open(self.journal_path, "rb") as f:
+            # The journal was truncated after a commit; start over
+            if offset > os.fstat(f.fileno()).st_size:
+                offset = 0
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping corrupt journal line at offset {offset - len(line)}")
+        return entries, offset
+
+    def changed_collections(self) -> List[str]:
+        """Collections that changed since this store last loaded or refreshed them."""
+        entries, _ = self.read_journal(self.journal_offset)
+        changed = {entry["collection"] for entry in entries}
+        for name in self._records:
+            if name not in changed and self._file_stats.get(name) != self._stat(name):
+                changed.add(name)
+        return sorted(changed)
+
+    def refresh(self) -> List[str]:
+        """Reload only the collections that changed since the last refresh.
+
+        Returns:
+            Names of the reloaded collections
+        """
+        entries, offset = self.read_journal(self.journal_offset)
+        changed = {entry["collection"] for entry in entries}
+        self.journal_offset = offset
+
+        if self.metadata_path.exists():
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                self.metadata = json.load(f)
+
+        reloaded = []
+        for name in list(self._records):
+            if name in changed or self._file_stats.get(name) != self._stat(name):
+                self._load(name)
+                reloaded.append(name)
+        return reloaded
+
+    # ---- Mutations ----
+
+    def _append_journal(self, entry: Dict[str, Any]) -> int:
+        """Append one entry and return the journal offset just past it."""
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        # O_APPEND keeps concurrent writers from interleaving within a line
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+            end = os.lseek(fd, 0, os.SEEK_CUR)
+        finally:
+            os.close(fd)
+        return end
+
+    def _commit(self, name: str, op: str, record_id: Optional[str], mutate: Mutation) -> Any:
+        with file_lock(self.lock_path):
+            # Start from what other stores have written, not our possibly stale copy
+            if name not in self._records or self._file_stats.get(name) != self._stat(name):
+                self._load(name)
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                self.metadata = json.load(f)
+
+            pending, _ = self.read_journal(0)
+            touched = {name}
+            for entry in pending:
+                if entry.get("collection") in self.metadata.get("collections", {}):
+                    logger.warning(f"Replaying unfinished {entry.get('op')} on {entry['collection']}")
+                    _replay(self.get(entry["collection"]), entry)
+                    touched.add(entry["collection"])
+
+            result = mutate(self._records[name])
+            timestamp = utc_now_iso()
+            self._append_journal({
+                "ts": timestamp,
+                "time": time.time(),
+                "collection": name,
+                "op": op,
+                "id": record_id,
+                "record": result,
+            })
+
+            files: Dict[Path, Any] = {}
+            for collection in touched:
+                records = self._records[collection]
+                entry = self.metadata["collections"][collection]
+                entry["count"] = len(records)
+                entry["lastUpdated"] = _last_updated(records, entry.get("lastUpdated") or timestamp)
+                files[self._path(collection)] = records
+            files[self.metadata_path] = self.metadata
+            write_json_files_atomic(files)
+
+            # Everything in the journal is now on disk
+            os.truncate(self.journal_path, 0)
+            self.journal_offset = 0
+            for collection in touched:
+                self._file_stats[collection] = self._stat(collection)
+        return result
+
+    def _position(self, name: str, record_id: str) -> int:
+        for i, record in enumerate(self.get(name)):
+            if record.get("id") == record_id:
+                return i
+        raise KeyError(f"No record {record_id!r} in {name}")
+
+    def insert(self, name: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a record. Its id must be unique in the collection."""
+        def mutate(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+            if any(r.get("id") == record.get("id") for r in records):
+                raise ValueError(f"Record {record.get('id')!r} already exists in {name}")
+            records.append(record)
+            return record
+
+        return self._commit(name, "insert", record.get("id"), mutate)
+
+    def update(self, name: str, record_id: str, changes: Dict[str, Any], touch: bool = True) -> Dict[str, Any]:
+        """Merge top-level fields into a record.
+
+        The fields are merged into the record as currently stored, so
+        concurrent updates of other fields by other stores are kept.
+
+        Args:
+            name: Collection name
+            record_id: Id of the record to change
+            changes: Fields to set
+            touch: Also set updatedAt to now
+
+        Returns:
+            The updated record
+        """
+        def mutate(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+            record = records[self._position(name, record_id)]
+            record.update(changes)
+            if touch:
+                record["updatedAt"] = utc_now_iso()
+            return record
+
+        return self._commit(name, "update", record_id, mutate)
+
+    def delete(self, name: str, record_id: str) -> None:
+        """Remove a record."""
+        def mutate(records: List[Dict[str, Any]]) -> None:
+            del records[self._position(name, record_id)]
+
+        self._commit(name, "delete", record_id, mutate)
+
+    def replace(self, name: str, records: List[Dict[str, Any]]) -> None:
+        """Replace the whole collection (e.g. after a bulk rewrite)."""
+        def mutate(current: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            current[:] = list(records)
+            return current
+
+        self._commit(name, "replace", None, mutate)
+
+    def sync_metadata(self, dry_run: bool = False) -> List[str]:
+        """Recompute every collection's count and lastUpdated from its file.
+
+        lastUpdated becomes the newest updatedAt (or lastUpdated) found in the
+        records, keeping the recorded value when records carry neither; this
+        is the same value every commit writes.
+
+        Args:
+            dry_run: Report the stale collections without writing _metadata.json
+
+        Returns:
+            Names of the collections whose metadata changed
+        """
+        with file_lock(self.lock_path):
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                self.metadata = json.load(f)
+            return self._sync_metadata(dry_run)
+
+    def _sync_metadata(self, dry_run: bool) -> List[str]:
+        changed = []
+        for name, entry in self.metadata.get("collections", {}).items():
+            if not self._path(name).exists():
+                logger.warning(f"Collection file missing: {entry.get('file')}")
+                continue
+            records = self.get(name)
+            last_updated = _last_updated(records, entry.get("lastUpdated"))
+            if entry.get("count") != len(records) or entry.get("lastUpdated") != last_updated:
+                entry["count"] = len(records)
+                entry["lastUpdated"] = last_updated
+                changed.append(name)
+
+        if changed and not dry_run:
+            write_json_files_atomic({self.metadata_path: self.metadata})
+        return changed
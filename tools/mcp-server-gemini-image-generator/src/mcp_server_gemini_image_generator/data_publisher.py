@@ -0,0 +1,139 @@
+"""
+Publish public/data collections as minified, precompressed, hashed files
+
+Each collection is minified and written as ``<name>.<hash>.json`` together
+with ``.gz`` and (when the ``brotli`` package is installed) ``.br`` siblings
+at maximum compression, so they can be served with immutable caching. A
+``manifest.json`` maps logical names to the hashed files. Collections whose
+minified content hash matches the manifest are not recompressed.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from .utils import get_public_dir, write_text_atomic
+except ImportError:
+    from utils import get_public_dir, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+HASH_LENGTH = 12
+
+
+def minify_json(path: Path) -> bytes:
+    """Parse a JSON file and re-serialize it without whitespace."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _write_bytes_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    tmp_path.replace(path)
+
+
+def _load_manifest(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable publish manifest: {str(e)}")
+        return {}
+
+
+def publish_collections(public_dir: Optional[Path] = None,
+                        output_dir: Optional[Path] = None,
+                        force: bool = False) -> Dict[str, List[str]]:
+    """Minify, compress and content-hash every collection in public/data.
+
+    Files starting with ``_`` or ``.`` (metadata, journal) are skipped.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        output_dir: Where to publish (defaults to public/data/published)
+        force: Recompress collections even if their hash is unchanged
+
+    Returns:
+        Dict with "published", "unchanged" and "removed" collection names
+    """
+    public_dir = Path(public_dir or get_public_dir())
+    data_dir = public_dir / "data"
+    output_dir = Path(output_dir or data_dir / "published")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest_path = output_dir / MANIFEST_FILE
+    previous = _load_manifest(manifest_path).get("collections", {})
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    if brotli is None:
+        logger.info("brotli package not installed; publishing gzip only")
+
+    collections: Dict[str, Any] = {}
+    result: Dict[str, List[str]] = {"published": [], "unchanged": [], "removed": []}
+
+    for path in sorted(data_dir.glob("*.json")):
+        if path.name.startswith(("_", ".")):
+            continue
+        name = path.stem
+        content = minify_json(path)
+        digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        filename = f"{name}.{digest}.json"
+
+        entry = previous.get(name)
+        if (not force and entry and entry.get("hash") == digest and entry.get("encodings") == encodings
+                and (output_dir / filename).exists()):
+            collections[name] = entry
+            result["unchanged"].append(name)
+            continue
+
+        _write_bytes_atomic(output_dir / filename, content)
+        sizes = {"identity": len(content)}
+        gz = gzip.compress(content, compresslevel=9, mtime=0)
+        _write_bytes_atomic(output_dir / f"{filename}.gz", gz)
+        sizes["gzip"] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(content, quality=11)
+            _write_bytes_atomic(output_dir / f"{filename}.br", br)
+            sizes["br"] = len(br)
+
+        collections[name] = {
+            "file": filename,
+            "hash": digest,
+            "encodings": encodings,
+            "sizes": sizes,
+            "sourceSize": path.stat().st_size,
+        }
+        result["published"].append(name)
+        logger.info(f"Published {name}: {sizes['identity']} bytes minified, {sizes['gzip']} gzip")
+
+    result["removed"] = sorted(set(previous) - set(collections))
+
+    # Drop hashed files that the new manifest no longer references
+    referenced = {entry["file"] for entry in collections.values()}
+    for path in output_dir.glob("*.json*"):
+        if path.name == MANIFEST_FILE:
+            continue
+        base = path.name[:-len(path.suffix)] if path.suffix in (".gz", ".br") else path.name
+        if base not in referenced:
+            path.unlink()
+
+    if result["published"] or result["removed"] or not manifest_path.exists():
+        manifest = {"version": 1, "collections": collections}
+        write_text_atomic(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False) + "\n")
+
+    return result
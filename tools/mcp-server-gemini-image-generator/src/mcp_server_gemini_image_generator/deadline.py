@@ -0,0 +1,144 @@
+"""
+Per-request deadlines and per-stage timeouts
+
+A tool call gets an overall deadline (MCP_REQUEST_TIMEOUT seconds) carried
+in a context variable, so every stage it awaits — translation, task
+creation, polling, download, save — can bound itself by whichever is
+sooner: its own timeout (MCP_TIMEOUT_<STAGE>) or the time left on the
+request. Timeouts surface as StageTimeout, a TimeoutError naming the stage.
+
+Cancellation from the MCP client arrives as CancelledError in the tool's
+task and propagates through every stage awaited here, since nothing in
+this module catches it.
+
+Stages running in worker threads cannot be stopped midway. Saving has no
+timeout and always finishes before a cancellation propagates, so a file
+is never written after the tool has returned (see server.save_image_async).
+Decoding threads only stop being awaited; they have no side effects and
+their result is discarded.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_REQUEST_TIMEOUT = 300.0
+
+# Seconds per stage, overridable with MCP_TIMEOUT_<STAGE>; "text" is one batched text request
+DEFAULT_STAGE_TIMEOUTS: Dict[str, float] = {
+    "translate": 30.0,
+    "filename": 20.0,
+    "text": 60.0,
+    "gemini": 120.0,
+    "create": 30.0,
+    "poll": 120.0,
+    "download": 60.0,
+    "decode": 30.0,
+}
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class StageTimeout(TimeoutError):
+    """A stage ran past its own timeout or the request deadline."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout:.1f}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+def stage_timeout(stage: str) -> Optional[float]:
+    """Configured timeout of a stage in seconds, or None if it has none."""
+    value = os.environ.get(f"MCP_TIMEOUT_{stage.upper()}")
+    if value is not None:
+        return float(value) if float(value) > 0 else None
+    return DEFAULT_STAGE_TIMEOUTS.get(stage)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def time_budget(stage: str) -> Optional[float]:
+    """Time a stage may take: the sooner of its timeout and the request deadline."""
+    limits = [limit for limit in (stage_timeout(stage), remaining()) if limit is not None]
+    return min(limits) if limits else None
+
+
+async def with_timeout(stage: str, awaitable: Awaitable[T]) -> T:
+    """Await a stage within its time budget.
+
+    Raises:
+        StageTimeout: If the budget runs out; the awaitable is cancelled
+    """
+    budget = time_budget(stage)
+    if budget is None:
+        return await awaitable
+    if budget <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise StageTimeout(stage, 0.0)
+    start = time.monotonic()
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError as e:
+        # Let timeouts raised inside the stage (nested stages, sockets) through as they are
+        if isinstance(e, StageTimeout) or time.monotonic() - start < budget:
+            raise
+        raise StageTimeout(stage, budget)
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float] = None) -> Iterator[float]:
+    """Set the deadline of the current request.
+
+    A deadline already in effect is never extended.
+
+    Args:
+        seconds: Time allowed (defaults to MCP_REQUEST_TIMEOUT or 300)
+
+    Yields:
+        The deadline as a time.monotonic() value
+    """
+    if seconds is None:
+        seconds = float(os.environ.get("MCP_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT))
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_tool(func: Callable) -> Callable:
+    """Run each call of an async tool under a request deadline.
+
+    The whole call is cancelled if it outlives the deadline, which also
+    stops any stage that did not bound itself.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with request_deadline() as deadline:
+            start = time.monotonic()
+            budget = deadline - start
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), budget)
+            except asyncio.TimeoutError as e:
+                if isinstance(e, StageTimeout) or time.monotonic() - start < budget:
+                    raise
+                raise StageTimeout("request", budget)
+    return wrapper
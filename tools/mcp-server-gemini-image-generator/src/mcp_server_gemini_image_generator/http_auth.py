@@ -0,0 +1,60 @@
+"""
+Bearer token authentication for the HTTP transports
+
+The SSE and streamable HTTP transports expose every tool, including ones
+that read local files and the profiling summary, to whoever can reach the
+port. When MCP_AUTH_TOKEN (or --auth-token) is set, every HTTP request must
+carry ``Authorization: Bearer <token>``. Without a token the server only
+listens on loopback addresses.
+"""
+
+import hmac
+import ipaddress
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+ASGIApp = Callable[..., Awaitable[None]]
+
+
+def is_loopback(host: str) -> bool:
+    """Whether a listen address only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        # Other host names may resolve to anything
+        return False
+
+
+class BearerTokenMiddleware:
+    """ASGI middleware that rejects HTTP requests without the expected bearer token."""
+
+    def __init__(self, app: ASGIApp, token: str):
+        self.app = app
+        self.expected = f"Bearer {token}".encode("utf-8")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        # Lifespan events carry no headers and must reach the app
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        if hmac.compare_digest(headers.get(b"authorization", b""), self.expected):
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client") or ("unknown", 0)
+        logger.warning(f"Rejected unauthenticated request from {client[0]} to {scope.get('path', '')}")
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"www-authenticate", b"Bearer")],
+        })
+        await send({"type": "http.response.body", "body": b"Unauthorized\n"})
@@ -0,0 +1,146 @@
+"""
+Decoded source-image cache for image transformations
+
+Transforming the same catalog photo with different prompts would otherwise
+decode and downscale the full-resolution file on every call. Decoded images
+are kept pre-downscaled to the model input size, keyed by path, mtime and
+size, and evicted least recently used once their pixel memory exceeds a
+budget. JPEGs are decoded in draft mode, so the decoder never produces more
+pixels than the model input needs.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import PIL.Image
+
+logger = logging.getLogger(__name__)
+
+# Longest side of the image handed to the model
+DEFAULT_MAX_SIDE = 1536
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_CacheKey = Tuple[str, int, int]
+
+
+def _image_bytes(img: PIL.Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+def decode_source_image(path: Union[str, Path], max_side: int = DEFAULT_MAX_SIDE) -> PIL.Image.Image:
+    """Decode an image file no larger than max_side on its longest side.
+
+    Args:
+        path: Image file
+        max_side: Longest side of the result in pixels
+
+    Returns:
+        Fully loaded PIL image in RGB, RGBA or L mode
+
+    Raises:
+        PIL.UnidentifiedImageError: If the file is not a recognised image
+    """
+    with PIL.Image.open(path) as img:
+        if img.format == "JPEG":
+            # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding
+            img.draft("RGB", (max_side, max_side))
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        else:
+            img.load()
+            img = img.copy()
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), PIL.Image.Resampling.LANCZOS)
+    return img
+
+
+class SourceImageCache:
+    """LRU cache of decoded, downscaled source images bounded by pixel memory."""
+
+    def __init__(self, max_bytes: Optional[int] = None, max_side: Optional[int] = None):
+        """Configure the cache.
+
+        Args:
+            max_bytes: Pixel memory budget (defaults to SOURCE_IMAGE_CACHE_BYTES or 256 MB)
+            max_side: Longest side of cached images (defaults to SOURCE_IMAGE_MAX_SIDE or 1536)
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.environ.get("SOURCE_IMAGE_CACHE_BYTES", DEFAULT_MAX_BYTES))
+        self.max_side = max_side if max_side is not None else int(
+            os.environ.get("SOURCE_IMAGE_MAX_SIDE", DEFAULT_MAX_SIDE))
+        self._entries: "OrderedDict[_CacheKey, PIL.Image.Image]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: Union[str, Path]) -> PIL.Image.Image:
+        """Return the decoded image for a file, decoding it on a miss.
+
+        The returned image is shared with other callers and must not be
+        modified in place.
+
+        Args:
+            path: Image file
+
+        Returns:
+            Decoded, downscaled PIL image
+        """
+        resolved = os.path.realpath(path)
+        st = os.stat(resolved)
+        key = (resolved, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        img = decode_source_image(resolved, self.max_side)
+        size = _image_bytes(img)
+        if size > self.max_bytes:
+            return img
+
+        with self._lock:
+            # Drop entries for older versions of the same file
+            for stale in [k for k in self._entries if k[0] == resolved and k != key]:
+                self._size -= _image_bytes(self._entries.pop(stale))
+            if key not in self._entries:
+                self._entries[key] = img
+                self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= _image_bytes(evicted)
+            return self._entries[key]
+
+    def clear(self) -> None:
+        """Drop every cached image."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Pixel memory currently held, in bytes."""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_source_image_cache: Optional[SourceImageCache] = None
+
+
+def get_source_image_cache() -> SourceImageCache:
+    """Get the process-wide source image cache."""
+    global _source_image_cache
+    if _source_image_cache is None:
+        _source_image_cache = SourceImageCache()
+    return _source_image_cache
@@ -0,0 +1,154 @@
+"""
+Header-only image probing
+
+Reads just enough of an image file to report its format and pixel
+dimensions, without decoding any pixel data.
+"""
+
+import os
+import struct
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+# Bytes read up front; enough for every supported header except JPEG,
+# whose frame header is found by seeking from segment to segment
+_HEAD_SIZE = 64
+
+# JPEG start-of-frame markers (SOF0-SOF15, excluding DHT, JPG and DAC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                     0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+
+class ImageInfo(NamedTuple):
+    """Format and dimensions read from an image header."""
+    format: str
+    width: int
+    height: int
+    size: int
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    @property
+    def aspect_ratio(self) -> str:
+        """Reduced aspect ratio, e.g. "16:9"."""
+        return aspect_ratio(self.width, self.height)
+
+
+def aspect_ratio(width: int, height: int) -> str:
+    """Reduce width and height to an "W:H" aspect ratio string."""
+    a, b = width, height
+    while b:
+        a, b = b, a % b
+    if not a:
+        return "0:0"
+    return f"{width // a}:{height // a}"
+
+
+def probe_image(path: Union[str, Path]) -> Optional[ImageInfo]:
+    """Read the format and dimensions of an image file from its header.
+
+    Args:
+        path: Image file to probe
+
+    Returns:
+        ImageInfo, or None if the file is not a recognised image
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        return _probe(f, size)
+
+
+def probe_image_bytes(data: Union[bytes, memoryview]) -> Optional[ImageInfo]:
+    """Read the format and dimensions of in-memory image data.
+
+    Only a prefix is needed: for PNG, GIF and WebP the first 32 bytes suffice.
+
+    Args:
+        data: Image bytes, or a prefix of them
+
+    Returns:
+        ImageInfo (with size set to len(data)), or None if unrecognised
+    """
+    return _probe(BytesIO(data), len(data))
+
+
+def _probe(f: BinaryIO, size: int) -> Optional[ImageInfo]:
+    head = f.read(_HEAD_SIZE)
+
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", head[16:24])
+        return ImageInfo("png", width, height, size)
+
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", head[6:10])
+        return ImageInfo("gif", width, height, size)
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _probe_webp(head, size)
+
+    if head[:2] == b"\xff\xd8":
+        f.seek(2)
+        return _probe_jpeg(f, size)
+
+    return None
+
+
+def _probe_webp(head: bytes, size: int) -> Optional[ImageInfo]:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF, size)
+    if chunk == b"VP8L" and head[20:21] == b"\x2f":
+        bits = int.from_bytes(head[21:25], "little")
+        return ImageInfo("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, size)
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return ImageInfo("webp", width, height, size)
+    return None
+
+
+def _probe_jpeg(f: BinaryIO, size: int) -> Optional[ImageInfo]:
+    while True:
+        byte = f.read(1)
+        # Skip fill bytes between segments
+        while byte == b"\xff":
+            marker = f.read(1)
+            if marker != b"\xff":
+                break
+        else:
+            return None
+        if not marker:
+            return None
+
+        code = marker[0]
+        # Standalone markers carry no length field
+        if code == 0x01 or 0xD0 <= code <= 0xD8:
+            continue
+        if code in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return None
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+
+        if code in _JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return ImageInfo("jpeg", width, height, size)
+
+        f.seek(length - 2, os.SEEK_CUR)
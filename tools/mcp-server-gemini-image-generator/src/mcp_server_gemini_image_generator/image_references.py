@@ -0,0 +1,200 @@
+"""
+Integrity check for image references in the public/data collections
+
+Collects every image URL the site data points at (product images and
+primary images, OpenGraph images in the SEO settings, blog cover images and
+``<img>`` tags in post content), then stats and header-probes the files in a
+thread pool. Only image headers are read, so the check stays fast on a large
+media tree.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from .image_probe import ImageInfo, probe_image
+    from .utils import get_public_dir
+except ImportError:
+    from image_probe import ImageInfo, probe_image
+    from utils import get_public_dir
+
+logger = logging.getLogger(__name__)
+
+# Format implied by a file extension
+EXTENSION_FORMATS = {
+    ".png": "png",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".gif": "gif",
+    ".webp": "webp",
+}
+
+# Issue kinds that mean the reference is broken rather than just suspicious
+ERROR_KINDS = frozenset({"missing", "not-image", "format-mismatch", "dimension-mismatch"})
+
+
+class ImageReference(NamedTuple):
+    """One place in the data that points at an image."""
+    source: str
+    url: str
+    dimensions: Optional[Dict[str, Any]] = None
+    is_placeholder: bool = False
+
+
+class ImageIssue(NamedTuple):
+    """A problem found with an image reference."""
+    kind: str
+    reference: ImageReference
+    detail: str
+
+    @property
+    def is_error(self) -> bool:
+        return self.kind in ERROR_KINDS
+
+
+class _ImageSourceExtractor(HTMLParser):
+    """Collects the src of every <img> in an HTML fragment."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sources: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "img":
+            src = dict(attrs).get("src")
+            if src:
+                self.sources.append(src)
+
+
+def html_image_sources(html: str) -> List[str]:
+    """Return the src attribute of every <img> in an HTML fragment."""
+    extractor = _ImageSourceExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.sources
+
+
+def _load(data_dir: Path, filename: str) -> List[Dict[str, Any]]:
+    path = data_dir / filename
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def collect_image_references(data_dir: Path) -> List[ImageReference]:
+    """Every image reference in products, SEO settings and blog posts."""
+    references = []
+
+    for product in _load(data_dir, "products.json"):
+        pid = product.get("id")
+        for image in product.get("images", []):
+            if image.get("url"):
+                references.append(ImageReference(
+                    f"products/{pid}/images/{image.get('id')}",
+                    image["url"],
+                    image.get("dimensions"),
+                    bool(image.get("isPlaceholder", False)),
+                ))
+        if product.get("primaryImage"):
+            references.append(ImageReference(f"products/{pid}/primaryImage", product["primaryImage"]))
+
+    for setting in _load(data_dir, "seo-settings.json"):
+        for key in ("openGraph", "twitter"):
+            image = (setting.get(key) or {}).get("image")
+            if image:
+                references.append(ImageReference(f"seo-settings/{setting.get('page')}/{key}.image", image))
+
+    for post in _load(data_dir, "blog-posts.json"):
+        slug = post.get("slug") or post.get("id")
+        if post.get("coverImage"):
+            references.append(ImageReference(f"blog-posts/{slug}/coverImage", post["coverImage"]))
+        og_image = (post.get("seo") or {}).get("openGraphImage")
+        if og_image:
+            references.append(ImageReference(f"blog-posts/{slug}/seo.openGraphImage", og_image))
+        for src in html_image_sources(post.get("content") or ""):
+            references.append(ImageReference(f"blog-posts/{slug}/content", src))
+
+    return references
+
+
+def resolve_url(public_dir: Path, url: str) -> Optional[Path]:
+    """Map a site-relative image URL to a file under public/, or None if external."""
+    if url.startswith(("http://", "https://", "//", "data:")):
+        return None
+    return public_dir / url.split("?", 1)[0].split("#", 1)[0].lstrip("/")
+
+
+def _probe(path: Path) -> Tuple[bool, Optional[ImageInfo]]:
+    try:
+        return True, probe_image(path)
+    except FileNotFoundError:
+        return False, None
+    except OSError as e:
+        logger.warning(f"Could not read {path}: {str(e)}")
+        return False, None
+
+
+def check_image_references(public_dir: Optional[Path] = None,
+                           max_workers: int = 16) -> Tuple[List[ImageReference], List[ImageIssue]]:
+    """Validate every image reference against the files on disk.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        max_workers: Threads used to stat and probe files
+
+    Returns:
+        Tuple of (all references, issues found)
+    """
+    public_dir = Path(public_dir or get_public_dir())
+    references = collect_image_references(public_dir / "data")
+
+    paths = {ref.url: resolve_url(public_dir, ref.url) for ref in references}
+    local = sorted({path for path in paths.values() if path is not None})
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        probes = dict(zip(local, pool.map(_probe, local)))
+
+    issues = []
+    users: Dict[str, List[ImageReference]] = {}
+    for ref in references:
+        path = paths[ref.url]
+        if path is None:
+            continue
+        if ref.is_placeholder:
+            issues.append(ImageIssue("placeholder", ref, "marked isPlaceholder"))
+
+        exists, info = probes[path]
+        if not exists:
+            issues.append(ImageIssue("missing", ref, f"no file at {path.relative_to(public_dir)}"))
+            continue
+        if info is None:
+            issues.append(ImageIssue("not-image", ref, "file is not a PNG, JPEG, GIF or WebP image"))
+            continue
+
+        expected_format = EXTENSION_FORMATS.get(path.suffix.lower())
+        if expected_format and expected_format != info.format:
+            issues.append(ImageIssue("format-mismatch", ref, f"{path.suffix} file contains {info.format}"))
+
+        declared = ref.dimensions or {}
+        if declared.get("width") and declared.get("height"):
+            if (declared["width"], declared["height"]) != (info.width, info.height):
+                issues.append(ImageIssue(
+                    "dimension-mismatch", ref,
+                    f"declared {declared['width']}x{declared['height']}, actual {info.width}x{info.height}",
+                ))
+
+        if ref.source.startswith("products/") and "/images/" in ref.source:
+            users.setdefault(ref.url, []).append(ref)
+
+    # The same file shown as an image of several products is usually a stand-in
+    for url, refs in users.items():
+        owners = {ref.source.split("/")[1] for ref in refs}
+        if len(owners) > 1:
+            for ref in refs:
+                issues.append(ImageIssue("shared", ref, f"also used by {', '.join(sorted(owners - {ref.source.split('/')[1]}))}"))
+
+    return references, issues
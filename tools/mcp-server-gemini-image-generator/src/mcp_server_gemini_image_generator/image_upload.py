@@ -0,0 +1,164 @@
+"""
+Size-bounded decoding of base64 image uploads
+
+A ``data:image/...;base64,`` URL is checked before it is fully decoded:
+its decoded size is computed from the payload length, and only the first
+few kilobytes are decoded to read the format and dimensions from the image
+header. Uploads over the byte or pixel caps are rejected without ever
+holding their decoded form in memory.
+
+The payload is then decoded in fixed-size chunks into a single buffer, so
+besides the caller's string only the decoded image and one chunk are ever
+held in memory; there is no full ASCII copy of the payload.
+"""
+
+import binascii
+import os
+from io import BytesIO
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+import PIL.Image
+
+try:
+    from .image_probe import ImageInfo, probe_image_bytes
+except ImportError:
+    from image_probe import ImageInfo, probe_image_bytes
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 40_000_000
+
+# Base64 characters encoded and decoded at a time; the first chunk is also
+# the prefix probed for the image header
+_CHUNK_CHARS = 64 * 1024
+
+# The data URL header is short; never scan further than this for ";base64,"
+_MAX_HEADER_CHARS = 256
+
+_MARKER = ";base64,"
+
+# Bytes outside the base64 alphabet, which a2b_base64 skips (line breaks etc.)
+_IGNORED = bytes(set(range(256)) - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="))
+
+
+class UploadLimits(NamedTuple):
+    """Caps applied to decoded uploads."""
+    max_bytes: int
+    max_pixels: int
+
+    @classmethod
+    def from_env(cls) -> "UploadLimits":
+        """Limits from MAX_UPLOAD_BYTES and MAX_UPLOAD_PIXELS."""
+        return cls(
+            int(os.environ.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_BYTES)),
+            int(os.environ.get("MAX_UPLOAD_PIXELS", DEFAULT_MAX_PIXELS)),
+        )
+
+
+def _check_dimensions(width: int, height: int, limits: UploadLimits) -> None:
+    if width * height > limits.max_pixels:
+        raise ValueError(f"Image is {width}x{height} pixels; the limit is {limits.max_pixels} pixels")
+
+
+def _decode_chunks(payload: str, start: int) -> Iterator[bytes]:
+    """Decode base64 from payload[start:] one chunk at a time.
+
+    Characters a2b_base64 would skip are dropped first, and an incomplete
+    4-character quantum is carried into the next chunk, so the result is
+    the same as decoding the whole payload at once.
+    """
+    carry = b""
+    for offset in range(start, len(payload), _CHUNK_CHARS):
+        try:
+            chunk = carry + payload[offset:offset + _CHUNK_CHARS].encode("ascii").translate(None, _IGNORED)
+        except UnicodeEncodeError:
+            raise ValueError("Invalid base64 encoding. Please provide a valid base64 encoded image.")
+        whole = len(chunk) - len(chunk) % 4
+        carry = chunk[whole:]
+        if whole:
+            yield binascii.a2b_base64(chunk[:whole])
+    if carry:
+        # Raises binascii.Error (incorrect padding) like a whole-payload decode
+        yield binascii.a2b_base64(carry)
+
+
+def decode_data_url(encoded_image: str, limits: Optional[UploadLimits] = None) -> Tuple[bytes, str, Optional[ImageInfo]]:
+    """Validate and decode a base64 image data URL.
+
+    Args:
+        encoded_image: "data:image/<format>;base64,<data>"
+        limits: Byte and pixel caps (defaults to UploadLimits.from_env())
+
+    Returns:
+        Tuple of (decoded bytes, MIME type, header info or None if the
+        format is not one image_probe understands)
+
+    Raises:
+        ValueError: If the URL is malformed, not valid base64 or over a limit
+    """
+    limits = limits or UploadLimits.from_env()
+    if not encoded_image.startswith("data:image/"):
+        raise ValueError("Invalid image format. Expected data:image/[format];base64,[data]")
+
+    marker = encoded_image.find(_MARKER, 0, _MAX_HEADER_CHARS)
+    if marker < 0:
+        raise ValueError("Invalid image data format. Image must be in format 'data:image/[format];base64,[data]'")
+    mime_type = encoded_image[5:marker]
+    if not mime_type.isascii():
+        raise ValueError("Invalid base64 encoding. Please provide a valid base64 encoded image.")
+    start = marker + len(_MARKER)
+
+    # Upper bound of the decoded size (whitespace and padding only shrink it),
+    # checked before anything is decoded
+    if (len(encoded_image) - start) * 3 // 4 > limits.max_bytes:
+        raise ValueError(f"Image is larger than the {limits.max_bytes} byte upload limit")
+
+    # The buffer never outgrows the limit checked above, and getvalue()
+    # returns its storage without copying it
+    buffer = BytesIO()
+    info = None
+    try:
+        for index, decoded in enumerate(_decode_chunks(encoded_image, start)):
+            buffer.write(decoded)
+            if index == 0:
+                # Reject oversized images before decoding the rest
+                info = probe_image_bytes(decoded)
+                if info is not None:
+                    _check_dimensions(info.width, info.height, limits)
+    except binascii.Error:
+        raise ValueError("Invalid base64 encoding. Please provide a valid base64 encoded image.")
+    image_bytes = buffer.getvalue()
+    if info is not None:
+        info = info._replace(size=len(image_bytes))
+
+    if info is None:
+        # JPEG frame headers can sit beyond the probed prefix
+        info = probe_image_bytes(image_bytes)
+        if info is not None:
+            _check_dimensions(info.width, info.height, limits)
+    return image_bytes, mime_type, info
+
+
+def load_image_from_data_url(encoded_image: str, limits: Optional[UploadLimits] = None) -> Tuple[PIL.Image.Image, str]:
+    """Decode a base64 image data URL into a fully loaded PIL image.
+
+    Blocking; run it in a worker thread from async code.
+
+    Args:
+        encoded_image: "data:image/<format>;base64,<data>"
+        limits: Byte and pixel caps (defaults to UploadLimits.from_env())
+
+    Returns:
+        Tuple of (PIL image, MIME type)
+
+    Raises:
+        ValueError: If the upload is malformed or over a limit
+        PIL.UnidentifiedImageError: If the data is not a recognised image
+    """
+    limits = limits or UploadLimits.from_env()
+    image_bytes, mime_type, _ = decode_data_url(encoded_image, limits)
+    # BytesIO shares the bytes object's buffer instead of copying it
+    img = PIL.Image.open(BytesIO(image_bytes))
+    # Opening only parsed the header; check formats image_probe does not cover
+    _check_dimensions(img.width, img.height, limits)
+    img.load()
+    return img, mime_type
@@ -0,0 +1,276 @@
+"""
+Shared SQLite work queue for image generation workers
+
+Workers in any number of processes (or hosts sharing the file) lease jobs
+one at a time. A lease expires unless the worker heartbeats it, after which
+another worker may reclaim the job. The KIE.ai task id is recorded as soon
+as it is created, so a reclaimed job resumes polling the existing task
+instead of generating the image a second time.
+
+SQLite locking relies on the filesystem; on network mounts make sure POSIX
+locks are supported (NFSv4, SMB with locking enabled).
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from urllib.parse import quote
+
+try:
+    from .catalog_jobs import ImageJob
+except ImportError:
+    from catalog_jobs import ImageJob
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    task_id TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+_COMPLETED = """SELECT job_key, attempts, task_id, result, created_at, started_at, finished_at
+                FROM jobs WHERE state = 'done' ORDER BY finished_at"""
+
+
+class JobQueue:
+    """Lease-based job queue stored in a single SQLite file."""
+
+    def __init__(self, path: Union[str, Path], max_attempts: int = 3):
+        """Open (and create if needed) a queue file.
+
+        Args:
+            path: SQLite database file
+            max_attempts: Leases allowed per job before it is marked failed
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A short-lived connection per operation keeps the queue safe to use
+        # from worker threads without sharing connection state
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, jobs: Iterable[ImageJob], reset: bool = False) -> int:
+        """Add jobs to the queue. Jobs already present are left untouched.
+
+        Args:
+            jobs: Jobs to add, keyed by ImageJob.key
+            reset: Put existing jobs with the same key back to pending
+
+        Returns:
+            Number of jobs inserted or reset
+        """
+        now = time.time()
+        rows = [(job.key, json.dumps(job.to_dict()), now) for job in jobs]
+        with self._transaction() as conn:
+            if reset:
+                cursor = conn.executemany(
+                    """INSERT INTO jobs (job_key, payload, created_at) VALUES (?, ?, ?)
+                       ON CONFLICT (job_key) DO UPDATE SET
+                           payload = excluded.payload, state = 'pending', worker_id = NULL,
+                           lease_expires = NULL, attempts = 0, task_id = NULL,
+                           result = NULL, error = NULL""",
+                    rows,
+                )
+            else:
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (job_key, payload, created_at) VALUES (?, ?, ?)",
+                    rows,
+                )
+            return cursor.rowcount
+
+    def lease(self, worker_id: str, lease_seconds: float = 60.0) -> Optional[Dict[str, Any]]:
+        """Claim the oldest available job.
+
+        Pending jobs and leased jobs whose lease has expired are available.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            lease_seconds: How long the claim lasts without a heartbeat
+
+        Returns:
+            Dict with "job" (ImageJob), "task_id" (from an earlier attempt, or
+            None) and "attempts", or None if nothing is available
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                """UPDATE jobs SET state = 'leased', worker_id = ?, lease_expires = ?,
+                       attempts = attempts + 1, started_at = COALESCE(started_at, ?)
+                   WHERE job_key = (
+                       SELECT job_key FROM jobs
+                       WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+                         AND attempts < ?
+                       ORDER BY created_at, job_key LIMIT 1)
+                   RETURNING job_key, payload, task_id, attempts""",
+                (worker_id, now + lease_seconds, now, now, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                # Expired leases that are out of attempts will never be picked up again
+                conn.execute(
+                    """UPDATE jobs SET state = 'failed', error = COALESCE(error, 'lease expired')
+                       WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                    (now, self.max_attempts),
+                )
+                return None
+
+        return {
+            "job": ImageJob.from_dict(json.loads(row["payload"])),
+            "task_id": row["task_id"],
+            "attempts": row["attempts"],
+        }
+
+    def heartbeat(self, job_key: str, worker_id: str, lease_seconds: float = 60.0) -> bool:
+        """Extend a lease.
+
+        Returns:
+            False if the lease was lost to another worker
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE job_key = ? AND worker_id = ? AND state = 'leased'",
+                (time.time() + lease_seconds, job_key, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def record_task(self, job_key: str, worker_id: str, task_id: str) -> bool:
+        """Remember the remote task created for a job so it can be resumed."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET task_id = ? WHERE job_key = ? AND worker_id = ? AND state = 'leased'",
+                (task_id, job_key, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_key: str, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """Mark a leased job as done.
+
+        Returns:
+            False if the lease was lost before completion
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """UPDATE jobs SET state = 'done', result = ?, error = NULL, finished_at = ?,
+                       lease_expires = NULL
+                   WHERE job_key = ? AND worker_id = ? AND state = 'leased'""",
+                (json.dumps(result or {}), time.time(), job_key, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_key: str, worker_id: str, error: str, retry: bool = True,
+             task_failed: bool = False) -> None:
+        """Release a leased job after an error.
+
+        The job returns to pending while it has attempts left (and retry is
+        set), otherwise it is marked failed. The recorded task id is kept so
+        the next attempt resumes polling it, unless the provider reported the
+        task itself as failed (task_failed), in which case a new task is needed.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE jobs SET
+                       state = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END,
+                       error = ?, task_id = CASE WHEN ? THEN NULL ELSE task_id END, lease_expires = NULL,
+                       finished_at = CASE WHEN ? AND attempts < ? THEN NULL ELSE ? END
+                   WHERE job_key = ? AND worker_id = ? AND state = 'leased'""",
+                (retry, self.max_attempts, error, task_failed, retry, self.max_attempts, time.time(),
+                 job_key, worker_id),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Count jobs by state."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update({row["state"]: row["n"] for row in rows})
+        return counts
+
+    def completed(self) -> List[Dict[str, Any]]:
+        """Rows of finished jobs, with their timings and results."""
+        with self._connect() as conn:
+            rows = conn.execute(_COMPLETED).fetchall()
+        return [dict(row) for row in rows]
+
+
+class QueueReader:
+    """Read-only view of an existing queue file, for dry runs and reports.
+
+    Unlike JobQueue it never creates the file, switches the journal mode
+    or runs the schema, so it is safe to point at a queue that workers are
+    using.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        uri = f"file:{quote(str(self.path.resolve()))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def completed(self) -> List[Dict[str, Any]]:
+        """Rows of finished jobs, with their timings and results."""
+        with self._connect() as conn:
+            rows = conn.execute(_COMPLETED).fetchall()
+        return [dict(row) for row in rows]
+
+
+def get_job_queue_path(output_dir: Optional[Union[str, Path]] = None) -> Path:
+    """Get JOB_QUEUE_PATH, or <output_dir>/queue.sqlite3."""
+    path = os.environ.get("JOB_QUEUE_PATH")
+    if path:
+        return Path(path)
+    if output_dir is None:
+        output_dir = os.environ.get("OUTPUT_IMAGE_PATH", "generated-images")
+    return Path(output_dir) / "queue.sqlite3"
+
+
+def get_job_queue(output_dir: Optional[Union[str, Path]] = None) -> JobQueue:
+    """Open the queue at JOB_QUEUE_PATH, or <output_dir>/queue.sqlite3."""
+    return JobQueue(get_job_queue_path(output_dir))
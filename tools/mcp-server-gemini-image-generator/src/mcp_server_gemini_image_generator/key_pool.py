@@ -0,0 +1,251 @@
+"""
+API-key pools for spreading requests across several provider accounts
+
+Each provider reads a comma-separated key list (``KIE_API_KEYS``,
+``GEMINI_API_KEYS``) and falls back to its single-key variable. Requests
+lease the least-loaded healthy key: fewest calls in flight, then fewest
+calls in the last minute. A key that answers 429 cools down for the
+provider's Retry-After (or KEY_COOLDOWN_SECONDS), and repeated failures
+back it off exponentially. An optional per-key requests-per-minute cap
+(``KIE_KEY_RPM``, ``GEMINI_KEY_RPM``) makes callers wait for capacity
+instead of drawing 429s.
+
+Asynchronous tasks are bound to the key that created them, since a task
+can only be queried with that account's key.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COOLDOWN = 60.0
+
+# Failures in a row before a key is backed off, and the longest back-off
+FAILURE_THRESHOLD = 3
+MAX_BACKOFF = 300.0
+
+# Task bindings remembered per pool
+MAX_BINDINGS = 10000
+
+_WINDOW = 60.0
+
+_RATE_LIMIT_PATTERN = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|rate limit", re.IGNORECASE)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether an exception from a provider SDK or HTTP call is a 429."""
+    code = getattr(error, "code", None) or getattr(error, "status", None) or getattr(error, "status_code", None)
+    if code == 429:
+        return True
+    message = str(error)
+    return bool(_RATE_LIMIT_PATTERN.search(message))
+
+
+def is_server_error(error: BaseException) -> bool:
+    """Whether an exception carries a 5xx status code."""
+    code = getattr(error, "code", None) or getattr(error, "status", None) or getattr(error, "status_code", None)
+    return isinstance(code, int) and code >= 500
+
+
+def _mask(key: str) -> str:
+    return f"...{key[-4:]}" if len(key) > 8 else "..."
+
+
+class _KeyState:
+    """Load and health of a single key."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.in_flight = 0
+        self.recent: Deque[float] = deque()
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.last_used = 0.0
+
+    def prune(self, now: float) -> None:
+        while self.recent and now - self.recent[0] >= _WINDOW:
+            self.recent.popleft()
+
+    def available_at(self, now: float, max_per_minute: Optional[int]) -> float:
+        """Earliest monotonic time the key may take another request."""
+        ready = max(now, self.cooldown_until)
+        if max_per_minute and len(self.recent) >= max_per_minute:
+            ready = max(ready, self.recent[-max_per_minute] + _WINDOW)
+        return ready
+
+
+class APIKeyPool:
+    """Least-loaded rotation over several API keys of one provider."""
+
+    def __init__(self, name: str, keys: List[str],
+                 max_per_minute: Optional[int] = None,
+                 cooldown: float = DEFAULT_COOLDOWN):
+        """Create a pool.
+
+        Args:
+            name: Provider name used in log messages
+            keys: API keys; duplicates and blanks are dropped
+            max_per_minute: Per-key request cap, or None for no cap
+            cooldown: Seconds a key rests after a 429 without Retry-After
+        """
+        unique = list(dict.fromkeys(key.strip() for key in keys if key and key.strip()))
+        if not unique:
+            raise ValueError(f"No API keys configured for {name}")
+        self.name = name
+        self.max_per_minute = max_per_minute
+        self.cooldown = cooldown
+        self._states: Dict[str, _KeyState] = {key: _KeyState(key) for key in unique}
+        self._bindings: "OrderedDict[str, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    @property
+    def keys(self) -> List[str]:
+        """All keys in configuration order."""
+        return list(self._states)
+
+    def _pick(self, now: float) -> Optional[_KeyState]:
+        ready = []
+        for state in self._states.values():
+            state.prune(now)
+            if state.available_at(now, self.max_per_minute) <= now:
+                ready.append(state)
+        if not ready:
+            return None
+        return min(ready, key=lambda s: (s.in_flight, len(s.recent), s.last_used))
+
+    async def acquire(self) -> str:
+        """Choose the least-loaded available key, waiting if every key is cooling down or at its cap."""
+        while True:
+            now = time.monotonic()
+            state = self._pick(now)
+            if state is not None:
+                return state.key
+            wait = min(s.available_at(now, self.max_per_minute) for s in self._states.values()) - now
+            logger.info(f"All {self.name} keys are busy; waiting {wait:.1f}s")
+            await asyncio.sleep(max(wait, 0.05))
+
+    @asynccontextmanager
+    async def lease(self, key: Optional[str] = None) -> AsyncIterator[str]:
+        """Hold a key for one request.
+
+        Args:
+            key: Use this key (e.g. the one bound to a task) instead of choosing one
+
+        Yields:
+            The API key to send
+        """
+        if key is None or key not in self._states:
+            key = await self.acquire()
+        state = self._states[key]
+        now = time.monotonic()
+        state.in_flight += 1
+        state.requests += 1
+        state.recent.append(now)
+        state.last_used = now
+        try:
+            yield key
+        finally:
+            state.in_flight -= 1
+
+    def mark_success(self, key: str) -> None:
+        """Record a successful request."""
+        state = self._states.get(key)
+        if state is not None:
+            state.consecutive_failures = 0
+
+    def mark_rate_limited(self, key: str, retry_after: Optional[float] = None) -> None:
+        """Rest a key after a 429 response."""
+        state = self._states.get(key)
+        if state is None:
+            return
+        delay = retry_after if retry_after and retry_after > 0 else self.cooldown
+        state.rate_limited += 1
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + delay)
+        logger.warning(f"{self.name} key {_mask(key)} rate limited; cooling down for {delay:.0f}s")
+
+    def mark_failure(self, key: str) -> None:
+        """Record a server or network failure; repeated failures back the key off."""
+        state = self._states.get(key)
+        if state is None:
+            return
+        state.failures += 1
+        state.consecutive_failures += 1
+        if state.consecutive_failures >= FAILURE_THRESHOLD:
+            delay = min(MAX_BACKOFF, 5.0 * 2 ** (state.consecutive_failures - FAILURE_THRESHOLD))
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + delay)
+            logger.warning(f"{self.name} key {_mask(key)} failed {state.consecutive_failures} times in a row; "
+                           f"backing off for {delay:.0f}s")
+
+    def bind(self, task_id: str, key: str) -> None:
+        """Remember which key created a task."""
+        self._bindings[task_id] = key
+        self._bindings.move_to_end(task_id)
+        while len(self._bindings) > MAX_BINDINGS:
+            self._bindings.popitem(last=False)
+
+    def key_for(self, task_id: str) -> Optional[str]:
+        """Key that created a task, if this process created it."""
+        return self._bindings.get(task_id)
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Per-key counters with masked keys."""
+        now = time.monotonic()
+        result = []
+        for state in self._states.values():
+            state.prune(now)
+            result.append({
+                "key": _mask(state.key),
+                "inFlight": state.in_flight,
+                "lastMinute": len(state.recent),
+                "requests": state.requests,
+                "rateLimited": state.rate_limited,
+                "failures": state.failures,
+                "coolingDownFor": round(max(0.0, state.cooldown_until - now), 1),
+            })
+        return result
+
+
+def keys_from_env(plural_var: str, single_var: str) -> List[str]:
+    """Keys from a comma-separated variable, falling back to the single-key variable."""
+    value = os.environ.get(plural_var) or os.environ.get(single_var) or ""
+    return [key.strip() for key in value.split(",") if key.strip()]
+
+
+_pools: Dict[str, APIKeyPool] = {}
+
+
+def get_key_pool(provider: str) -> APIKeyPool:
+    """Get the process-wide pool for a provider ("KIE" or "GEMINI").
+
+    Keys come from <PROVIDER>_API_KEYS or <PROVIDER>_API_KEY, the per-key
+    cap from <PROVIDER>_KEY_RPM and the 429 cooldown from KEY_COOLDOWN_SECONDS.
+
+    Raises:
+        ValueError: If no key is configured
+    """
+    provider = provider.upper()
+    pool = _pools.get(provider)
+    if pool is None:
+        keys = keys_from_env(f"{provider}_API_KEYS", f"{provider}_API_KEY")
+        if not keys:
+            raise ValueError(f"{provider}_API_KEY environment variable not set")
+        rpm = os.environ.get(f"{provider}_KEY_RPM")
+        pool = APIKeyPool(
+            provider, keys,
+            max_per_minute=int(rpm) if rpm else None,
+            cooldown=float(os.environ.get("KEY_COOLDOWN_SECONDS", DEFAULT_COOLDOWN)),
+        )
+        _pools[provider] = pool
+    return pool
@@ -1,15 +1,46 @@
 import asyncio
 import logging
-import os
 import ssl
 import time
 from typing import Dict, List, Optional, Tuple, Any
 import aiohttp
 import json
 
+try:
+    from .deadline import remaining, stage_timeout, with_timeout
+    from .key_pool import APIKeyPool, get_key_pool
+    from .log_context import LogSampler, stage
+except ImportError:
+    from deadline import remaining, stage_timeout, with_timeout
+    from key_pool import APIKeyPool, get_key_pool
+    from log_context import LogSampler, stage
+
 logger = logging.getLogger(__name__)
 
 
+class KIERateLimitError(Exception):
+    """Raised when KIE.ai rejects a request with 429 for the key used."""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KIETaskFailedError(Exception):
+    """Raised when KIE.ai reports that a task failed; the task will never produce a result."""
+    
+    def __init__(self, task_id: str, message: str):
+        super().__init__(f"Task {task_id} failed: {message}")
+        self.task_id = task_id
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
 class KIEAPIClient:
     """Client for KIE.ai Nano Banana API with task-based workflow support."""
     
@@ -17,20 +48,15 @@ class KIEAPIClient:
         """Initialize the KIE.ai API client.
         
         Args:
-            api_key: KIE.ai API key. If not provided, will try to get from environment.
+            api_key: KIE.ai API key. If not provided, the shared pool of keys from
+                     KIE_API_KEYS (or KIE_API_KEY) is used.
         """
-        self.api_key = api_key or os.environ.get("KIE_API_KEY")
-        if not self.api_key:
-            raise ValueError("KIE_API_KEY environment variable not set")
+        self.key_pool = APIKeyPool("KIE", [api_key]) if api_key else get_key_pool("KIE")
         
         self.base_url = "https://api.kie.ai/api/v1"
         # Correct endpoints based on official documentation
         self.create_task_endpoint = "/jobs/createTask"
         self.query_task_endpoint = "/jobs/recordInfo"
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
         
         # Default parameters
         self.default_params = {
@@ -42,6 +68,70 @@ class KIEAPIClient:
         self.ssl_context = ssl.create_default_context()
         self.ssl_context.check_hostname = False
         self.ssl_context.verify_mode = ssl.CERT_NONE
+        
+        # One pooled session per event loop, so connections stay warm between calls
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it for the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=self.ssl_context, ttl_dns_cache=300)
+            )
+            self._session_loop = loop
+        return self._session
+    
+    def _headers(self, api_key: str) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+    
+    async def _call(self, method: str, url: str, api_key: str, action: str, **kwargs) -> Dict[str, Any]:
+        """Send one API request with a key and return the response's data field.
+        
+        The outcome is recorded in the key pool: 429s cool the key down and
+        server or network errors count against its health.
+        
+        Raises:
+            KIERateLimitError: If the key is rate limited
+            Exception: If the request fails
+        """
+        session = self._get_session()
+        try:
+            async with session.request(method, url, headers=self._headers(api_key), **kwargs) as response:
+                if response.status == 429:
+                    retry_after = _retry_after(response.headers.get("Retry-After"))
+                    self.key_pool.mark_rate_limited(api_key, retry_after)
+                    raise KIERateLimitError(f"Failed to {action}: 429 - rate limited", retry_after)
+                if response.status != 200:
+                    error_text = await response.text()
+                    if response.status >= 500:
+                        self.key_pool.mark_failure(api_key)
+                    raise Exception(f"Failed to {action}: {response.status} - {error_text}")
+                result = await response.json()
+        except aiohttp.ClientError as e:
+            self.key_pool.mark_failure(api_key)
+            logger.error(f"Network error while trying to {action}: {str(e)}")
+            raise Exception(f"Network error: {str(e)}")
+        
+        if result.get("code") == 429:
+            self.key_pool.mark_rate_limited(api_key)
+            raise KIERateLimitError(f"API error: {result.get('msg', 'rate limited')}")
+        if result.get("code") != 200:
+            error_msg = result.get("msg", "Unknown error")
+            raise Exception(f"API error: {error_msg}")
+        self.key_pool.mark_success(api_key)
+        return result.get("data", {})
+    
+    async def close(self) -> None:
+        """Close the shared HTTP session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
     
     async def _test_endpoints(self) -> bool:
         """Test if the API endpoints are accessible."""
@@ -55,20 +145,21 @@ class KIEAPIClient:
             }
         }
         
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=self.ssl_context)) as session:
-            try:
-                url = f"{self.base_url}{self.create_task_endpoint}"
-                async with session.post(url, headers=self.headers, json=test_payload) as response:
-                    # We expect either 200 (success) or 400 (bad request due to test prompt)
-                    if response.status in [200, 400]:
-                        logger.info(f"API endpoint accessible: {url} (status: {response.status})")
-                        return True
-                    else:
-                        logger.warning(f"API endpoint returned unexpected status: {response.status}")
-                        return False
-            except Exception as e:
-                logger.error(f"API endpoint test failed: {str(e)}")
-                return False
+        session = self._get_session()
+        try:
+            url = f"{self.base_url}{self.create_task_endpoint}"
+            async with self.key_pool.lease() as api_key, \
+                    session.post(url, headers=self._headers(api_key), json=test_payload) as response:
+                # We expect either 200 (success) or 400 (bad request due to test prompt)
+                if response.status in [200, 400]:
+                    logger.info(f"API endpoint accessible: {url} (status: {response.status})")
+                    return True
+                else:
+                    logger.warning(f"API endpoint returned unexpected status: {response.status}")
+                    return False
+        except Exception as e:
+            logger.error(f"API endpoint test failed: {str(e)}")
+            return False
     
     async def create_task(self, 
                          prompt: str, 
@@ -106,29 +197,26 @@ class KIEAPIClient:
         if image_urls:
             logger.warning("Image editing is not supported in the current KIE.ai API. Using text-to-image generation only.")
         
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=self.ssl_context)) as session:
-            try:
-                url = f"{self.base_url}{self.create_task_endpoint}"
-                async with session.post(url, headers=self.headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("code") == 200:
-                            task_id = result.get("data", {}).get("taskId")
-                            if not task_id:
-                                raise Exception("No taskId returned from API")
-                            
-                            logger.info(f"Created KIE.ai task: {task_id}")
-                            return task_id
-                        else:
-                            error_msg = result.get("msg", "Unknown error")
-                            raise Exception(f"API error: {error_msg}")
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Failed to create task: {response.status} - {error_text}")
-                    
-            except aiohttp.ClientError as e:
-                logger.error(f"Network error creating task: {str(e)}")
-                raise Exception(f"Network error: {str(e)}")
+        url = f"{self.base_url}{self.create_task_endpoint}"
+        # On 429, move on to the next least-loaded key
+        attempts = len(self.key_pool)
+        for attempt in range(attempts):
+            async with self.key_pool.lease() as api_key:
+                try:
+                    data = await self._call("POST", url, api_key, "create task", json=payload)
+                except KIERateLimitError:
+                    if attempt + 1 < attempts:
+                        continue
+                    raise
+            
+            task_id = data.get("taskId")
+            if not task_id:
+                raise Exception("No taskId returned from API")
+            
+            # The task can only be queried with the key that created it
+            self.key_pool.bind(task_id, api_key)
+            logger.info(f"Created KIE.ai task: {task_id}")
+            return task_id
     
     async def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """Get the status of a task.
@@ -142,26 +230,29 @@ class KIEAPIClient:
         Raises:
             Exception: If status check fails
         """
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=self.ssl_context)) as session:
-            try:
-                url = f"{self.base_url}{self.query_task_endpoint}?taskId={task_id}"
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"Failed to get task status: {response.status} - {error_text}")
-                    
-                    result = await response.json()
-                    if result.get("code") == 200:
-                        task_data = result.get("data", {})
-                        logger.debug(f"Task {task_id} status: {task_data.get('state')}")
-                        return task_data
-                    else:
-                        error_msg = result.get("msg", "Unknown error")
-                        raise Exception(f"API error: {error_msg}")
-                    
-            except aiohttp.ClientError as e:
-                logger.error(f"Network error getting task status: {str(e)}")
-                raise Exception(f"Network error: {str(e)}")
+        url = f"{self.base_url}{self.query_task_endpoint}?taskId={task_id}"
+        api_key = self.key_pool.key_for(task_id)
+        if api_key is None and len(self.key_pool) > 1:
+            return await self._find_task(task_id, url)
+        
+        async with self.key_pool.lease(api_key) as api_key:
+            return await self._call("GET", url, api_key, "get task status")
+    
+    async def _find_task(self, task_id: str, url: str) -> Dict[str, Any]:
+        """Query a task created elsewhere (e.g. by a previous worker) with each key until one owns it."""
+        last_error: Optional[Exception] = None
+        for api_key in self.key_pool.keys:
+            async with self.key_pool.lease(api_key):
+                try:
+                    data = await self._call("GET", url, api_key, "get task status")
+                except KIERateLimitError:
+                    raise
+                except Exception as e:
+                    last_error = e
+                    continue
+            self.key_pool.bind(task_id, api_key)
+            return data
+        raise last_error or Exception(f"Task {task_id} not found")
     
     async def wait_for_completion(self, 
                                  task_id: str, 
@@ -180,23 +271,40 @@ class KIEAPIClient:
         Raises:
             Exception: If task fails or times out
         """
+        # Never poll past the deadline of the request waiting for the result
+        time_left = remaining()
+        if time_left is not None:
+            max_wait_time = min(max_wait_time, time_left)
+        
         start_time = time.time()
+        # Only the first poll, state changes and every Nth poll are logged
+        sampler = LogSampler()
         
         while time.time() - start_time < max_wait_time:
-            status_result = await self.get_task_status(task_id)
+            try:
+                status_result = await self.get_task_status(task_id)
+            except KIERateLimitError as e:
+                # The task's key is cooling down; keep waiting rather than failing the task
+                logger.warning(f"Polling task {task_id} was rate limited")
+                await asyncio.sleep(max(poll_interval, e.retry_after or 0))
+                continue
             state = status_result.get("state")
             
             if state == "success":
-                logger.info(f"Task {task_id} completed successfully")
+                logger.info(f"Task {task_id} completed successfully after {sampler.count + 1} polls")
                 return status_result
             elif state == "fail":
                 fail_msg = status_result.get("failMsg", "Unknown error")
-                raise Exception(f"Task {task_id} failed: {fail_msg}")
+                raise KIETaskFailedError(task_id, fail_msg)
             elif state in ["waiting"]:
-                logger.debug(f"Task {task_id} still processing (state: {state})")
+                if sampler.should_log(state):
+                    skipped = sampler.take_skipped()
+                    suffix = f", {skipped} similar polls not logged" if skipped else ""
+                    logger.debug(f"Task {task_id} still processing (state: {state}, poll {sampler.count}{suffix})")
                 await asyncio.sleep(poll_interval)
             else:
-                logger.warning(f"Unknown task state: {state}")
+                if sampler.should_log(state):
+                    logger.warning(f"Unknown task state: {state}")
                 await asyncio.sleep(poll_interval)
         
         raise Exception(f"Task {task_id} timed out after {max_wait_time} seconds")
@@ -204,7 +312,7 @@ class KIEAPIClient:
     async def generate_image(self, 
                            prompt: str,
                            output_format: str = "png",
-                           image_size: str = "auto") -> Tuple[bytes, str]:
+                           image_size: str = "auto") -> Tuple[bytes, str, str]:
         """Generate an image from text prompt.
         
         Args:
@@ -213,28 +321,50 @@ class KIEAPIClient:
             image_size: Image size ("auto", "1:1", "3:4", "9:16", "4:3", "16:9")
             
         Returns:
-            Tuple of (image_data, image_url)
+            Tuple of (image_data, image_url, task_id); record the task id with
+            the saved image
             
         Raises:
             Exception: If generation fails
         """
         # Create task
-        task_id = await self.create_task(
-            prompt=prompt,
-            model="google/nano-banana",
-            output_format=output_format,
-            image_size=image_size
-        )
+        with stage("kie_create"):
+            task_id = await with_timeout("create", self.create_task(
+                prompt=prompt,
+                model="google/nano-banana",
+                output_format=output_format,
+                image_size=image_size
+            ))
+        
+        image_data, image_url = await self.fetch_result(task_id)
+        return image_data, image_url, task_id
+    
+    async def fetch_result(self, task_id: str, max_wait_time: Optional[float] = None) -> Tuple[bytes, str]:
+        """Wait for an existing task to finish and download its image.
+        
+        Args:
+            task_id: The task ID returned by create_task
+            max_wait_time: Maximum time to wait for completion in seconds
+                           (defaults to MCP_TIMEOUT_POLL or 120)
+            
+        Returns:
+            Tuple of (image_data, image_url)
+            
+        Raises:
+            Exception: If the task fails, times out or the download fails
+        """
+        if max_wait_time is None:
+            max_wait_time = stage_timeout("poll") or 120
         
         # Wait for completion
-        result = await self.wait_for_completion(task_id)
+        with stage("kie_wait"):
+            result = await self.wait_for_completion(task_id, max_wait_time=max_wait_time)
         
         # Extract image data from resultJson
         result_json_str = result.get("resultJson")
         if not result_json_str:
             raise Exception("No resultJson returned from KIE.ai API")
         
-        import json
         try:
             result_json = json.loads(result_json_str)
         except json.JSONDecodeError as e:
@@ -247,15 +377,20 @@ class KIEAPIClient:
         image_url = result_urls[0]  # Get first image URL
         
         # Download image data
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=self.ssl_context)) as session:
-            async with session.get(image_url) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to download image: {response.status}")
-                
-                image_data = await response.read()
-                logger.info(f"Downloaded image from KIE.ai: {len(image_data)} bytes")
-                
-                return image_data, image_url
+        with stage("kie_download"):
+            image_data = await with_timeout("download", self._download(image_url))
+            return image_data, image_url
+    
+    async def _download(self, image_url: str) -> bytes:
+        """Download a result image."""
+        session = self._get_session()
+        async with session.get(image_url) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to download image: {response.status}")
+            
+            image_data = await response.read()
+            logger.info(f"Downloaded image from KIE.ai: {len(image_data)} bytes")
+            return image_data
     
     async def edit_image(self, 
                         prompt: str,
@@ -303,3 +438,9 @@ def get_kie_client() -> KIEAPIClient:
     if _kie_client is None:
         _kie_client = KIEAPIClient()
     return _kie_client
+
+
+async def close_kie_client() -> None:
+    """Close the global client's HTTP session, if one was opened."""
+    if _kie_client is not None:
+        await _kie_client.close()
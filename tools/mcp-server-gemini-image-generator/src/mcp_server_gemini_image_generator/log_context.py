@@ -0,0 +1,226 @@
+"""
+Non-blocking structured logging for the MCP server
+
+Records are handed to a ``QueueHandler`` and written to stderr by a
+``QueueListener`` thread, so a slow stderr consumer (an editor hosting the
+server) never stalls the event loop. Each record carries the request id,
+tool name and stage timings of the tool call it was logged from, taken from
+context variables that follow the call across awaits and worker threads.
+
+Output is one JSON object per line unless LOG_FORMAT=text.
+"""
+
+import atexit
+import copy
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_tool_name: ContextVar[Optional[str]] = ContextVar("tool_name", default=None)
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("stages", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Queue bound; records beyond it are dropped rather than blocking the caller
+DEFAULT_QUEUE_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+_traceback_formatter = logging.Formatter()
+
+
+def current_request_id() -> Optional[str]:
+    """Request id of the tool call being handled, if any."""
+    return _request_id.get()
+
+
+class ContextFilter(logging.Filter):
+    """Copies the request context onto records in the logging thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        record.tool = _tool_name.get()
+        stages = _stages.get()
+        # Snapshot: the listener formats the record after the call moves on
+        record.stages = dict(stages) if stages else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in ("request_id", "tool", "stages", "duration_ms"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now, but keep the traceback separate for the JSON "exc" field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging(level: Optional[str] = None,
+                  log_format: Optional[str] = None,
+                  stream: Any = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a background writer thread.
+
+    Safe to call more than once; later calls return the running listener.
+
+    Args:
+        level: Root log level (defaults to LOG_LEVEL or INFO)
+        log_format: "json" or "text" (defaults to LOG_FORMAT or json)
+        stream: Output stream (defaults to stderr)
+
+    Returns:
+        The started QueueListener
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.environ.get("LOG_FORMAT", "json")).lower()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(
+        int(os.environ.get("LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the wall time of a block as a stage of the current tool call.
+
+    Repeated stages with the same name accumulate.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = _stages.get()
+        if stages is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            stages[name] = round(stages.get(name, 0.0) + elapsed, 1)
+
+
+def logged_tool(func: Callable) -> Callable:
+    """Give each call of an async tool its own request id and stage timings.
+
+    Logs one summary record per call with the total duration and the time
+    spent in each stage().
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        tokens = (
+            _request_id.set(uuid.uuid4().hex[:12]),
+            _tool_name.set(func.__name__),
+            _stages.set({}),
+        )
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            duration = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(f"{func.__name__} finished in {duration} ms", extra={"duration_ms": duration})
+            _stages.reset(tokens[2])
+            _tool_name.reset(tokens[1])
+            _request_id.reset(tokens[0])
+    return wrapper
+
+
+class LogSampler:
+    """Decides which of a series of repetitive log lines to emit.
+
+    The first occurrence, every Nth one and any change of key (such as a
+    task state) are emitted; the rest are counted and reported as skipped
+    on the next emitted line.
+    """
+
+    def __init__(self, every: Optional[int] = None):
+        """Configure the sampler.
+
+        Args:
+            every: Emit one line in this many (defaults to LOG_POLL_SAMPLE or 10)
+        """
+        self.every = max(1, every if every is not None else int(os.environ.get("LOG_POLL_SAMPLE", 10)))
+        self.count = 0
+        self.skipped = 0
+        self._last_key: Any = None
+
+    def should_log(self, key: Any = None) -> bool:
+        """Count one occurrence and tell whether to log it."""
+        changed = self.count == 0 or key != self._last_key
+        self._last_key = key
+        self.count += 1
+        if changed or (self.count - 1) % self.every == 0:
+            return True
+        self.skipped += 1
+        return False
+
+    def take_skipped(self) -> int:
+        """Number of lines skipped since the last call, resetting the count."""
+        skipped, self.skipped = self.skipped, 0
+        return skipped
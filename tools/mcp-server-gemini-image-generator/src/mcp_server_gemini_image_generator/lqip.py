@@ -0,0 +1,287 @@
+"""
+Low-quality image placeholders for catalog images
+
+For every product image this computes a BlurHash, a tiny inline WebP
+(``data:`` URI), the dominant colour and the exact pixel dimensions, so the
+storefront can paint a placeholder and reserve layout space before the full
+image arrives. Results are stored on each ``images[]`` entry of
+``products.json`` and mirrored into ``media-assets.json``.
+
+Work is done in a process pool, and images whose content hash matches the
+``sourceHash`` recorded last time are skipped.
+"""
+
+import base64
+import io
+import json
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import PIL.Image
+
+try:
+    from .blob_store import hash_file
+    from .catalog_writeback import utc_now_iso
+    from .collection_store import CollectionStore
+    from .image_probe import MIME_TYPES, aspect_ratio
+    from .utils import get_public_dir
+except ImportError:
+    from blob_store import hash_file
+    from catalog_writeback import utc_now_iso
+    from collection_store import CollectionStore
+    from image_probe import MIME_TYPES, aspect_ratio
+    from utils import get_public_dir
+
+logger = logging.getLogger(__name__)
+
+# BlurHash components along x and y
+BLURHASH_COMPONENTS = (4, 3)
+
+# Longest side of the image the BlurHash is computed from
+BLURHASH_SAMPLE_SIZE = 32
+
+# Longest side and quality of the inline WebP preview
+LQIP_SIZE = 16
+LQIP_QUALITY = 40
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exponent: float) -> float:
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def blurhash_encode(pixels: Sequence[Tuple[int, int, int]], width: int, height: int,
+                    components: Tuple[int, int] = BLURHASH_COMPONENTS) -> str:
+    """Encode RGB pixels as a BlurHash string.
+
+    Args:
+        pixels: Row-major RGB tuples (e.g. from a small thumbnail)
+        width: Image width in pixels
+        height: Image height in pixels
+        components: Number of x and y components (1-9 each)
+
+    Returns:
+        BlurHash string
+    """
+    x_components, y_components = components
+    linear = [(_srgb_to_linear(r), _srgb_to_linear(g), _srgb_to_linear(b)) for r, g, b in pixels]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                wy = cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * wy
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(c) for factor in ac for c in factor)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        maximum = 1
+    result += _encode83(quantised_max, 1)
+
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (int(max(0, min(18, math.floor(_sign_pow(c / maximum, 0.5) * 9 + 9.5)))) for c in factor)
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def compute_placeholder(path: str) -> Optional[Dict[str, Any]]:
+    """Compute the placeholder data for one image file.
+
+    Args:
+        path: Image file
+
+    Returns:
+        Dict with width, height, format, blurhash, lqip and dominantColor, or
+        None if the file is not a decodable image
+    """
+    try:
+        with PIL.Image.open(path) as img:
+            width, height = img.size
+            image_format = (img.format or "").lower()
+            # JPEG can decode straight to a reduced size
+            img.draft("RGB", (BLURHASH_SAMPLE_SIZE * 4, BLURHASH_SAMPLE_SIZE * 4))
+            rgb = img.convert("RGB")
+    except (OSError, ValueError, PIL.UnidentifiedImageError):
+        return None
+
+    sample = rgb.copy()
+    sample.thumbnail((BLURHASH_SAMPLE_SIZE, BLURHASH_SAMPLE_SIZE), PIL.Image.Resampling.BOX)
+    blurhash = blurhash_encode(list(sample.getdata()), sample.width, sample.height)
+
+    tiny = rgb.copy()
+    tiny.thumbnail((LQIP_SIZE, LQIP_SIZE), PIL.Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    tiny.save(buffer, format="WEBP", quality=LQIP_QUALITY, method=6)
+    lqip = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    # Most common colour of a small adaptive palette
+    palette_image = sample.quantize(colors=8)
+    palette = palette_image.getpalette()
+    _, index = max(palette_image.getcolors())
+    dominant = "#{:02x}{:02x}{:02x}".format(*palette[index * 3:index * 3 + 3])
+
+    return {
+        "width": width,
+        "height": height,
+        "format": "jpeg" if image_format == "jpg" else image_format,
+        "blurhash": blurhash,
+        "lqip": lqip,
+        "dominantColor": dominant,
+    }
+
+
+def _url_to_path(url: str, public_dir: Path) -> Optional[Path]:
+    if url.startswith(("http://", "https://", "//", "data:")):
+        return None
+    return public_dir / url.split("?", 1)[0].lstrip("/")
+
+
+def _media_asset(url: str, path: Path, digest: str, result: Dict[str, Any],
+                 usage: List[str], existing: Optional[Dict[str, Any]], now: str) -> Dict[str, Any]:
+    asset = dict(existing or {})
+    asset.update({
+        "id": (existing or {}).get("id") or f"asset-{digest[:16]}",
+        "filename": path.name,
+        "path": url.lstrip("/"),
+        "url": url,
+        "mimeType": MIME_TYPES.get(result["format"], "application/octet-stream"),
+        "size": path.stat().st_size,
+        "dimensions": {"width": result["width"], "height": result["height"]},
+        "usage": usage,
+        "uploadedAt": (existing or {}).get("uploadedAt") or now,
+        "updatedAt": now,
+    })
+    metadata = dict(asset.get("metadata") or {})
+    metadata.update({
+        "sha256": digest,
+        "blurhash": result["blurhash"],
+        "lqip": result["lqip"],
+        "dominantColor": result["dominantColor"],
+    })
+    asset["metadata"] = metadata
+    return asset
+
+
+def build_placeholders(public_dir: Optional[Path] = None,
+                       max_workers: Optional[int] = None,
+                       force: bool = False,
+                       dry_run: bool = False) -> Dict[str, int]:
+    """Compute placeholders for every product image and store them.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        max_workers: Process pool size (defaults to the CPU count)
+        force: Recompute even when the source hash is unchanged
+        dry_run: Compute but do not write products.json or media-assets.json
+
+    Returns:
+        Counts of images seen, computed, skipped as unchanged and unreadable
+    """
+    public_dir = Path(public_dir or get_public_dir())
+    store = CollectionStore(public_dir / "data")
+    products = json.loads(json.dumps(store.get("products")))
+    assets = json.loads(json.dumps(store.get("media-assets")))
+    assets_by_url = {asset.get("url"): asset for asset in assets}
+
+    # Group image entries by file so shared images are processed once
+    entries_by_path: Dict[Path, List[Dict[str, Any]]] = {}
+    urls: Dict[Path, str] = {}
+    usage: Dict[Path, List[str]] = {}
+    for product in products:
+        for image in product.get("images", []):
+            path = _url_to_path(image.get("url", ""), public_dir)
+            if path is None or not path.is_file():
+                continue
+            entries_by_path.setdefault(path, []).append(image)
+            urls[path] = image["url"]
+            if product["id"] not in usage.setdefault(path, []):
+                usage[path].append(product["id"])
+
+    digests = {path: hash_file(path) for path in entries_by_path}
+    stale = [
+        path for path, entries in entries_by_path.items()
+        if force
+        or any((entry.get("placeholder") or {}).get("sourceHash") != digests[path] for entry in entries)
+        or (assets_by_url.get(urls[path]) or {}).get("metadata", {}).get("sha256") != digests[path]
+    ]
+
+    results: Dict[Path, Optional[Dict[str, Any]]] = {}
+    if stale:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = dict(zip(stale, pool.map(compute_placeholder, [str(p) for p in stale])))
+
+    now = utc_now_iso()
+    unreadable = 0
+    for path in stale:
+        result = results[path]
+        if result is None:
+            logger.warning(f"Not a decodable image: {path}")
+            unreadable += 1
+            continue
+        placeholder = {
+            "blurhash": result["blurhash"],
+            "lqip": result["lqip"],
+            "dominantColor": result["dominantColor"],
+            "sourceHash": digests[path],
+        }
+        for entry in entries_by_path[path]:
+            entry["placeholder"] = placeholder
+            entry["dimensions"] = {
+                "width": result["width"],
+                "height": result["height"],
+                "aspectRatio": aspect_ratio(result["width"], result["height"]),
+            }
+        url = urls[path]
+        assets_by_url[url] = _media_asset(url, path, digests[path], result, usage[path], assets_by_url.get(url), now)
+
+    computed = len(stale) - unreadable
+    if computed and not dry_run:
+        store.replace("products", products)
+        store.replace("media-assets", sorted(assets_by_url.values(), key=lambda asset: asset["url"]))
+
+    return {
+        "images": len(entries_by_path),
+        "computed": computed,
+        "unchanged": len(entries_by_path) - len(stale),
+        "unreadable": unreadable,
+    }
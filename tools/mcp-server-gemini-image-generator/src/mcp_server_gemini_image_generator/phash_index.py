@@ -0,0 +1,266 @@
+"""
+Perceptual-hash index for near-duplicate image detection
+
+Each image is reduced to a 64-bit difference hash (dHash). Hashes live in a
+compact ``array('Q')`` and are additionally split into four 16-bit bands, so
+lookups within a Hamming distance of 3 only compare candidates that share a
+band exactly (by the pigeonhole principle every such match does). Hashing
+runs in a process pool and only files whose size or mtime changed are
+re-hashed.
+"""
+
+import json
+import logging
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import PIL.Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def dhash_file(path: Union[str, Path]) -> Optional[int]:
+    """Compute the 64-bit difference hash of an image file.
+
+    Args:
+        path: Image file
+
+    Returns:
+        Hash as an unsigned 64-bit integer, or None if the file is not an image
+    """
+    try:
+        with PIL.Image.open(path) as img:
+            # Let the JPEG decoder skip detail that the 9x8 thumbnail discards
+            img.draft("L", (64, 64))
+            pixels = list(img.convert("L").resize((9, 8), PIL.Image.Resampling.LANCZOS).getdata())
+    except (OSError, ValueError, PIL.UnidentifiedImageError):
+        return None
+
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+
+def _same_file(a: str, b: str) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class PerceptualHashIndex:
+    """Persistent dHash index over one or more image directories."""
+
+    def __init__(self, index_path: Union[str, Path]):
+        """Load an index, or start an empty one.
+
+        Args:
+            index_path: Base path; the index is stored as <path>.json and <path>.bin
+        """
+        self.index_path = Path(index_path)
+        self.paths: List[str] = []
+        self.stats: List[Tuple[int, int]] = []
+        self.hashes = array("Q")
+        # Files that are not decodable images, so they are not retried until they change
+        self.unreadable: Dict[str, Tuple[int, int]] = {}
+        self._positions: Dict[str, int] = {}
+        self._bands: List[Dict[int, List[int]]] = []
+        self._load()
+
+    def _load(self) -> None:
+        meta_path = self.index_path.with_suffix(".json")
+        bin_path = self.index_path.with_suffix(".bin")
+        if not (meta_path.exists() and bin_path.exists()):
+            self._rebuild_lookup()
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            hashes = array("Q")
+            with open(bin_path, "rb") as f:
+                hashes.frombytes(f.read())
+            if len(hashes) != len(meta["paths"]):
+                raise ValueError("hash count does not match path count")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable perceptual-hash index {self.index_path}: {str(e)}")
+        else:
+            self.paths = meta["paths"]
+            self.stats = [tuple(stat) for stat in meta["stats"]]
+            self.hashes = hashes
+            self.unreadable = {path: tuple(stat) for path, stat in meta.get("unreadable", {}).items()}
+        self._rebuild_lookup()
+
+    def save(self) -> None:
+        """Write the index to disk."""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        bin_path = self.index_path.with_suffix(".bin")
+        meta_path = self.index_path.with_suffix(".json")
+        tmp_bin = bin_path.with_suffix(".bin.tmp")
+        tmp_meta = meta_path.with_suffix(".json.tmp")
+        with open(tmp_bin, "wb") as f:
+            self.hashes.tofile(f)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"paths": self.paths, "stats": self.stats, "unreadable": self.unreadable}, f)
+        os.replace(tmp_bin, bin_path)
+        os.replace(tmp_meta, meta_path)
+
+    def _rebuild_lookup(self) -> None:
+        self._positions = {path: i for i, path in enumerate(self.paths)}
+        self._bands = [{} for _ in range(_BANDS)]
+        for i, value in enumerate(self.hashes):
+            self._add_bands(i, value)
+
+    def _add_bands(self, position: int, value: int) -> None:
+        for band in range(_BANDS):
+            key = (value >> (band * _BAND_BITS)) & _BAND_MASK
+            self._bands[band].setdefault(key, []).append(position)
+
+    def update(self, directories: Iterable[Union[str, Path]], max_workers: Optional[int] = None) -> int:
+        """Bring the index in line with the images under the given directories.
+
+        New and modified files are hashed in a process pool; files that no
+        longer exist are dropped. Hardlinks and symlinks to the same file (the
+        blob store publishes one file under several directories) are indexed
+        once, under the first of their paths in sorted order, so a published
+        image is never reported as a duplicate of itself.
+
+        Args:
+            directories: Directories to scan recursively
+            max_workers: Process pool size (defaults to the CPU count)
+
+        Returns:
+            Number of files hashed
+        """
+        found: Dict[Tuple[int, int], Tuple[str, Tuple[int, int]]] = {}
+        for directory in directories:
+            directory = Path(directory)
+            if not directory.is_dir():
+                continue
+            for path in directory.rglob("*"):
+                if path.suffix.lower() in IMAGE_EXTENSIONS and path.is_file() and not path.name.startswith("."):
+                    st = path.stat()
+                    resolved = str(path.resolve())
+                    inode = (st.st_dev, st.st_ino)
+                    if inode not in found or resolved < found[inode][0]:
+                        found[inode] = (resolved, (st.st_size, st.st_mtime_ns))
+        current: Dict[str, Tuple[int, int]] = dict(found.values())
+
+        known = {path: self.stats[i] for path, i in self._positions.items()}
+        known.update(self.unreadable)
+        stale = [path for path, stat in current.items() if known.get(path) != stat]
+
+        hashed: Dict[str, int] = {}
+        if stale:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                for path, value in zip(stale, pool.map(dhash_file, stale, chunksize=16)):
+                    if value is not None:
+                        hashed[path] = value
+
+        paths, stats, hashes = [], [], array("Q")
+        unreadable = {}
+        for path, stat in current.items():
+            if path in hashed:
+                value = hashed[path]
+            elif path in self._positions and known[path] == stat:
+                value = self.hashes[self._positions[path]]
+            else:
+                unreadable[path] = stat
+                continue
+            paths.append(path)
+            stats.append(stat)
+            hashes.append(value)
+
+        self.paths, self.stats, self.hashes = paths, stats, hashes
+        self.unreadable = unreadable
+        self._rebuild_lookup()
+        return len(stale)
+
+    def search(self, value: int, max_distance: int = 3) -> List[Tuple[str, int]]:
+        """Find indexed images within a Hamming distance of a hash.
+
+        Args:
+            value: Query hash
+            max_distance: Largest Hamming distance to report
+
+        Returns:
+            (path, distance) pairs, closest first
+        """
+        if max_distance < _BANDS:
+            candidates = set()
+            for band in range(_BANDS):
+                key = (value >> (band * _BAND_BITS)) & _BAND_MASK
+                candidates.update(self._bands[band].get(key, ()))
+        else:
+            candidates = range(len(self.hashes))
+
+        matches = []
+        for i in candidates:
+            distance = hamming(value, self.hashes[i])
+            if distance <= max_distance:
+                matches.append((self.paths[i], distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def search_file(self, path: Union[str, Path], max_distance: int = 3) -> List[Tuple[str, int]]:
+        """Find indexed images that look like the given file (excluding itself and its hardlinks)."""
+        path = str(Path(path).resolve())
+        if path in self._positions:
+            value = self.hashes[self._positions[path]]
+        else:
+            value = dhash_file(path)
+            if value is None:
+                return []
+        return [match for match in self.search(value, max_distance)
+                if match[0] != path and not _same_file(match[0], path)]
+
+    def find_duplicates(self, max_distance: int = 3) -> List[List[str]]:
+        """Group indexed images that are within max_distance of each other.
+
+        Returns:
+            Groups of two or more paths, each sorted
+        """
+        parent = list(range(len(self.paths)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, value in enumerate(self.hashes):
+            for path, _ in self.search(value, max_distance):
+                j = self._positions[path]
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+
+        groups: Dict[int, List[str]] = {}
+        for i, path in enumerate(self.paths):
+            groups.setdefault(find(i), []).append(path)
+        return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+def get_phash_index(output_dir: Optional[Union[str, Path]] = None) -> PerceptualHashIndex:
+    """Open the index at PHASH_INDEX_PATH, or <output_dir>/.phash-index."""
+    path = os.environ.get("PHASH_INDEX_PATH")
+    if not path:
+        if output_dir is None:
+            output_dir = os.environ.get("OUTPUT_IMAGE_PATH", "generated-images")
+        path = Path(output_dir) / ".phash-index"
+    return PerceptualHashIndex(path)
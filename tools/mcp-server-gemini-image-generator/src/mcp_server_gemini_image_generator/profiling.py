@@ -0,0 +1,187 @@
+"""
+Opt-in profiling of MCP tool calls
+
+Tools named in MCP_PROFILE_TOOLS (comma-separated, or "*" for all) run
+under cProfile with tracemalloc snapshots taken before and after the call.
+Each profile is written as ``<tool>-<request_id>.prof`` (loadable with
+pstats or snakeviz) plus a ``.txt`` summary of the slowest functions and
+the largest allocation growth, under MCP_PROFILE_DIR or
+``<output_dir>/.profiles``.
+
+cProfile sees the event-loop thread only, and every task it runs while the
+call is in flight, so one call is profiled at a time; overlapping calls run
+unprofiled. Work moved to worker threads shows up as the time spent
+awaiting it.
+
+The tracemalloc snapshots, their comparison and the profile files are
+handled in a worker thread so they do not stall other requests. Other tasks
+keep running meanwhile, so allocations they make around the start and end
+of the call can show up in the allocation growth.
+"""
+
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Set, Tuple, Union
+
+try:
+    from .log_context import current_request_id
+    from .utils import write_text_atomic
+except ImportError:
+    from log_context import current_request_id
+    from utils import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_N = 25
+
+# Frames kept per allocation trace
+_TRACEMALLOC_FRAMES = 10
+
+
+class ProfileResult(NamedTuple):
+    """Files and headline numbers of one profiled tool call."""
+    tool: str
+    request_id: str
+    profile_path: Path
+    summary_path: Path
+    duration: float
+    allocated: int
+    allocations: List[str]
+
+
+_profile_lock = threading.Lock()
+_last_profile: Optional[ProfileResult] = None
+
+
+def get_profiled_tools() -> Set[str]:
+    """Tool names from MCP_PROFILE_TOOLS ("*" profiles every tool)."""
+    value = os.environ.get("MCP_PROFILE_TOOLS", "")
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def get_profile_dir(output_dir: Optional[Union[str, Path]] = None) -> Path:
+    """Profile location: MCP_PROFILE_DIR, or <output_dir>/.profiles."""
+    path = os.environ.get("MCP_PROFILE_DIR")
+    if path:
+        return Path(path)
+    if output_dir is None:
+        output_dir = os.environ.get("OUTPUT_IMAGE_PATH", "generated-images")
+    return Path(output_dir) / ".profiles"
+
+
+def format_stats(profile_path: Union[str, Path], top_n: int = DEFAULT_TOP_N, sort: str = "cumulative") -> str:
+    """Render the top functions of a saved profile as text."""
+    out = io.StringIO()
+    stats = pstats.Stats(str(profile_path), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top_n)
+    return out.getvalue()
+
+
+def _is_enabled(tool: str) -> bool:
+    tools = get_profiled_tools()
+    return "*" in tools or tool in tools
+
+
+def _start_tracing() -> Tuple[tracemalloc.Snapshot, bool]:
+    """Start tracemalloc if needed and snapshot the heap; returns the snapshot and whether it was started."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(_TRACEMALLOC_FRAMES)
+    return tracemalloc.take_snapshot(), started
+
+
+def _write_profile(tool: str, request_id: str, profiler: cProfile.Profile, duration: float,
+                   before: tracemalloc.Snapshot, stop_tracing: bool) -> ProfileResult:
+    global _last_profile
+    try:
+        after = tracemalloc.take_snapshot()
+    finally:
+        if stop_tracing:
+            tracemalloc.stop()
+    profile_dir = get_profile_dir()
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_path = profile_dir / f"{tool}-{request_id}.prof"
+    summary_path = profile_path.with_suffix(".txt")
+
+    profiler.dump_stats(str(profile_path))
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    allocated = sum(stat.size_diff for stat in diff)
+    allocations = []
+    for stat in diff[:DEFAULT_TOP_N]:
+        frame = stat.traceback[0]
+        allocations.append(f"{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks "
+                           f"at {frame.filename}:{frame.lineno}")
+
+    write_text_atomic(summary_path, "\n".join([
+        f"{tool} (request {request_id}) took {duration:.3f} s, net allocation {allocated / 1024:+.1f} KiB",
+        "",
+        "Allocation growth:",
+        *allocations,
+        "",
+        format_stats(profile_path),
+    ]))
+
+    _last_profile = ProfileResult(tool, request_id, profile_path, summary_path, duration, allocated, allocations)
+    logger.info(f"Wrote profile for {tool} to {profile_path} ({duration:.3f} s)")
+    return _last_profile
+
+
+def profiled_tool(func: Callable) -> Callable:
+    """Profile calls of an async tool when it is listed in MCP_PROFILE_TOOLS.
+
+    Apply inside logged_tool so the profile is named after the request id.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        tool = func.__name__
+        if not _is_enabled(tool) or not _profile_lock.acquire(blocking=False):
+            return await func(*args, **kwargs)
+        try:
+            before, started_tracing = await asyncio.to_thread(_start_tracing)
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - start
+                request_id = current_request_id() or time.strftime("%Y%m%d-%H%M%S")
+                # A failing profile must never replace the tool's result or error
+                try:
+                    await asyncio.to_thread(_write_profile, tool, request_id, profiler, duration,
+                                            before, started_tracing)
+                except Exception as e:
+                    logger.warning(f"Could not write profile for {tool}: {str(e)}")
+        finally:
+            _profile_lock.release()
+    return wrapper
+
+
+def last_profile_summary(top_n: int = DEFAULT_TOP_N, sort: str = "cumulative") -> str:
+    """Summary of the most recent profile with the top_n functions and allocation sites."""
+    result = _last_profile
+    if result is None:
+        tools = ", ".join(sorted(get_profiled_tools())) or "none"
+        return f"No profile recorded yet (MCP_PROFILE_TOOLS: {tools})"
+    return "\n".join([
+        f"{result.tool} (request {result.request_id}) took {result.duration:.3f} s, "
+        f"net allocation {result.allocated / 1024:+.1f} KiB",
+        f"Profile: {result.profile_path}",
+        "",
+        "Allocation growth:",
+        *result.allocations[:top_n],
+        "",
+        format_stats(result.profile_path, top_n, sort),
+    ])
@@ -0,0 +1,367 @@
+"""
+Near-duplicate prompt detection for reusing generated images
+
+Prompts are normalized before comparison: case, punctuation and stopwords
+are dropped, aspect-ratio and file-format suffixes removed, and common
+synonyms ("high resolution", "hi-res", "HD") folded into one term. Numbers
+are kept together with their unit. Each prompt is then reduced to a set of shingles, namely its terms plus
+unordered pairs of adjacent terms within each clause, so reordered words
+and clauses still match.
+
+A MinHash signature of the shingles is split into bands for
+locality-sensitive hashing, as in the perceptual-hash index. Only prompts
+sharing a band become candidates, and candidates are confirmed with the
+exact Jaccard similarity of their shingle sets. Catalog attribute terms
+(grades such as "premium" or "commercial", materials, and quantities like
+"19 mm") are never folded into synonyms, and two prompts only match when
+they name exactly the same ones: a commercial-grade product must not be
+handed the premium product's image however similar the rest of the prompt.
+
+The index is fed from the asset registry, so any original image with a
+recorded prompt can be reused, provided its aspect ratio and format match
+the request.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    from .asset_registry import AssetRegistry
+    from .search_index import tokenize
+except ImportError:
+    from asset_registry import AssetRegistry
+    from search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.8
+
+# 32 hash functions in 8 bands of 4: pairs at Jaccard 0.8 share a band ~99.9% of the time
+_NUM_HASHES = 32
+_BANDS = 8
+_ROWS = _NUM_HASHES // _BANDS
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Deterministic (a, b) pairs for the universal hash family h(x) = (a * x + b) mod p
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(_NUM_HASHES)
+]
+
+# Phrases that only set output shape or format, not content
+_NOISE_PATTERNS = [
+    re.compile(r"\b\d+\s*:\s*\d+(\s+aspect\s+ratio)?\b", re.IGNORECASE),
+    re.compile(r"\baspect\s+ratio\b", re.IGNORECASE),
+    re.compile(r"\b(png|jpe?g|webp)(\s+format)?\b", re.IGNORECASE),
+]
+
+# Multi-word synonyms, folded before tokenizing
+_PHRASE_SYNONYMS = [
+    (re.compile(r"\b(high|hi)[\s-]*(resolution|res|definition|detail(ed)?)\b", re.IGNORECASE), "highquality"),
+    (re.compile(r"\bhigh[\s-]*quality\b", re.IGNORECASE), "highquality"),
+    (re.compile(r"\b(ultra[\s-]*)?(hd|4k|8k)\b", re.IGNORECASE), "highquality"),
+    (re.compile(r"\bproduct\s+(photo|shot|image|photography)\b", re.IGNORECASE), "productphoto"),
+]
+
+# Single-word synonyms and light stemming
+_WORD_SYNONYMS = {
+    "photo": "photograph", "photography": "photograph", "photographic": "photograph", "shot": "photograph",
+    "image": "photograph", "picture": "photograph",
+    "lit": "lighting", "lights": "lighting", "lighting": "lighting",
+    "wooden": "wood",
+    "realistic": "photorealistic",
+}
+
+# Catalog grades and materials; prompts naming different ones never match
+_PROTECTED_TERMS = frozenset("""
+premium commercial budget utility economy standard export
+teak plywood hardwood softwood timber log mahogany oak pine cedar rosewood walnut sal meranti
+veneer laminate mdf particleboard blockboard
+""".split())
+
+# Numbers keep their unit so sizes and thicknesses ("19 mm" / "12mm") stay distinct
+_NUMBER = re.compile(
+    r"(?<![\w.])(\d+(?:\.\d+)?)\s*(mm|cm|m|inches|inch|in|feet|ft|kg|g|ml|l|%)?(?![\w%])", re.IGNORECASE)
+_UNITS = {"inches": "in", "inch": "in", "feet": "ft", "%": "pct"}
+
+# Punctuation and connectives separating independent phrases
+_CLAUSE_BREAK = re.compile(r"[,.;:!?()]|\b(?:and|with|in|on|at|of|for|against|under|by|near|beside)\b",
+                           re.IGNORECASE)
+
+_FILLER = frozenset("""
+very highly showing shows featuring feature features style image please create generate make
+""".split())
+
+
+class PromptMatch(NamedTuple):
+    """An indexed prompt similar to a query."""
+    asset_id: str
+    prompt: str
+    similarity: float
+
+
+def _number_token(match: "re.Match[str]") -> str:
+    unit = (match.group(2) or "").lower()
+    # One token per quantity: "1.5 mm" -> "n1d5mm"; the prefix keeps single digits from being dropped
+    return f" n{match.group(1).replace('.', 'd')}{_UNITS.get(unit, unit)} "
+
+
+def _clauses(prompt: str) -> List[List[str]]:
+    text = prompt
+    for pattern in _NOISE_PATTERNS:
+        text = pattern.sub(" ", text)
+    for pattern, replacement in _PHRASE_SYNONYMS:
+        text = pattern.sub(f" {replacement} ", text)
+    text = _NUMBER.sub(_number_token, text)
+    clauses = []
+    for clause in _CLAUSE_BREAK.split(text):
+        terms = []
+        for token in tokenize(clause or ""):
+            if token in _FILLER:
+                continue
+            token = _WORD_SYNONYMS.get(token, token)
+            if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+                token = _WORD_SYNONYMS.get(token[:-1], token[:-1])
+            terms.append(token)
+        if terms:
+            clauses.append(terms)
+    return clauses
+
+
+def normalize_prompt(prompt: str) -> List[str]:
+    """Reduce a prompt to its content terms."""
+    return [term for clause in _clauses(prompt) for term in clause]
+
+
+def shingles(prompt: str) -> FrozenSet[str]:
+    """Terms of a normalized prompt plus unordered pairs of adjacent terms.
+
+    Pairs never span a clause break, so reordered clauses ("a sofa and a
+    table" / "a table and a sofa") give the same shingles.
+    """
+    result: Set[str] = set()
+    for terms in _clauses(prompt):
+        result.update(terms)
+        for first, second in zip(terms, terms[1:]):
+            if first != second:
+                result.add("|".join(sorted((first, second))))
+    return frozenset(result)
+
+
+def protected_terms(features: FrozenSet[str]) -> FrozenSet[str]:
+    """Grade, material and quantity terms of a shingle set, which must match exactly."""
+    return frozenset(term for term in features
+                     if term in _PROTECTED_TERMS or (term[:1] == "n" and term[1:2].isdigit()))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two shingle sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(features: FrozenSet[str]) -> Tuple[int, ...]:
+    """MinHash signature of a shingle set."""
+    if not features:
+        return (_MAX_HASH,) * _NUM_HASHES
+    values = [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big") for f in features]
+    return tuple(
+        min(((a * x + b) % _MERSENNE) & _MAX_HASH for x in values)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def _band_keys(signature: Tuple[int, ...]) -> List[bytes]:
+    return [
+        bytes([band]) + struct.pack(f">{_ROWS}I", *signature[band * _ROWS:(band + 1) * _ROWS])
+        for band in range(_BANDS)
+    ]
+
+
+def matches_output(asset: Dict, image_size: str = "auto", output_format: Optional[str] = None) -> bool:
+    """Whether a registered image has the requested aspect ratio and format.
+
+    The ratio recorded at generation (``metadata.imageSize``) is compared
+    when present, otherwise the probed width and height; the format is
+    compared with the probed MIME type. Assets that cannot be checked do not
+    match a specific request.
+    """
+    if output_format:
+        wanted = "image/jpeg" if output_format.lower() in ("jpg", "jpeg") else f"image/{output_format.lower()}"
+        if asset.get("mime_type") != wanted:
+            return False
+    if image_size and image_size != "auto":
+        recorded = (asset.get("metadata") or {}).get("imageSize")
+        if recorded and recorded != "auto":
+            return recorded == image_size
+        try:
+            width, height = (float(part) for part in image_size.split(":"))
+        except ValueError:
+            return False
+        if not asset.get("width") or not asset.get("height"):
+            return False
+        return abs(asset["width"] / asset["height"] - width / height) <= 0.01 * width / height
+    return True
+
+
+class PromptIndex:
+    """MinHash/LSH index of the prompts of registered assets."""
+
+    def __init__(self, threshold: Optional[float] = None):
+        """Create an empty index.
+
+        Args:
+            threshold: Minimum Jaccard similarity for a match
+                       (defaults to PROMPT_REUSE_THRESHOLD or 0.8)
+        """
+        self.threshold = threshold if threshold is not None else float(
+            os.environ.get("PROMPT_REUSE_THRESHOLD", DEFAULT_THRESHOLD))
+        self._prompts: Dict[str, Tuple[str, FrozenSet[str], List[bytes], FrozenSet[str]]] = {}
+        self._buckets: Dict[bytes, Set[str]] = {}
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._prompts)
+
+    def add(self, asset_id: str, prompt: str) -> None:
+        """Index (or re-index) the prompt of an asset."""
+        self.remove(asset_id)
+        features = shingles(prompt)
+        if not features:
+            return
+        keys = _band_keys(minhash(features))
+        self._prompts[asset_id] = (prompt, features, keys, protected_terms(features))
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(asset_id)
+
+    def remove(self, asset_id: str) -> None:
+        """Drop an asset from the index."""
+        entry = self._prompts.pop(asset_id, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(asset_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def search(self, prompt: str, threshold: Optional[float] = None, limit: int = 5) -> List[PromptMatch]:
+        """Indexed prompts at least threshold-similar to prompt, most similar first.
+
+        Prompts naming a different grade, material or quantity never match:
+
+            >>> index = PromptIndex()
+            >>> index.add("premium", "Premium grade Burma teak door")
+            >>> [m.asset_id for m in index.search("Burma teak door, premium grade")]
+            ['premium']
+            >>> index.search("Commercial grade Burma teak door")
+            []
+        """
+        threshold = self.threshold if threshold is None else threshold
+        features = shingles(prompt)
+        if not features:
+            return []
+        protected = protected_terms(features)
+        candidates: Set[str] = set()
+        for key in _band_keys(minhash(features)):
+            candidates.update(self._buckets.get(key, ()))
+        matches = []
+        for asset_id in candidates:
+            indexed_prompt, indexed_features, _, indexed_protected = self._prompts[asset_id]
+            if indexed_protected != protected:
+                continue
+            similarity = jaccard(features, indexed_features)
+            if similarity >= threshold:
+                matches.append(PromptMatch(asset_id, indexed_prompt, round(similarity, 3)))
+        matches.sort(key=lambda m: m.similarity, reverse=True)
+        return matches[:limit]
+
+    def sync(self, registry: AssetRegistry) -> int:
+        """Index original assets with prompts registered or updated since the last sync.
+
+        Returns:
+            Number of assets indexed
+        """
+        started = time.time()
+        count = 0
+        for asset in registry.updated_since(self._synced_at):
+            # Published copies and archives are variants of an indexed original
+            if asset["prompt"] and not asset["variant"] and not asset["parent_id"]:
+                self.add(asset["id"], asset["prompt"])
+                count += 1
+            else:
+                self.remove(asset["id"])
+        # Records written while syncing are picked up next time
+        self._synced_at = started - 1
+        return count
+
+    def find_reusable(self, registry: AssetRegistry, prompt: str,
+                      threshold: Optional[float] = None,
+                      image_size: str = "auto",
+                      output_format: Optional[str] = None) -> List[Tuple[Dict, float]]:
+        """Registered assets whose prompt matches and whose file still exists.
+
+        Args:
+            registry: Asset registry the index is fed from
+            prompt: Prompt of the new request
+            threshold: Minimum similarity (defaults to the index's threshold)
+            image_size: Requested aspect ratio ("auto" accepts any)
+            output_format: Requested format ("png", "jpeg"; None accepts any)
+
+        Returns:
+            (asset record, similarity) pairs, most similar first
+        """
+        reusable = []
+        # Lookups run in worker threads; keep syncing and pruning consistent
+        with self._lock:
+            self.sync(registry)
+            for match in self.search(prompt, threshold):
+                asset = registry.get(match.asset_id)
+                if asset is None or not Path(asset["path"]).is_file():
+                    self.remove(match.asset_id)
+                    continue
+                if not matches_output(asset, image_size, output_format):
+                    continue
+                reusable.append((asset, match.similarity))
+        if reusable:
+            logger.info(f"Prompt matches {len(reusable)} existing asset(s); best similarity {reusable[0][1]}")
+        return reusable
+
+
+REUSE_MODES = ("off", "offer", "return")
+
+
+def reuse_mode(value: Optional[str] = None) -> str:
+    """Resolve a per-call reuse mode, defaulting to PROMPT_REUSE_MODE or "off".
+
+    Raises:
+        ValueError: If the mode is not one of REUSE_MODES
+    """
+    mode = (value or os.environ.get("PROMPT_REUSE_MODE") or "off").strip().lower()
+    if mode not in REUSE_MODES:
+        raise ValueError(f"Unknown reuse mode: {mode} (expected one of {', '.join(REUSE_MODES)})")
+    return mode
+
+
+_index: Optional[PromptIndex] = None
+
+
+def get_prompt_index() -> PromptIndex:
+    """Get the process-wide prompt index."""
+    global _index
+    if _index is None:
+        _index = PromptIndex()
+    return _index
@@ -0,0 +1,207 @@
+"""
+Catalog prompt matrix from product attributes, contexts and styles
+
+Each catalog prompt is a context template (where the product is shown)
+followed by a style description and the aspect ratio. Templates use
+``{field}`` placeholders for product attributes and are compiled once per
+context and style, so an unknown field fails when the engine is built
+rather than halfway through a batch.
+
+Expansions are memoized on the product id and the attribute values they
+use, so an unchanged product expands once per process even when products.json is
+reloaded. Every expansion carries the asset registry's prompt hash, which
+caches, the job queue and incremental builds can key on: the same product,
+context and style always spell the same prompt.
+"""
+
+import string
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from .asset_registry import prompt_hash
+    from .catalog_writeback import IMAGE_CONTEXTS
+    from .prompts import STYLE_PROMPTS
+except ImportError:
+    from asset_registry import prompt_hash
+    from catalog_writeback import IMAGE_CONTEXTS
+    from prompts import STYLE_PROMPTS
+
+DEFAULT_STYLE = "professional"
+DEFAULT_IMAGE_SIZE = "16:9"
+
+# Where the product is shown; {subject} is the product's typical installation
+CONTEXT_TEMPLATES = {
+    "apartment": "Modern residential apartment {subject} with {grade} {name}, contemporary design, "
+                 "{finish} wood finish, natural lighting",
+    "villa": "Luxury villa {subject} with {grade} {name}, sophisticated architecture, high-end residential design",
+    "office": "Commercial office {subject} with {name}, professional corporate design, business environment",
+    "retail": "Upscale retail showroom {subject} with {name}, shopping environment, elegant display",
+}
+
+# First matching tag decides the subject; checked in this order
+SUBJECTS = (
+    ("door", "entrance"),
+    ("window", "window"),
+    ("furniture", "custom furniture"),
+    ("plywood", "kitchen cabinetry"),
+    ("timber", "construction"),
+    ("log", "woodwork"),
+)
+DEFAULT_SUBJECT = "interior"
+
+FIELDS = ("name", "grade", "category", "finish", "subject", "aspect_ratio")
+
+# Memoized expansions kept per engine
+MAX_EXPANSIONS = 10000
+
+
+class Expansion(NamedTuple):
+    """One cell of the prompt matrix."""
+    product_id: str
+    context: str
+    style: str
+    prompt: str
+    prompt_hash: str
+
+    @property
+    def key(self) -> str:
+        """Job key; the default style keeps the plain ``<product-id>-<context>`` key."""
+        base = f"{self.product_id}-{self.context}"
+        return base if self.style == DEFAULT_STYLE else f"{base}-{self.style}"
+
+
+class CompiledTemplate:
+    """A template split into literal text and field references."""
+
+    def __init__(self, text: str):
+        """Parse a template.
+
+        Raises:
+            ValueError: If it references an unknown field or uses a format spec
+        """
+        self.text = text
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and field not in FIELDS:
+                raise ValueError(f"Unknown template field {{{field}}} in: {text}")
+            if spec or conversion:
+                raise ValueError(f"Format specs are not supported in templates: {text}")
+            self.parts.append((literal, field))
+        self.fields = tuple(sorted({field for _, field in self.parts if field}))
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(literal + (values[field] if field else "") for literal, field in self.parts)
+
+
+def product_attributes(product: Dict[str, Any], image_size: str = DEFAULT_IMAGE_SIZE) -> Dict[str, str]:
+    """Template field values for a product from products.json."""
+    tags = [tag.lower() for tag in product.get("tags", [])]
+    subject = next((name for tag, name in SUBJECTS if tag in tags), DEFAULT_SUBJECT)
+    finish = (product.get("specifications") or {}).get("finish") or "natural"
+    return {
+        "name": product["name"],
+        "grade": product.get("grade") or "premium",
+        "category": product.get("category") or "timber",
+        "finish": finish.lower(),
+        "subject": subject,
+        "aspect_ratio": image_size,
+    }
+
+
+class PromptEngine:
+    """Compiles context and style templates and expands them per product."""
+
+    def __init__(self,
+                 context_templates: Optional[Dict[str, str]] = None,
+                 style_templates: Optional[Dict[str, str]] = None,
+                 image_size: str = DEFAULT_IMAGE_SIZE):
+        """Compile every context and style combination.
+
+        Args:
+            context_templates: Context name to template (defaults to CONTEXT_TEMPLATES)
+            style_templates: Style name to description (defaults to prompts.STYLE_PROMPTS)
+            image_size: Aspect ratio written into prompts and jobs ("auto" omits it)
+
+        Raises:
+            ValueError: If a template references an unknown field
+        """
+        self.context_templates = dict(context_templates or CONTEXT_TEMPLATES)
+        self.style_templates = dict(style_templates or STYLE_PROMPTS)
+        self.image_size = image_size
+        suffix = ", {aspect_ratio} aspect ratio" if image_size != "auto" else ""
+        self._compiled: Dict[Tuple[str, str], CompiledTemplate] = {}
+        for context, context_text in self.context_templates.items():
+            for style, style_text in self.style_templates.items():
+                # Style descriptions are plain text, not templates
+                style_text = style_text.replace("{", "{{").replace("}", "}}")
+                self._compiled[(context, style)] = CompiledTemplate(f"{context_text}. {style_text}{suffix}")
+        self._memo: "OrderedDict[Tuple[str, str, str, Tuple[str, ...]], Expansion]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _template(self, context: str, style: str) -> CompiledTemplate:
+        template = self._compiled.get((context, style))
+        if template is None:
+            if context not in self.context_templates:
+                raise ValueError(f"Unknown context: {context} (expected one of {', '.join(self.context_templates)})")
+            raise ValueError(f"Unknown style: {style} (expected one of {', '.join(self.style_templates)})")
+        return template
+
+    def expand(self, product: Dict[str, Any], context: str, style: str = DEFAULT_STYLE) -> Expansion:
+        """Prompt for one product, context and style.
+
+        Raises:
+            ValueError: If the context or style has no template
+        """
+        template = self._template(context, style)
+        attributes = product_attributes(product, self.image_size)
+        used = {field: attributes[field] for field in template.fields}
+        # template.fields is sorted, so the values line up for every product
+        memo_key = (product["id"], context, style, tuple(used.values()))
+
+        expansion = self._memo.get(memo_key)
+        if expansion is not None:
+            self.hits += 1
+            self._memo.move_to_end(memo_key)
+            return expansion
+
+        self.misses += 1
+        prompt = template.render(used)
+        expansion = Expansion(product["id"], context, style, prompt, prompt_hash(prompt))
+        self._memo[memo_key] = expansion
+        while len(self._memo) > MAX_EXPANSIONS:
+            self._memo.popitem(last=False)
+        return expansion
+
+    def matrix(self,
+               products: Iterable[Dict[str, Any]],
+               contexts: Sequence[str] = IMAGE_CONTEXTS,
+               styles: Sequence[str] = (DEFAULT_STYLE,),
+               active_only: bool = True) -> List[Expansion]:
+        """Expand every product × context × style, in catalog order.
+
+        Args:
+            products: Parsed products.json
+            contexts: Contexts to expand for each product
+            styles: Styles to expand for each context
+            active_only: Skip products whose isActive is false
+        """
+        return [
+            self.expand(product, context, style)
+            for product in products
+            if not active_only or product.get("isActive", True)
+            for context in contexts
+            for style in styles
+        ]
+
+
+_engine: Optional[PromptEngine] = None
+
+
+def get_prompt_engine() -> PromptEngine:
+    """Get the process-wide engine with the default templates."""
+    global _engine
+    if _engine is None:
+        _engine = PromptEngine()
+    return _engine
@@ -2,17 +2,17 @@
 Prompt templates for image generation and transformation
 """
 
+STYLE_PROMPTS = {
+    "professional": "Professional product photography with clean lighting, high resolution, commercial quality",
+    "artistic": "Artistic interpretation with creative lighting and composition",
+    "minimalist": "Minimalist design with clean lines and simple composition",
+    "vintage": "Vintage style with warm tones and classic composition"
+}
+
 def get_image_generation_prompt(base_prompt: str, style: str = "professional") -> str:
     """Generate a detailed prompt for image generation"""
     
-    style_prompts = {
-        "professional": "Professional product photography with clean lighting, high resolution, commercial quality",
-        "artistic": "Artistic interpretation with creative lighting and composition",
-        "minimalist": "Minimalist design with clean lines and simple composition",
-        "vintage": "Vintage style with warm tones and classic composition"
-    }
-    
-    style_desc = style_prompts.get(style, style_prompts["professional"])
+    style_desc = STYLE_PROMPTS.get(style, STYLE_PROMPTS["professional"])
     
     return f"{base_prompt}. {style_desc}. High quality, detailed, sharp focus, well-lit, commercial photography style."
 
@@ -0,0 +1,243 @@
+"""
+Latency-aware routing of image generation between providers
+
+Each provider's latency and error rate are tracked as exponentially
+weighted moving averages. A request goes to the fastest healthy provider;
+one whose error rate is above ROUTER_MAX_ERROR_RATE is skipped, except
+for an occasional probe so it can recover. A failed request falls over
+to the next provider.
+
+In hedged mode a second provider is started if the first has not finished
+by its observed p95 latency. The first successful result wins, and the
+other attempt is cancelled, and the time it had run is recorded as a
+lower bound on its latency. Cancelling a KIE.ai attempt stops polling;
+the remote task still runs to completion on KIE.ai's side.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    from .log_context import stage
+except ImportError:
+    from log_context import stage
+
+logger = logging.getLogger(__name__)
+
+ProviderFn = Callable[..., Awaitable[Any]]
+
+DEFAULT_ALPHA = 0.2
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_PROBE_INTERVAL = 60.0
+DEFAULT_HEDGE_DELAY = 45.0
+
+# Latency samples kept for the p95, and the minimum before it is trusted
+LATENCY_SAMPLES = 50
+MIN_SAMPLES = 5
+
+
+class ProviderStats:
+    """Moving averages of one provider's latency and error rate."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.in_flight = 0
+        self.successes = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.last_attempt = 0.0
+
+    def record_success(self, elapsed: float) -> None:
+        self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.samples.append(elapsed)
+        self.successes += 1
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """Record an attempt cancelled after elapsed seconds.
+
+        The true latency is at least elapsed, so the average never drops
+        below it; this keeps a provider that always loses a hedge from
+        looking fast (or unmeasured) forever. The sample is censored and
+        stays out of the p95.
+        """
+        self.latency = elapsed if self.latency is None else max(self.latency, elapsed)
+        self.cancelled += 1
+
+    def record_error(self) -> None:
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.errors += 1
+
+    def p95(self) -> Optional[float]:
+        """95th percentile of recent successful latencies, once enough are known."""
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+
+class ProviderRouter:
+    """Sends each generation to the currently fastest healthy provider."""
+
+    def __init__(self,
+                 providers: Dict[str, ProviderFn],
+                 alpha: Optional[float] = None,
+                 max_error_rate: Optional[float] = None,
+                 probe_interval: Optional[float] = None,
+                 hedge_delay: Optional[float] = None):
+        """Configure the router.
+
+        Args:
+            providers: Provider name to coroutine function taking (prompt, **options)
+                       and returning its result (e.g. image bytes and a task id),
+                       which the router passes through untouched
+            alpha: EWMA weight of the newest sample (defaults to ROUTER_EWMA_ALPHA or 0.2)
+            max_error_rate: Error rate above which a provider is skipped
+                            (defaults to ROUTER_MAX_ERROR_RATE or 0.5)
+            probe_interval: Seconds after which a skipped provider is tried again
+                            (defaults to ROUTER_PROBE_INTERVAL or 60)
+            hedge_delay: Hedge delay used until a provider has a p95
+                         (defaults to ROUTER_HEDGE_DELAY or 45)
+        """
+        self.providers = providers
+        alpha = alpha if alpha is not None else float(os.environ.get("ROUTER_EWMA_ALPHA", DEFAULT_ALPHA))
+        self.max_error_rate = max_error_rate if max_error_rate is not None else float(
+            os.environ.get("ROUTER_MAX_ERROR_RATE", DEFAULT_MAX_ERROR_RATE))
+        self.probe_interval = probe_interval if probe_interval is not None else float(
+            os.environ.get("ROUTER_PROBE_INTERVAL", DEFAULT_PROBE_INTERVAL))
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(
+            os.environ.get("ROUTER_HEDGE_DELAY", DEFAULT_HEDGE_DELAY))
+        self._stats = {name: ProviderStats(alpha) for name in providers}
+
+    def ranked(self) -> List[str]:
+        """Provider names, best first."""
+        now = time.monotonic()
+
+        def score(name: str) -> Tuple[int, float, int]:
+            stats = self._stats[name]
+            unhealthy = (stats.error_rate > self.max_error_rate
+                         and now - stats.last_attempt < self.probe_interval)
+            # Untried providers sort first so each gets measured once; one that
+            # was tried but never produced a latency sorts after measured ones
+            if stats.latency is not None:
+                latency = stats.latency
+            else:
+                latency = 0.0 if not stats.last_attempt else math.inf
+            return (int(unhealthy), latency, stats.in_flight)
+
+        return sorted(self.providers, key=score)
+
+    def _hedge_after(self, name: str) -> float:
+        stats = self._stats[name]
+        p95 = stats.p95()
+        if p95 is not None:
+            return p95
+        return 2 * stats.latency if stats.latency else self.hedge_delay
+
+    async def _attempt(self, name: str, prompt: str, options: Dict[str, Any]) -> Tuple[Any, str]:
+        stats = self._stats[name]
+        stats.in_flight += 1
+        stats.last_attempt = time.monotonic()
+        start = time.perf_counter()
+        try:
+            with stage(f"provider_{name}"):
+                result = await self.providers[name](prompt, **options)
+        except asyncio.CancelledError:
+            stats.record_cancelled(time.perf_counter() - start)
+            raise
+        except Exception:
+            stats.record_error()
+            raise
+        else:
+            stats.record_success(time.perf_counter() - start)
+            return result, name
+        finally:
+            stats.in_flight -= 1
+
+    async def _hedged(self, primary: str, secondary: str, prompt: str, options: Dict[str, Any]) -> Tuple[Any, str]:
+        tasks = [asyncio.ensure_future(self._attempt(primary, prompt, options))]
+        try:
+            delay = self._hedge_after(primary)
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done and tasks[0].exception() is None:
+                return tasks[0].result()
+            if done:
+                logger.warning(f"{primary} failed ({tasks[0].exception()}); falling back to {secondary}")
+            else:
+                logger.info(f"{primary} still running after {delay:.1f}s; hedging with {secondary}")
+            tasks.append(asyncio.ensure_future(self._attempt(secondary, prompt, options)))
+
+            errors = [task.exception() for task in done]
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        result, name = task.result()
+                        if pending:
+                            logger.info(f"{name} won the hedged request; cancelling the other attempt")
+                        return result, name
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            running = [task for task in tasks if not task.done()]
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def generate(self, prompt: str, hedge: bool = False, provider: Optional[str] = None,
+                       **options) -> Tuple[Any, str]:
+        """Generate an image with the best provider.
+
+        Args:
+            prompt: Generation prompt
+            hedge: Start the next provider if the first exceeds its p95 latency
+            provider: Use only this provider instead of routing
+            **options: Passed to the provider function
+
+        Returns:
+            Tuple of (the provider's result, name of the provider that produced it)
+        """
+        if provider:
+            if provider not in self.providers:
+                raise ValueError(f"Unknown provider: {provider} (expected one of {', '.join(self.providers)})")
+            return await self._attempt(provider, prompt, options)
+
+        order = self.ranked()
+        logger.info(f"Routing to {order[0]} (ranking: {', '.join(order)})")
+        if hedge and len(order) > 1:
+            return await self._hedged(order[0], order[1], prompt, options)
+
+        errors = []
+        for name in order:
+            try:
+                return await self._attempt(name, prompt, options)
+            except Exception as e:
+                errors.append(e)
+                if name != order[-1]:
+                    logger.warning(f"{name} failed ({str(e)}); falling back to the next provider")
+        raise errors[0]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Current averages and counters per provider."""
+        return {
+            name: {
+                "latency": round(s.latency, 2) if s.latency is not None else None,
+                "p95": round(s.p95(), 2) if s.p95() is not None else None,
+                "errorRate": round(s.error_rate, 3),
+                "inFlight": s.in_flight,
+                "successes": s.successes,
+                "errors": s.errors,
+                "cancelled": s.cancelled,
+            }
+            for name, s in self._stats.items()
+        }
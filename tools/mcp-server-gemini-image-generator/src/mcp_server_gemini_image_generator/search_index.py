@@ -0,0 +1,264 @@
+"""
+Prebuilt full-text search index for products and blog posts
+
+Documents are tokenized into an inverted index with BM25 weights and written
+as compact JSON under ``public/data/search/``: a manifest, a document table
+and one shard per two-character term prefix. A client only fetches the
+shards for the prefixes of its query terms.
+
+Builds are incremental: documents whose ``updatedAt`` is unchanged reuse
+their cached term frequencies, and shard files are only rewritten when
+their content changes. The cached term frequencies are build state and live
+under the state directory (utils.get_state_dir), not next to the deployed
+shards.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .utils import get_public_dir, get_state_dir, write_text_atomic
+except ImportError:
+    from utils import get_public_dir, get_state_dir, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+PREFIX_LENGTH = 2
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Field weights applied to term frequencies (a simplified BM25F)
+PRODUCT_FIELDS = {"name": 3.0, "tags": 2.0, "seo.keywords": 2.0, "description": 1.0}
+BLOG_FIELDS = {"title": 3.0, "summary": 1.5, "content": 1.0}
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or our
+so that the their this to was we were will with your you
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the text content of an HTML fragment."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def strip_html(html: str) -> str:
+    """Return the visible text of an HTML fragment."""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return " ".join(extractor.parts)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase index terms, dropping stopwords."""
+    return [
+        token for token in _TOKEN_PATTERN.findall(text.casefold())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def _field_text(record: Dict[str, Any], field: str) -> str:
+    value: Any = record
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return str(value) if value else ""
+
+
+def _term_frequencies(record: Dict[str, Any], fields: Dict[str, float], html_fields: Iterable[str] = ()) -> Tuple[Dict[str, float], float]:
+    frequencies: Dict[str, float] = {}
+    length = 0.0
+    for field, weight in fields.items():
+        text = _field_text(record, field)
+        if field in html_fields:
+            text = strip_html(text)
+        tokens = tokenize(text)
+        length += weight * len(tokens)
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0.0) + weight
+    return frequencies, length
+
+
+def collect_documents(data_dir: Path) -> List[Dict[str, Any]]:
+    """Searchable documents from products.json and blog-posts.json.
+
+    Only active products and published posts are included.
+    """
+    documents = []
+
+    with open(data_dir / "products.json", "r", encoding="utf-8") as f:
+        for product in json.load(f):
+            if not product.get("isActive", True):
+                continue
+            documents.append({
+                "key": f"product:{product['id']}",
+                "type": "product",
+                "title": product.get("name", ""),
+                "url": f"/products/{product['id']}",
+                "updatedAt": product.get("updatedAt"),
+                "record": product,
+                "fields": PRODUCT_FIELDS,
+                "html": (),
+            })
+
+    with open(data_dir / "blog-posts.json", "r", encoding="utf-8") as f:
+        for post in json.load(f):
+            if post.get("status") != "published":
+                continue
+            documents.append({
+                "key": f"post:{post['id']}",
+                "type": "post",
+                "title": post.get("title", ""),
+                "url": f"/blog/{post.get('slug') or post['id']}",
+                "updatedAt": post.get("updatedAt"),
+                "record": post,
+                "fields": BLOG_FIELDS,
+                "html": ("content",),
+            })
+
+    return documents
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return False
+    write_text_atomic(path, content)
+    return True
+
+
+def build_search_index(public_dir: Optional[Path] = None,
+                       output_dir: Optional[Path] = None,
+                       force: bool = False,
+                       state_dir: Optional[Path] = None) -> Dict[str, int]:
+    """Build or update the search index shards.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        output_dir: Where to write the index (defaults to public/data/search)
+        force: Re-tokenize every document regardless of updatedAt
+        state_dir: Where to keep the build state (defaults to get_state_dir())
+
+    Returns:
+        Counts of documents, reindexed documents, shards and rewritten files
+    """
+    public_dir = Path(public_dir or get_public_dir())
+    data_dir = public_dir / "data"
+    output_dir = Path(output_dir or data_dir / "search")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Cached per-document term frequencies from the previous build, one file per index
+    tag = hashlib.sha256(str(output_dir.resolve()).encode("utf-8")).hexdigest()[:12]
+    state_dir = Path(state_dir or get_state_dir())
+    state_dir.mkdir(parents=True, exist_ok=True)
+    state_path = state_dir / f"search-index-{tag}.json"
+    state: Dict[str, Any] = {"version": INDEX_VERSION, "docs": {}}
+    if state_path.exists() and not force:
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if loaded.get("version") == INDEX_VERSION:
+                state = loaded
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable search index state: {str(e)}")
+
+    documents = collect_documents(data_dir)
+    cached_docs = state["docs"]
+    docs_state: Dict[str, Any] = {}
+    reindexed = 0
+    for doc in documents:
+        cached = cached_docs.get(doc["key"])
+        if cached and doc["updatedAt"] and cached["updatedAt"] == doc["updatedAt"]:
+            docs_state[doc["key"]] = cached
+            continue
+        terms, length = _term_frequencies(doc["record"], doc["fields"], doc["html"])
+        docs_state[doc["key"]] = {"updatedAt": doc["updatedAt"], "length": length, "terms": terms}
+        reindexed += 1
+
+    # Global BM25 statistics
+    doc_count = len(documents)
+    avg_length = (sum(d["length"] for d in docs_state.values()) / doc_count) if doc_count else 0.0
+    document_frequency: Dict[str, int] = {}
+    for entry in docs_state.values():
+        for term in entry["terms"]:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    shards: Dict[str, Dict[str, List[List[float]]]] = {}
+    for position, doc in enumerate(documents):
+        entry = docs_state[doc["key"]]
+        norm = K1 * (1 - B + B * entry["length"] / avg_length) if avg_length else K1
+        for term, tf in entry["terms"].items():
+            df = document_frequency[term]
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            weight = round(idf * tf * (K1 + 1) / (tf + norm), 4)
+            shards.setdefault(term[:PREFIX_LENGTH], {}).setdefault(term, []).append([position, weight])
+
+    for postings in shards.values():
+        for term_postings in postings.values():
+            term_postings.sort(key=lambda posting: -posting[1])
+
+    written = 0
+    shard_files = {}
+    for prefix, postings in sorted(shards.items()):
+        content = _dumps(postings)
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+        filename = f"terms-{prefix}.json"
+        shard_files[prefix] = {"file": filename, "hash": digest, "terms": len(postings)}
+        written += _write_if_changed(output_dir / filename, content)
+
+    # Remove shards for prefixes that no longer have any terms
+    for path in output_dir.glob("terms-*.json"):
+        if path.stem[len("terms-"):] not in shard_files:
+            path.unlink()
+            written += 1
+
+    doc_table = [{"type": d["type"], "id": d["record"]["id"], "title": d["title"], "url": d["url"]} for d in documents]
+    written += _write_if_changed(output_dir / "docs.json", _dumps(doc_table))
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "prefixLength": PREFIX_LENGTH,
+        "docCount": doc_count,
+        "avgLength": round(avg_length, 4),
+        "k1": K1,
+        "b": B,
+        "shards": shard_files,
+    }
+    written += _write_if_changed(output_dir / "index.json", _dumps(manifest))
+
+    write_text_atomic(state_path, json.dumps({"version": INDEX_VERSION, "docs": docs_state}, separators=(",", ":")))
+
+    return {"documents": doc_count, "reindexed": reindexed, "shards": len(shard_files), "written": written}
@@ -1,33 +1,53 @@
-import base64
+import argparse
+import asyncio
 import os
 import logging
-import sys
 import uuid
-from io import BytesIO
-from typing import Optional, Any, Union, List, Tuple
+from pathlib import Path
+from typing import Optional, Any, Dict, Union, List, Tuple
 
 import PIL.Image
-import google.generativeai as genai
+from google import genai
+from google.genai import types
 from mcp.server.fastmcp import FastMCP
+from mcp.server.lowlevel.server import request_ctx
 
 try:
     # Try relative imports first (when loaded as package)
     from .prompts import get_image_generation_prompt, get_image_transformation_prompt, get_translate_prompt
     from .utils import save_image
+    from .asset_registry import get_asset_registry
     from .kie_client import get_kie_client
+    from .deadline import deadline_tool, with_timeout
+    from .http_auth import BearerTokenMiddleware, is_loopback
+    from .image_cache import get_source_image_cache
+    from .image_upload import load_image_from_data_url
+    from .key_pool import get_key_pool, is_rate_limit_error, is_server_error
+    from .log_context import logged_tool, setup_logging, stage
+    from .profiling import last_profile_summary, profiled_tool
+    from .prompt_similarity import get_prompt_index, reuse_mode
+    from .provider_router import ProviderRouter
+    from .text_batcher import TextBatcher
 except ImportError:
     # Fall back to absolute imports (when loaded as standalone module)
     from prompts import get_image_generation_prompt, get_image_transformation_prompt, get_translate_prompt
     from utils import save_image
+    from asset_registry import get_asset_registry
     from kie_client import get_kie_client
-
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    stream=sys.stderr
-)
+    from deadline import deadline_tool, with_timeout
+    from http_auth import BearerTokenMiddleware, is_loopback
+    from image_cache import get_source_image_cache
+    from image_upload import load_image_from_data_url
+    from key_pool import get_key_pool, is_rate_limit_error, is_server_error
+    from log_context import logged_tool, setup_logging, stage
+    from profiling import last_profile_summary, profiled_tool
+    from prompt_similarity import get_prompt_index, reuse_mode
+    from provider_router import ProviderRouter
+    from text_batcher import TextBatcher
+
+
+# Setup logging: records are queued and written to stderr by a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize MCP server
@@ -36,6 +56,17 @@ mcp = FastMCP("mcp-server-gemini-image-generator")
 
 # ==================== Gemini API Interaction ====================
 
+_gemini_clients: Dict[str, "genai.Client"] = {}
+
+
+def get_gemini_client(api_key: str) -> "genai.Client":
+    """Get the Gemini client for an API key, reusing its connection pool."""
+    client = _gemini_clients.get(api_key)
+    if client is None:
+        client = _gemini_clients[api_key] = genai.Client(api_key=api_key)
+    return client
+
+
 async def call_gemini(
     contents: List[Any], 
     model: str = "gemini-2.5-flash-image-preview", 
@@ -58,19 +89,31 @@ async def call_gemini(
         Exception: If there's an error calling the Gemini API
     """
     try:
-        # Initialize Gemini client
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set")
-            
-        client = genai.Client(api_key=api_key)
-        
-        # Generate content using Gemini
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=config
-        )
+        # Spread calls over the keys in GEMINI_API_KEYS (or the single GEMINI_API_KEY)
+        key_pool = get_key_pool("GEMINI")
+        attempts = len(key_pool)
+        for attempt in range(attempts):
+            async with key_pool.lease() as api_key:
+                try:
+                    client = get_gemini_client(api_key)
+                    
+                    # Generate content using Gemini; the async API stops the request on cancellation
+                    response = await client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config
+                    )
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        key_pool.mark_rate_limited(api_key)
+                        # Retry on the next least-loaded key
+                        if attempt + 1 < attempts:
+                            continue
+                    elif is_server_error(e):
+                        key_pool.mark_failure(api_key)
+                    raise
+                key_pool.mark_success(api_key)
+                break
         
         logger.info(f"Response received from Gemini API using model {model}")
         
@@ -90,6 +133,31 @@ async def call_gemini(
         raise
 
 
+# Concurrent text-only requests (translations, filenames) share Gemini calls
+text_batcher = TextBatcher(lambda prompt: with_timeout("text", call_gemini(prompt, text_only=True)))
+
+
+def _client_session_key() -> Optional[int]:
+    """Identify the MCP client session of the current tool call, if any."""
+    ctx = request_ctx.get(None)
+    return id(ctx.session) if ctx is not None else None
+
+
+async def call_gemini_text(prompt: str) -> str:
+    """Get a text answer from Gemini, batched with the same client's concurrent requests.
+    
+    Prompts from different client sessions are never combined, so over the
+    HTTP transports one client's prompts are not sent alongside another's.
+    
+    Args:
+        prompt: Self-contained text prompt
+        
+    Returns:
+        The text response from Gemini
+    """
+    return await text_batcher.submit(prompt, group=_client_session_key())
+
+
 # ==================== Text Utility Functions ====================
 
 async def convert_prompt_to_filename(prompt: str) -> str:
@@ -115,7 +183,8 @@ async def convert_prompt_to_filename(prompt: str) -> str:
         """
         
         # Call Gemini and get the filename
-        generated_filename = await call_gemini(filename_prompt, text_only=True)
+        with stage("filename"):
+            generated_filename = await with_timeout("filename", call_gemini_text(filename_prompt))
         logger.info(f"Generated filename: {generated_filename}")
         
         # Return the filename only, without path or extension
@@ -139,11 +208,11 @@ async def translate_prompt(text: str) -> str:
     """
     try:
         # Create a prompt for translation with strict intent preservation
-        prompt = get_translate_prompt(text)
+        prompt = get_translate_prompt(text, "English")
 
         # Call Gemini and get the translated prompt
-        translated_prompt = await call_gemini(prompt, text_only=True)
-        logger.info(f"Original prompt: {text}")
+        with stage("translate"):
+            translated_prompt = await with_timeout("translate", call_gemini_text(prompt))
         logger.info(f"Translated prompt: {translated_prompt}")
         
         return translated_prompt
@@ -156,6 +225,26 @@ async def translate_prompt(text: str) -> str:
 
 # ==================== Image Processing Functions ====================
 
+async def save_image_async(image_data: bytes, filename: str, **kwargs) -> str:
+    """Save an image from a worker thread.
+
+    Saving cannot be interrupted: a thread cannot be stopped halfway, so if
+    the call is cancelled (or its request deadline passes) the file is still
+    written and registered before the cancellation propagates. Nothing is
+    left half-saved, and nothing is written after the tool has returned.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(save_image, image_data, filename, **kwargs))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        while not task.done():
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                continue
+        raise
+
+
 async def process_image_with_gemini(
     contents: List[Any], 
     prompt: str, 
@@ -172,19 +261,21 @@ async def process_image_with_gemini(
         Path to the saved image file
     """
     # Call Gemini Vision API
-    gemini_response = await call_gemini(
-        contents,
-        model=model,
-        config=types.GenerateContentConfig(
-            response_modalities=['Text', 'Image']
-        )
-    )
+    with stage("gemini"):
+        gemini_response = await with_timeout("gemini", call_gemini(
+            contents,
+            model=model,
+            config=types.GenerateContentConfig(
+                response_modalities=['Text', 'Image']
+            )
+        ))
     
     # Generate a filename for the image
     filename = await convert_prompt_to_filename(prompt)
     
     # Save the image and return the path
-    saved_image_path = await save_image(gemini_response, filename)
+    with stage("save"):
+        saved_image_path = await save_image_async(gemini_response, filename, prompt=prompt, provider="gemini")
 
     return gemini_response, saved_image_path
 
@@ -205,7 +296,7 @@ async def process_image_transform(
         Path to the transformed image file
     """
     # Create prompt for image transformation
-    edit_instructions = get_image_transformation_prompt(optimized_edit_prompt)
+    edit_instructions = get_image_transformation_prompt("image", optimized_edit_prompt)
     
     # Process with Gemini and return the result
     return await process_image_with_gemini(
@@ -217,29 +308,28 @@ async def process_image_transform(
 async def load_image_from_base64(encoded_image: str) -> Tuple[PIL.Image.Image, str]:
     """Load an image from a base64-encoded string.
     
+    The header is checked against MAX_UPLOAD_BYTES and MAX_UPLOAD_PIXELS
+    before the image is decoded, and decoding runs in a worker thread.
+    
     Args:
         encoded_image: Base64 encoded image data with header
         
     Returns:
         Tuple containing the PIL Image object and the image format
+
+    Raises:
+        ValueError: If the upload is malformed, unrecognised, larger than
+            MAX_UPLOAD_BYTES or over MAX_UPLOAD_PIXELS; the size and pixel
+            messages ("Image is larger than the N byte upload limit", "Image
+            is WxH pixels; the limit is N pixels") are returned to the client
     """
-    if not encoded_image.startswith('data:image/'):
-        raise ValueError("Invalid image format. Expected data:image/[format];base64,[data]")
-    
     try:
-        # Extract the base64 data from the data URL
-        image_format, image_data = encoded_image.split(';base64,')
-        image_format = image_format.replace('data:', '')  # Get the MIME type e.g., "image/png"
-        image_bytes = base64.b64decode(image_data)
-        source_image = PIL.Image.open(BytesIO(image_bytes))
+        source_image, image_format = await asyncio.to_thread(load_image_from_data_url, encoded_image)
         logger.info(f"Successfully loaded image with format: {image_format}")
         return source_image, image_format
     except ValueError as e:
-        logger.error(f"Error: Invalid image data format: {str(e)}")
-        raise ValueError("Invalid image data format. Image must be in format 'data:image/[format];base64,[data]'")
-    except base64.binascii.Error as e:
-        logger.error(f"Error: Invalid base64 encoding: {str(e)}")
-        raise ValueError("Invalid base64 encoding. Please provide a valid base64 encoded image.")
+        logger.error(f"Error: {str(e)}")
+        raise
     except PIL.UnidentifiedImageError:
         logger.error("Error: Could not identify image format")
         raise ValueError("Could not identify image format. Supported formats include PNG, JPEG, GIF, WebP.")
@@ -248,19 +338,103 @@ async def load_image_from_base64(encoded_image: str) -> Tuple[PIL.Image.Image, s
         raise
 
 
+# ==================== Prompt Reuse ====================
+
+def _find_reusable_sync(prompt: str, image_size: str,
+                        output_format: Optional[str]) -> Optional[Tuple[Dict[str, Any], float]]:
+    matches = get_prompt_index().find_reusable(get_asset_registry(), prompt,
+                                               image_size=image_size, output_format=output_format)
+    return matches[0] if matches else None
+
+
+async def reuse_existing_image(prompt: str, reuse: Optional[str], image_size: str = "auto",
+                               output_format: Optional[str] = None) -> Optional[Union[str, Tuple[bytes, str]]]:
+    """Look for an existing image generated from a near-identical prompt.
+
+    Args:
+        prompt: Prompt as given by the caller
+        reuse: "off", "offer" or "return" (defaults to PROMPT_REUSE_MODE or "off")
+        image_size: Requested aspect ratio; "auto" accepts any
+        output_format: Requested format; None accepts any
+
+    Returns:
+        None to generate as usual; a message describing the match for "offer";
+        the existing image's data and path for "return"
+    """
+    mode = reuse_mode(reuse)
+    if mode == "off":
+        return None
+    with stage("reuse_lookup"):
+        match = await asyncio.to_thread(_find_reusable_sync, prompt, image_size, output_format)
+    if match is None:
+        return None
+    asset, similarity = match
+    if mode == "offer":
+        return (f"An existing image matches this prompt (similarity {similarity}): {asset['path']}\n"
+                f"Original prompt: {asset['prompt']}\n"
+                f"Call again with reuse=\"return\" to use it, or reuse=\"off\" to generate a new image.")
+    try:
+        image_data = await asyncio.to_thread(Path(asset["path"]).read_bytes)
+    except OSError as e:
+        logger.warning(f"Could not read reusable image {asset['path']}: {str(e)}; generating a new one")
+        return None
+    logger.info(f"Reusing {asset['path']} (similarity {similarity}) instead of generating")
+    return image_data, asset["path"]
+
+
+# ==================== Provider Routing ====================
+
+async def generate_with_gemini(prompt: str, **options) -> Tuple[bytes, Optional[str]]:
+    """Generate image bytes with Gemini (size and format options are not supported).
+
+    Gemini has no task ids, so the second element is always None.
+    """
+    image_data = await with_timeout("gemini", call_gemini(
+        [get_image_generation_prompt(prompt)],
+        config=types.GenerateContentConfig(
+            response_modalities=['Text', 'Image']
+        )
+    ))
+    return image_data, None
+
+
+async def generate_with_kie(prompt: str, output_format: str = "png",
+                            image_size: str = "auto") -> Tuple[bytes, Optional[str]]:
+    """Generate image bytes and their task id with KIE.ai's Nano Banana API."""
+    image_data, _, task_id = await get_kie_client().generate_image(
+        prompt=prompt,
+        output_format=output_format,
+        image_size=image_size
+    )
+    return image_data, task_id
+
+
+router = ProviderRouter({"gemini": generate_with_gemini, "kie": generate_with_kie})
+
+
 # ==================== MCP Tools ====================
 
 @mcp.tool()
-async def generate_image_from_text(prompt: str) -> Tuple[bytes, str]:
+@logged_tool
+@deadline_tool
+@profiled_tool
+async def generate_image_from_text(prompt: str, reuse: Optional[str] = None) -> Tuple[bytes, str]:
     """Generate an image based on the given text prompt using Google's Gemini model.
 
     Args:
         prompt: User's text prompt describing the desired image to generate
+        reuse: What to do when an earlier image came from a near-identical prompt:
+               "off" to always generate, "offer" to report the match instead of
+               generating, "return" to return the existing image
         
     Returns:
         Path to the generated image file using Gemini's image generation capabilities
     """
     try:
+        reused = await reuse_existing_image(prompt, reuse)
+        if reused is not None:
+            return reused
+        
         # Translate the prompt to English
         translated_prompt = await translate_prompt(prompt)
         
@@ -277,6 +451,9 @@ async def generate_image_from_text(prompt: str) -> Tuple[bytes, str]:
 
 
 @mcp.tool()
+@logged_tool
+@deadline_tool
+@profiled_tool
 async def transform_image_from_encoded(encoded_image: str, prompt: str) -> Tuple[bytes, str]:
     """Transform an existing image based on the given text prompt using Google's Gemini model.
 
@@ -293,7 +470,8 @@ async def transform_image_from_encoded(encoded_image: str, prompt: str) -> Tuple
         logger.info(f"Processing transform_image_from_encoded request with prompt: {prompt}")
 
         # Load and validate the image
-        source_image, _ = await load_image_from_base64(encoded_image)
+        with stage("decode"):
+            source_image, _ = await with_timeout("decode", load_image_from_base64(encoded_image))
         
         # Translate the prompt to English
         translated_prompt = await translate_prompt(prompt)
@@ -308,6 +486,9 @@ async def transform_image_from_encoded(encoded_image: str, prompt: str) -> Tuple
 
 
 @mcp.tool()
+@logged_tool
+@deadline_tool
+@profiled_tool
 async def transform_image_from_file(image_file_path: str, prompt: str) -> Tuple[bytes, str]:
     """Transform an existing image file based on the given text prompt using Google's Gemini model.
 
@@ -319,8 +500,7 @@ async def transform_image_from_file(image_file_path: str, prompt: str) -> Tuple[
         Path to the transformed image file saved on the server
     """
     try:
-        logger.info(f"Processing transform_image_from_file request with prompt: {prompt}")
-        logger.info(f"Image file path: {image_file_path}")
+        logger.info(f"Processing transform_image_from_file request for {image_file_path} with prompt: {prompt}")
 
         # Validate file path
         if not os.path.exists(image_file_path):
@@ -329,10 +509,13 @@ async def transform_image_from_file(image_file_path: str, prompt: str) -> Tuple[
         # Translate the prompt to English
         translated_prompt = await translate_prompt(prompt)
             
-        # Load the source image directly using PIL
+        # Load the source image, reusing the decoded copy from earlier edits of the same file
         try:
-            source_image = PIL.Image.open(image_file_path)
-            logger.info(f"Successfully loaded image from file: {image_file_path}")
+            cache = get_source_image_cache()
+            with stage("decode"):
+                source_image = await with_timeout("decode", asyncio.to_thread(cache.get, image_file_path))
+            logger.info(f"Successfully loaded image from file: {image_file_path} "
+                        f"({source_image.width}x{source_image.height}, cache hits: {cache.hits})")
         except PIL.UnidentifiedImageError:
             logger.error("Error: Could not identify image format")
             raise ValueError("Could not identify image format. Supported formats include PNG, JPEG, GIF, WebP.")
@@ -352,13 +535,18 @@ async def transform_image_from_file(image_file_path: str, prompt: str) -> Tuple[
 # ==================== KIE.ai Nano Banana Tools ====================
 
 @mcp.tool()
-async def generate_image_with_kie(prompt: str, output_format: str = "png", image_size: str = "auto") -> Tuple[bytes, str]:
+@logged_tool
+@deadline_tool
+@profiled_tool
+async def generate_image_with_kie(prompt: str, output_format: str = "png", image_size: str = "auto",
+                                  reuse: Optional[str] = None) -> Tuple[bytes, str]:
     """Generate an image using KIE.ai's Nano Banana API.
 
     Args:
         prompt: Text description of the image to generate
         output_format: Output format ("png" or "jpeg")
         image_size: Image size ("auto", "1:1", "3:4", "9:16", "4:3", "16:9")
+        reuse: "off", "offer" or "return" an earlier image from a near-identical prompt
         
     Returns:
         Tuple containing:
@@ -368,11 +556,15 @@ async def generate_image_with_kie(prompt: str, output_format: str = "png", image
     try:
         logger.info(f"Processing KIE.ai image generation request with prompt: {prompt}")
         
+        reused = await reuse_existing_image(prompt, reuse, image_size, output_format)
+        if reused is not None:
+            return reused
+        
         # Get KIE.ai client
         kie_client = get_kie_client()
         
         # Generate image using KIE.ai
-        image_data, image_url = await kie_client.generate_image(
+        image_data, image_url, task_id = await kie_client.generate_image(
             prompt=prompt,
             output_format=output_format,
             image_size=image_size
@@ -382,7 +574,11 @@ async def generate_image_with_kie(prompt: str, output_format: str = "png", image
         filename = await convert_prompt_to_filename(prompt)
         
         # Save the image and return the path
-        saved_image_path = await save_image(image_data, f"kie_{filename}")
+        with stage("save"):
+            saved_image_path = await save_image_async(
+                image_data, f"kie_{filename}", prompt=prompt, provider="kie", task_id=task_id,
+                metadata={"imageSize": image_size, "outputFormat": output_format}
+            )
         
         logger.info(f"KIE.ai image generated and saved to: {saved_image_path}")
         return image_data, saved_image_path
@@ -394,6 +590,9 @@ async def generate_image_with_kie(prompt: str, output_format: str = "png", image
 
 
 @mcp.tool()
+@logged_tool
+@deadline_tool
+@profiled_tool
 async def edit_image_with_kie(prompt: str, image_file_path: str, output_format: str = "png", image_size: str = "auto") -> Tuple[bytes, str]:
     """Edit an image using KIE.ai's Nano Banana API.
 
@@ -421,7 +620,7 @@ async def edit_image_with_kie(prompt: str, image_file_path: str, output_format:
         kie_client = get_kie_client()
         
         # Generate new image using KIE.ai
-        image_data, image_url = await kie_client.generate_image(
+        image_data, image_url, task_id = await kie_client.generate_image(
             prompt=prompt,
             output_format=output_format,
             image_size=image_size
@@ -431,7 +630,9 @@ async def edit_image_with_kie(prompt: str, image_file_path: str, output_format:
         filename = await convert_prompt_to_filename(prompt)
         
         # Save the image and return the path
-        saved_image_path = await save_image(image_data, f"kie_generated_{filename}")
+        with stage("save"):
+            saved_image_path = await save_image_async(image_data, f"kie_generated_{filename}", prompt=prompt,
+                                                      provider="kie", task_id=task_id)
         
         logger.info(f"KIE.ai image generated and saved to: {saved_image_path}")
         return image_data, saved_image_path
@@ -443,6 +644,9 @@ async def edit_image_with_kie(prompt: str, image_file_path: str, output_format:
 
 
 @mcp.tool()
+@logged_tool
+@deadline_tool
+@profiled_tool
 async def edit_image_with_kie_url(prompt: str, image_url: str, output_format: str = "png", image_size: str = "auto") -> Tuple[bytes, str]:
     """Edit an image using KIE.ai's Nano Banana API with a public image URL.
 
@@ -470,7 +674,7 @@ async def edit_image_with_kie_url(prompt: str, image_url: str, output_format: st
         kie_client = get_kie_client()
         
         # Generate new image using KIE.ai
-        image_data, result_url = await kie_client.generate_image(
+        image_data, result_url, task_id = await kie_client.generate_image(
             prompt=prompt,
             output_format=output_format,
             image_size=image_size
@@ -480,7 +684,9 @@ async def edit_image_with_kie_url(prompt: str, image_url: str, output_format: st
         filename = await convert_prompt_to_filename(prompt)
         
         # Save the image and return the path
-        saved_image_path = await save_image(image_data, f"kie_generated_{filename}")
+        with stage("save"):
+            saved_image_path = await save_image_async(image_data, f"kie_generated_{filename}", prompt=prompt,
+                                                      provider="kie", task_id=task_id)
         
         logger.info(f"KIE.ai image generated and saved to: {saved_image_path}")
         return image_data, saved_image_path
@@ -491,9 +697,150 @@ async def edit_image_with_kie_url(prompt: str, image_url: str, output_format: st
         return error_msg
 
 
+# ==================== Routed Generation ====================
+
+@mcp.tool()
+@logged_tool
+@deadline_tool
+@profiled_tool
+async def generate_image(prompt: str, hedge: bool = False, provider: str = "auto",
+                         output_format: str = "png", image_size: str = "auto",
+                         reuse: Optional[str] = None) -> Tuple[bytes, str]:
+    """Generate an image with whichever provider (Gemini or KIE.ai) is currently fastest.
+
+    Args:
+        prompt: Text description of the image to generate, in any language
+        hedge: Also start the other provider if the first is slower than its usual p95
+               latency, keeping whichever finishes first
+        provider: "auto" to route by latency and health, or "gemini" / "kie" to force one
+        output_format: Output format ("png" or "jpeg"; KIE.ai only)
+        image_size: Image size ("auto", "1:1", "3:4", "9:16", "4:3", "16:9"; KIE.ai only)
+        reuse: What to do when an earlier image came from a near-identical prompt:
+               "off" to always generate, "offer" to report the match instead of
+               generating, "return" to return the existing image
+               (defaults to PROMPT_REUSE_MODE or "off")
+        
+    Returns:
+        Tuple containing:
+        - Raw image data (bytes)
+        - Path to the saved image file (str)
+    """
+    try:
+        reused = await reuse_existing_image(prompt, reuse, image_size, output_format)
+        if reused is not None:
+            return reused
+        
+        translated_prompt = await translate_prompt(prompt)
+        
+        (image_data, task_id), provider_name = await router.generate(
+            translated_prompt,
+            hedge=hedge,
+            provider=None if provider == "auto" else provider,
+            output_format=output_format,
+            image_size=image_size
+        )
+        
+        filename = await convert_prompt_to_filename(prompt)
+        with stage("save"):
+            # Only KIE.ai honours the requested size and format
+            metadata = {"imageSize": image_size, "outputFormat": output_format} if provider_name == "kie" else None
+            saved_image_path = await save_image_async(image_data, f"{provider_name}_{filename}",
+                                                prompt=prompt, provider=provider_name, task_id=task_id,
+                                                metadata=metadata)
+        
+        logger.info(f"Image generated by {provider_name} and saved to: {saved_image_path}")
+        return image_data, saved_image_path
+        
+    except Exception as e:
+        error_msg = f"Error generating image: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+# ==================== Diagnostics ====================
+
+@mcp.tool()
+async def get_provider_stats() -> dict:
+    """Report the router's latency averages, p95 and error rates per provider.
+
+    Returns:
+        Provider name to latency (s), p95 (s), error rate, in-flight count and counters
+    """
+    return router.stats()
+
+
+@mcp.tool()
+async def get_last_profile(top_n: int = 25, sort: str = "cumulative") -> str:
+    """Summarize the most recent profiled tool call.
+
+    Profiling is enabled per tool with MCP_PROFILE_TOOLS (comma-separated
+    tool names, or "*" for all).
+
+    Args:
+        top_n: Number of functions and allocation sites to include
+        sort: pstats sort key ("cumulative", "tottime", "calls", ...)
+        
+    Returns:
+        Text summary of call duration, allocation growth and the slowest functions
+    """
+    try:
+        return await asyncio.to_thread(last_profile_summary, top_n, sort)
+    except Exception as e:
+        error_msg = f"Error reading profile: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+
+
 def main():
-    logger.info("Starting Gemini Image Generator MCP server...")
-    mcp.run(transport="stdio")
+    """Run the server over stdio, or over HTTP so many clients can share one process.
+
+    The transport, host and port come from --transport/--host/--port or the
+    MCP_TRANSPORT, MCP_HOST and MCP_PORT environment variables. The HTTP
+    transports require --auth-token (or MCP_AUTH_TOKEN) unless they listen
+    on a loopback address.
+    """
+    parser = argparse.ArgumentParser(description="Gemini and KIE.ai image generation MCP server")
+    parser.add_argument("--transport", default=os.environ.get("MCP_TRANSPORT", "stdio"),
+                        help=f"One of {', '.join(TRANSPORTS)} (default: stdio)")
+    parser.add_argument("--host", default=os.environ.get("MCP_HOST", "127.0.0.1"),
+                        help="Address to listen on for HTTP transports (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MCP_PORT", 8000)),
+                        help="Port to listen on for HTTP transports (default: 8000)")
+    parser.add_argument("--auth-token", default=os.environ.get("MCP_AUTH_TOKEN"),
+                        help="Bearer token HTTP clients must send (default: MCP_AUTH_TOKEN)")
+    args = parser.parse_args()
+
+    if args.transport not in TRANSPORTS:
+        parser.error(f"Unknown transport: {args.transport} (expected one of {', '.join(TRANSPORTS)})")
+
+    if args.transport == "stdio":
+        logger.info("Starting Gemini Image Generator MCP server on stdio...")
+        mcp.run(transport=args.transport)
+        logger.info("Server stopped")
+        return
+
+    # The tools read local files and report profiles, so never serve them unauthenticated to the network
+    if not args.auth_token and not is_loopback(args.host):
+        parser.error(f"Refusing to listen on {args.host} without --auth-token or MCP_AUTH_TOKEN")
+
+    import uvicorn
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    if args.transport == "sse":
+        app, path = mcp.sse_app(), mcp.settings.sse_path
+    else:
+        app, path = mcp.streamable_http_app(), mcp.settings.streamable_http_path
+    if args.auth_token:
+        app = BearerTokenMiddleware(app, args.auth_token)
+    else:
+        logger.warning("No MCP_AUTH_TOKEN set; any local process can call the tools")
+    logger.info(f"Starting Gemini Image Generator MCP server at http://{args.host}:{args.port}{path}")
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level=mcp.settings.log_level.lower())
     logger.info("Server stopped")
 
 if __name__ == "__main__":
@@ -0,0 +1,400 @@
+"""
+Precomputed sitemaps and JSON-LD structured data
+
+Builds ``sitemap.xml`` (a sitemap index), per-section URL sitemaps, image
+sitemaps and one JSON-LD document per page from the public/data
+collections:
+
+- static routes from ``navigation.json``
+- active products, published blog posts and blog categories
+- legal pages from ``pages.json``
+- ``structuredData`` blocks from ``seo-settings.json``
+
+Sitemaps are split into shards that stay under the protocol limits (50,000
+URLs and 50 MB uncompressed each). Output files are only rewritten when
+their content changes, and JSON-LD documents are only regenerated when the
+``updatedAt`` of their source records (or, for static routes, the document
+itself) changes. Those stamps are build state and are kept under the state
+directory (utils.get_state_dir), not in the deployed public/sitemaps.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+try:
+    from .image_references import html_image_sources
+    from .utils import get_public_dir, get_state_dir, write_text_atomic
+except ImportError:
+    from image_references import html_image_sources
+    from utils import get_public_dir, get_state_dir, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+DEFAULT_SITE_URL = "https://newindiatimber.com"
+
+SITE_NAME = "New India Timber"
+
+# Protocol limits per sitemap file
+MAX_URLS_PER_SITEMAP = 50000
+MAX_BYTES_PER_SITEMAP = 50 * 1024 * 1024
+
+# Routes of the entries in pages.json, keyed by slug
+PAGE_ROUTES = {
+    "terms-and-conditions": "/terms",
+    "privacy-policy": "/privacy-policy",
+    "refund-policy": "/refund",
+}
+
+# seo-settings.json "page" values whose route is not "/<page>"
+SEO_PAGE_ROUTES = {"home": "/"}
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+_SITEMAP_NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+_IMAGE_NS = 'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"'
+
+
+class SitemapEntry(NamedTuple):
+    """One page of the site."""
+    section: str
+    path: str
+    lastmod: Optional[str]
+    images: List[Tuple[str, str]]
+    jsonld: Optional[Dict[str, Any]]
+
+
+def get_site_url() -> str:
+    """Absolute site origin from SITE_URL (no trailing slash)."""
+    return os.environ.get("SITE_URL", DEFAULT_SITE_URL).rstrip("/")
+
+
+def _load(data_dir: Path, filename: str) -> List[Dict[str, Any]]:
+    path = data_dir / filename
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _absolute(site_url: str, url: str) -> str:
+    if url.startswith(("http://", "https://")):
+        return url
+    return site_url + quote(url if url.startswith("/") else "/" + url, safe="/?=&%:#")
+
+
+def _breadcrumbs(site_url: str, trail: List[Tuple[str, str]]) -> Dict[str, Any]:
+    return {
+        "@type": "BreadcrumbList",
+        "itemListElement": [
+            {"@type": "ListItem", "position": i, "name": name, "item": _absolute(site_url, path)}
+            for i, (name, path) in enumerate(trail, start=1)
+        ],
+    }
+
+
+def _graph(*nodes: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    graph = []
+    for node in nodes:
+        if not node:
+            continue
+        node = {k: v for k, v in node.items() if k != "@context"}
+        graph.append(node)
+    return {"@context": "https://schema.org", "@graph": graph}
+
+
+def _navigation_routes(items: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    routes = []
+    for item in items:
+        url = item.get("url") or ""
+        if (item.get("isVisible", True) and not item.get("isExternal")
+                and url.startswith("/") and "?" not in url and "#" not in url):
+            routes.append((url, item.get("label") or url))
+        routes.extend(_navigation_routes(item.get("children") or []))
+    return routes
+
+
+def _product_entry(site_url: str, product: Dict[str, Any]) -> SitemapEntry:
+    path = f"/products/{product['id']}"
+    images = [
+        (_absolute(site_url, image["url"]), image.get("altText") or product.get("name", ""))
+        for image in product.get("images", [])
+        if image.get("url") and image.get("isActive", True) and not image.get("isPlaceholder")
+    ]
+    pricing = (product.get("pricing") or {}).get("internalPricing") or {}
+    jsonld_product = {
+        "@type": "Product",
+        "@id": _absolute(site_url, path) + "#product",
+        "name": product.get("name"),
+        "description": product.get("description"),
+        "sku": product["id"],
+        "category": product.get("category"),
+        "brand": {"@type": "Brand", "name": SITE_NAME},
+        "image": [url for url, _ in images] or None,
+        "keywords": ", ".join((product.get("seo") or {}).get("keywords") or product.get("tags") or []) or None,
+    }
+    if pricing.get("basePrice"):
+        jsonld_product["offers"] = {
+            "@type": "Offer",
+            "price": pricing["basePrice"],
+            "priceCurrency": pricing.get("currency", "INR"),
+            "availability": "https://schema.org/InStock",
+            "url": _absolute(site_url, path),
+        }
+    jsonld_product = {k: v for k, v in jsonld_product.items() if v is not None}
+    breadcrumbs = _breadcrumbs(site_url, [("Home", "/"), ("Products", "/products"), (product.get("name", ""), path)])
+    return SitemapEntry("products", path, product.get("updatedAt"), images, _graph(jsonld_product, breadcrumbs))
+
+
+def _post_entry(site_url: str, post: Dict[str, Any]) -> SitemapEntry:
+    path = f"/blog/{post.get('slug') or post['id']}"
+    sources = [post.get("coverImage"), (post.get("seo") or {}).get("openGraphImage")]
+    sources += html_image_sources(post.get("content") or "")
+    images = []
+    for src in sources:
+        if src and not src.startswith("data:") and _absolute(site_url, src) not in [url for url, _ in images]:
+            images.append((_absolute(site_url, src), post.get("title", "")))
+    author = post.get("author") or {}
+    posting = {
+        "@type": "BlogPosting",
+        "@id": _absolute(site_url, path) + "#article",
+        "headline": post.get("title"),
+        "description": post.get("summary"),
+        "datePublished": post.get("publishedAt"),
+        "dateModified": post.get("updatedAt"),
+        "author": {"@type": "Organization" if "Team" in author.get("name", "") else "Person",
+                   "name": author.get("name") or SITE_NAME},
+        "publisher": {"@type": "Organization", "name": SITE_NAME, "url": site_url},
+        "image": [url for url, _ in images] or None,
+        "keywords": ", ".join(post.get("tags") or []) or None,
+        "mainEntityOfPage": _absolute(site_url, path),
+    }
+    posting = {k: v for k, v in posting.items() if v is not None}
+    breadcrumbs = _breadcrumbs(site_url, [("Home", "/"), ("Blog", "/blog"), (post.get("title", ""), path)])
+    structured = (post.get("seo") or {}).get("structuredData") or None
+    return SitemapEntry("blog", path, post.get("updatedAt"), images, _graph(posting, structured, breadcrumbs))
+
+
+def collect_entries(data_dir: Path, site_url: str) -> List[SitemapEntry]:
+    """Every indexable page, with its images and JSON-LD document."""
+    seo_by_route: Dict[str, Dict[str, Any]] = {}
+    for setting in _load(data_dir, "seo-settings.json"):
+        page = setting.get("page") or ""
+        seo_by_route[SEO_PAGE_ROUTES.get(page, f"/{page}")] = setting
+
+    entries: Dict[str, SitemapEntry] = {}
+
+    def add(entry: SitemapEntry) -> None:
+        setting = seo_by_route.get(entry.path)
+        if setting and setting.get("structuredData"):
+            jsonld = entry.jsonld or _graph()
+            jsonld["@graph"].insert(0, {k: v for k, v in setting["structuredData"].items() if k != "@context"})
+            lastmod = max(filter(None, [entry.lastmod, setting.get("updatedAt")]), default=None)
+            entry = entry._replace(jsonld=jsonld, lastmod=lastmod)
+        entries[entry.path] = entry
+
+    for product in _load(data_dir, "products.json"):
+        if product.get("isActive", True):
+            add(_product_entry(site_url, product))
+
+    for post in _load(data_dir, "blog-posts.json"):
+        if post.get("status") == "published":
+            add(_post_entry(site_url, post))
+
+    for category in _load(data_dir, "blog-categories.json"):
+        if category.get("isActive", True) and category.get("slug"):
+            path = f"/blog/category/{category['slug']}"
+            breadcrumbs = _breadcrumbs(site_url, [("Home", "/"), ("Blog", "/blog"), (category.get("name", ""), path)])
+            add(SitemapEntry("blog", path, category.get("updatedAt"), [], _graph(breadcrumbs)))
+
+    for page in _load(data_dir, "pages.json"):
+        slug = page.get("slug")
+        if not slug:
+            continue
+        path = PAGE_ROUTES.get(slug, f"/{slug}")
+        webpage = {"@type": "WebPage", "name": page.get("title"), "url": _absolute(site_url, path),
+                   "dateModified": page.get("lastUpdated") or page.get("updatedAt")}
+        add(SitemapEntry("pages", path, page.get("lastUpdated") or page.get("updatedAt"), [],
+                         _graph({k: v for k, v in webpage.items() if v}, _breadcrumbs(site_url, [("Home", "/"), (page.get("title", ""), path)]))))
+
+    # Static routes linked from the navigation menus
+    for menu in _load(data_dir, "navigation.json"):
+        for path, label in _navigation_routes(menu.get("items") or []):
+            if path in entries:
+                continue
+            trail = [("Home", "/")] if path == "/" else [("Home", "/"), (label, path)]
+            section = path.strip("/").split("/")[0] if path.startswith(("/products/", "/blog/")) else "pages"
+            add(SitemapEntry(section, path, None, [], _graph(_breadcrumbs(site_url, trail))))
+
+    for path, setting in seo_by_route.items():
+        if path not in entries:
+            add(SitemapEntry("pages", path, setting.get("updatedAt"), [], None))
+
+    return sorted(entries.values(), key=lambda entry: (entry.section, entry.path))
+
+
+def _lastmod(value: Optional[str]) -> str:
+    return f"<lastmod>{escape(value)}</lastmod>" if value else ""
+
+
+def _url_xml(site_url: str, entry: SitemapEntry, with_images: bool) -> str:
+    parts = [f"<url><loc>{escape(_absolute(site_url, entry.path))}</loc>{_lastmod(entry.lastmod)}"]
+    if with_images:
+        for url, title in entry.images:
+            parts.append(f"<image:image><image:loc>{escape(url)}</image:loc>"
+                         f"<image:title>{escape(title)}</image:title></image:image>")
+    parts.append("</url>")
+    return "".join(parts)
+
+
+def shard_sitemap(site_url: str, entries: List[SitemapEntry], with_images: bool = False,
+                  max_urls: int = MAX_URLS_PER_SITEMAP,
+                  max_bytes: int = MAX_BYTES_PER_SITEMAP) -> List[Tuple[str, Optional[str]]]:
+    """Render entries into one or more sitemap documents.
+
+    Returns:
+        List of (xml, newest lastmod) per shard
+    """
+    opening = f"{_XML_HEADER}<urlset {_SITEMAP_NS}{' ' + _IMAGE_NS if with_images else ''}>\n"
+    closing = "</urlset>\n"
+    shards: List[Tuple[str, Optional[str]]] = []
+    lines: List[str] = []
+    size = len(opening) + len(closing)
+    newest: Optional[str] = None
+
+    for entry in entries:
+        line = _url_xml(site_url, entry, with_images) + "\n"
+        line_size = len(line.encode("utf-8"))
+        if lines and (len(lines) >= max_urls or size + line_size > max_bytes):
+            shards.append((opening + "".join(lines) + closing, newest))
+            lines, size, newest = [], len(opening) + len(closing), None
+        lines.append(line)
+        size += line_size
+        if entry.lastmod and (newest is None or entry.lastmod > newest):
+            newest = entry.lastmod
+
+    if lines:
+        shards.append((opening + "".join(lines) + closing, newest))
+    return shards
+
+
+def route_key(path: str) -> str:
+    """File-name-safe key for a route, e.g. "/products/x" -> "products--x", "/" -> "home"."""
+    key = re.sub(r"[^A-Za-z0-9_-]+", "--", path.strip("/"))
+    return key or "home"
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_text_atomic(path, content)
+    return True
+
+
+def build_sitemaps(public_dir: Optional[Path] = None,
+                   site_url: Optional[str] = None,
+                   max_urls: int = MAX_URLS_PER_SITEMAP,
+                   force: bool = False,
+                   state_dir: Optional[Path] = None) -> Dict[str, int]:
+    """Write sitemap.xml, its shards and the per-page JSON-LD documents.
+
+    Args:
+        public_dir: Site public directory (defaults to get_public_dir())
+        site_url: Absolute site origin (defaults to SITE_URL)
+        max_urls: URLs per sitemap shard
+        force: Regenerate every JSON-LD document
+        state_dir: Where to keep the build state (defaults to get_state_dir())
+
+    Returns:
+        Counts of pages, sitemap shards, regenerated JSON-LD documents and
+        rewritten files
+    """
+    public_dir = Path(public_dir or get_public_dir())
+    site_url = (site_url or get_site_url()).rstrip("/")
+    data_dir = public_dir / "data"
+    sitemap_dir = public_dir / "sitemaps"
+    jsonld_dir = data_dir / "structured-data"
+
+    # JSON-LD stamps from the previous build, one file per site
+    tag = hashlib.sha256(str(public_dir.resolve()).encode("utf-8")).hexdigest()[:12]
+    state_dir = Path(state_dir or get_state_dir())
+    state_dir.mkdir(parents=True, exist_ok=True)
+    state_path = state_dir / f"sitemaps-{tag}.json"
+    state: Dict[str, Any] = {}
+    if state_path.exists() and not force:
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if loaded.get("version") == STATE_VERSION and loaded.get("siteUrl") == site_url:
+                state = loaded
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable sitemap state: {str(e)}")
+    stamps: Dict[str, str] = state.get("jsonld", {})
+
+    entries = collect_entries(data_dir, site_url)
+    written = 0
+
+    # Per-section URL sitemaps plus image sitemaps
+    sections: Dict[str, List[SitemapEntry]] = {}
+    for entry in entries:
+        sections.setdefault(entry.section, []).append(entry)
+    shard_files: List[Tuple[str, Optional[str]]] = []
+    for section, section_entries in sorted(sections.items()):
+        for i, (xml, newest) in enumerate(shard_sitemap(site_url, section_entries, max_urls=max_urls), start=1):
+            shard_files.append((f"sitemap-{section}-{i}.xml", newest))
+            written += _write_if_changed(sitemap_dir / shard_files[-1][0], xml)
+    with_images = [entry for entry in entries if entry.images]
+    for i, (xml, newest) in enumerate(shard_sitemap(site_url, with_images, with_images=True, max_urls=max_urls), start=1):
+        shard_files.append((f"sitemap-images-{i}.xml", newest))
+        written += _write_if_changed(sitemap_dir / shard_files[-1][0], xml)
+
+    current = {name for name, _ in shard_files}
+    for path in sitemap_dir.glob("sitemap-*.xml"):
+        if path.name not in current:
+            path.unlink()
+            written += 1
+
+    index_lines = [f"{_XML_HEADER}<sitemapindex {_SITEMAP_NS}>\n"]
+    for name, newest in shard_files:
+        index_lines.append(f"<sitemap><loc>{escape(site_url)}/sitemaps/{name}</loc>{_lastmod(newest)}</sitemap>\n")
+    index_lines.append("</sitemapindex>\n")
+    written += _write_if_changed(public_dir / "sitemap.xml", "".join(index_lines))
+
+    # JSON-LD documents, regenerated only when their source changed
+    regenerated = 0
+    new_stamps: Dict[str, str] = {}
+    manifest: Dict[str, str] = {}
+    for entry in entries:
+        if entry.jsonld is None:
+            continue
+        key = route_key(entry.path)
+        filename = f"{key}.json"
+        manifest[entry.path] = filename
+        # Pages without an update time are keyed by their content instead
+        stamp = entry.lastmod or hashlib.sha256(json.dumps(entry.jsonld, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        new_stamps[entry.path] = stamp
+        target = jsonld_dir / filename
+        if stamps.get(entry.path) == stamp and target.exists():
+            continue
+        written += _write_if_changed(target, json.dumps(entry.jsonld, indent=2, ensure_ascii=False) + "\n")
+        regenerated += 1
+
+    for path in jsonld_dir.glob("*.json"):
+        if path.name != "index.json" and path.name not in manifest.values():
+            path.unlink()
+            written += 1
+    if manifest:
+        written += _write_if_changed(jsonld_dir / "index.json", json.dumps(manifest, indent=2, ensure_ascii=False) + "\n")
+
+    sitemap_dir.mkdir(parents=True, exist_ok=True)
+    write_text_atomic(state_path, json.dumps({"version": STATE_VERSION, "siteUrl": site_url, "jsonld": new_stamps}))
+
+    return {"pages": len(entries), "sitemaps": len(shard_files), "jsonld": regenerated, "written": written}
@@ -0,0 +1,267 @@
+"""
+Quota-based cleanup of the generated-images directory
+
+Generated files are evicted least recently used first once they exceed an
+age limit or the directory exceeds a size quota. Files still in use are
+never touched: anything whose content is referenced from ``products.json``
+and any registered asset that belongs to a product, has published variants
+or is pinned (``metadata.pinned``). Blob-store objects that nothing links
+to any more are reclaimed the same way; a blob counts as linked while it
+has other hardlinks or any symlink in the output or public directory
+resolves to it.
+
+Instead of being deleted, evicted PNGs can be archived as lossless WebP
+under ``.archive/``, which typically shrinks them by a quarter to a half.
+Archived files keep the original's access and modification times, count
+against the quota and are evicted in least-recently-used order like any
+other file.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Union
+
+import PIL.Image
+
+try:
+    from .asset_registry import AssetRegistry
+    from .blob_store import hash_file
+    from .phash_index import IMAGE_EXTENSIONS
+    from .utils import get_file_mode, get_public_dir
+except ImportError:
+    from asset_registry import AssetRegistry
+    from blob_store import hash_file
+    from phash_index import IMAGE_EXTENSIONS
+    from utils import get_file_mode, get_public_dir
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = ".archive"
+
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def _hash_preserving_atime(path: Path) -> str:
+    # Reading the file for hashing must not make it look recently used
+    st = path.stat()
+    digest = hash_file(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return digest
+
+
+def parse_size(text: str) -> int:
+    """Parse a size such as "500M", "2G" or "1048576" into bytes."""
+    match = _SIZE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+class StoredFile(NamedTuple):
+    """A file under the output directory considered for eviction."""
+    path: Path
+    size: int
+    last_used: float
+    is_blob: bool
+
+
+class EvictionPlan(NamedTuple):
+    """Files selected for eviction and the resulting usage."""
+    evict: List[StoredFile]
+    protected: int
+    total_bytes: int
+    bytes_after: int
+
+
+class StorageManager:
+    """Applies a size and age quota to the generated-images directory."""
+
+    def __init__(self,
+                 output_dir: Union[str, Path],
+                 registry: Optional[AssetRegistry] = None,
+                 public_dir: Optional[Path] = None,
+                 max_bytes: Optional[int] = None,
+                 max_age_days: Optional[float] = None):
+        """Configure the manager.
+
+        Args:
+            output_dir: Directory holding generated images
+            registry: Asset registry consulted for files in use
+            public_dir: Site public directory (defaults to get_public_dir())
+            max_bytes: Size quota (defaults to OUTPUT_MAX_BYTES, e.g. "5G")
+            max_age_days: Age limit (defaults to OUTPUT_MAX_AGE_DAYS)
+        """
+        self.output_dir = Path(output_dir)
+        self.registry = registry
+        self.public_dir = Path(public_dir or get_public_dir())
+        if max_bytes is None and os.environ.get("OUTPUT_MAX_BYTES"):
+            max_bytes = parse_size(os.environ["OUTPUT_MAX_BYTES"])
+        if max_age_days is None and os.environ.get("OUTPUT_MAX_AGE_DAYS"):
+            max_age_days = float(os.environ["OUTPUT_MAX_AGE_DAYS"])
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+
+    def _symlinked_blobs(self, blob_root: Path) -> Set[Path]:
+        """Blob objects that a symlink in the output or public directory points to."""
+        targets: Set[Path] = set()
+        blob_root = blob_root.resolve()
+        for top in (self.output_dir, self.public_dir):
+            if not top.is_dir():
+                continue
+            for root, dirs, names in os.walk(top):
+                for name in names + dirs:
+                    path = Path(root) / name
+                    if not path.is_symlink():
+                        continue
+                    target = path.resolve()
+                    if blob_root in target.parents:
+                        targets.add(target)
+        return targets
+
+    def _scan(self) -> List[StoredFile]:
+        files = []
+        if not self.output_dir.is_dir():
+            return files
+        blob_root = self.output_dir / ".store" / "objects"
+        archive_root = self.output_dir / ARCHIVE_DIR
+        scanned_dirs = (blob_root.parent, blob_root, archive_root)
+        symlinked = self._symlinked_blobs(blob_root)
+        for root, dirs, names in os.walk(self.output_dir):
+            root_path = Path(root)
+            is_blob_dir = root_path == blob_root or blob_root in root_path.parents
+            if not is_blob_dir:
+                # Skip internal state (blob index, phash index), except blob objects and the archive
+                dirs[:] = [d for d in dirs if not d.startswith(".") or (root_path / d) in scanned_dirs]
+            for name in names:
+                path = root_path / name
+                if not is_blob_dir and (name.startswith(".") or path.suffix.lower() not in IMAGE_EXTENSIONS):
+                    continue
+                st = path.lstat()
+                if not path.is_file():
+                    continue
+                # Linked blobs are still published somewhere
+                if is_blob_dir and (st.st_nlink > 1 or path.resolve() in symlinked):
+                    continue
+                files.append(StoredFile(path, st.st_size, max(st.st_atime, st.st_mtime), is_blob_dir))
+        return files
+
+    def _protected(self, files: List[StoredFile]) -> Set[Path]:
+        """Paths that must never be evicted."""
+        referenced_hashes: Set[str] = set()
+        products_path = self.public_dir / "data" / "products.json"
+        if products_path.exists():
+            with open(products_path, "r", encoding="utf-8") as f:
+                products = json.load(f)
+            for product in products:
+                urls = [image.get("url") for image in product.get("images", [])] + [product.get("primaryImage")]
+                for url in urls:
+                    if not url or url.startswith(("http://", "https://", "data:")):
+                        continue
+                    path = self.public_dir / url.lstrip("/")
+                    if path.is_file():
+                        referenced_hashes.add(_hash_preserving_atime(path))
+
+        protected: Set[Path] = set()
+        if self.registry is not None:
+            assets = self.registry.all()
+            parents = {asset["parent_id"] for asset in assets if asset["parent_id"]}
+            for asset in assets:
+                if (asset["product_id"] or asset["id"] in parents or asset["metadata"].get("pinned")
+                        or asset["sha256"] in referenced_hashes):
+                    protected.add(Path(asset["path"]))
+
+        # Content referenced from products.json, matched by hash for unregistered files
+        for stored in files:
+            if stored.path.resolve() in protected:
+                continue
+            if stored.is_blob:
+                digest = stored.path.name
+            elif referenced_hashes:
+                digest = _hash_preserving_atime(stored.path)
+            else:
+                continue
+            if digest in referenced_hashes:
+                protected.add(stored.path.resolve())
+        return protected
+
+    def plan(self, now: Optional[float] = None) -> EvictionPlan:
+        """Choose the files to evict without touching anything.
+
+        Files past the age limit go first; then the least recently used
+        remaining files until the directory fits the size quota.
+        """
+        now = now or time.time()
+        files = self._scan()
+        protected = self._protected(files)
+        total = sum(f.size for f in files)
+
+        candidates = sorted((f for f in files if f.path.resolve() not in protected), key=lambda f: f.last_used)
+        evict: List[StoredFile] = []
+        remaining = total
+        for stored in candidates:
+            too_old = self.max_age_days is not None and now - stored.last_used > self.max_age_days * 86400
+            over_quota = self.max_bytes is not None and remaining > self.max_bytes
+            if not (too_old or over_quota):
+                continue
+            evict.append(stored)
+            remaining -= stored.size
+
+        return EvictionPlan(evict, len(protected), total, remaining)
+
+    def _archive(self, stored: StoredFile) -> Optional[Path]:
+        archive_dir = self.output_dir / ARCHIVE_DIR / time.strftime("%Y-%m")
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        target = archive_dir / f"{stored.path.stem}.webp"
+        tmp = archive_dir / f".{target.name}.tmp"
+        try:
+            with PIL.Image.open(stored.path) as img:
+                img.save(tmp, format="WEBP", lossless=True, method=6)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not archive {stored.path}: {str(e)}")
+            tmp.unlink(missing_ok=True)
+            return None
+        os.chmod(tmp, get_file_mode())
+        # Keep the original's times so the archive ages in LRU order with everything else
+        st = stored.path.stat()
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, target)
+        return target
+
+    def apply(self, plan: EvictionPlan, archive: bool = False) -> Dict[str, int]:
+        """Evict the planned files.
+
+        Args:
+            plan: Result of plan()
+            archive: Keep PNGs as lossless WebP under .archive/ instead of deleting them
+
+        Returns:
+            Counts of deleted and archived files and bytes freed
+        """
+        deleted = archived = freed = 0
+        for stored in plan.evict:
+            if archive and not stored.is_blob and stored.path.suffix.lower() == ".png":
+                target = self._archive(stored)
+                if target is None:
+                    continue
+                if self.registry is not None:
+                    old = self.registry.find_by_path(stored.path) or {}
+                    self.registry.register(
+                        target, prompt=old.get("prompt"), provider=old.get("provider"),
+                        task_id=old.get("task_id"), variant="archive",
+                        metadata={"archivedFrom": str(stored.path)},
+                    )
+                freed += stored.size - target.stat().st_size
+                archived += 1
+            else:
+                freed += stored.size
+                deleted += 1
+            stored.path.unlink()
+            if self.registry is not None and not stored.is_blob:
+                self.registry.remove(stored.path)
+            logger.info(f"Evicted {stored.path}")
+        return {"deleted": deleted, "archived": archived, "freed": freed}
@@ -0,0 +1,159 @@
+"""
+Micro-batching of text-only Gemini requests
+
+Translations and filename suggestions are short, independent text requests.
+Requests that arrive within a short window of each other are sent as one
+numbered prompt, and the model is asked for a JSON array with one answer
+per request. The answers are handed back to the callers that are waiting.
+A lone request is sent as is. If the batched reply cannot be parsed, each
+request is retried on its own, so batching never changes what a caller
+gets back.
+
+Requests are only batched with others of the same group; the server uses
+one group per client session, so one client's prompts are never sent to
+the model alongside another client's. Batching only helps when a client
+issues several tool calls concurrently; calls made one after another
+never share a window.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_MS = 50
+DEFAULT_MAX_BATCH = 20
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+_Pending = Tuple[str, "asyncio.Future[str]"]
+
+
+def build_batch_prompt(prompts: List[str]) -> str:
+    """Combine independent requests into one prompt asking for a JSON array of answers."""
+    sections = [
+        f"Answer each of the following {len(prompts)} requests independently.",
+        f"Reply with only a JSON array of exactly {len(prompts)} strings, where element i is the "
+        "complete answer to request i, exactly as you would have answered it on its own.",
+    ]
+    for i, prompt in enumerate(prompts, 1):
+        sections.append(f"Request {i}:\n<<<\n{prompt.strip()}\n>>>")
+    return "\n\n".join(sections)
+
+
+def parse_batch_answer(text: str, count: int) -> Optional[List[str]]:
+    """Parse the model's JSON array, or None if it does not hold count strings."""
+    try:
+        answers = json.loads(_FENCE.sub("", text.strip()))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count or not all(isinstance(a, str) for a in answers):
+        return None
+    return [answer.strip() for answer in answers]
+
+
+class TextBatcher:
+    """Collects concurrent text prompts and sends them as one request."""
+
+    def __init__(self,
+                 send: Callable[[str], Awaitable[str]],
+                 window_ms: Optional[float] = None,
+                 max_batch: Optional[int] = None):
+        """Configure the batcher.
+
+        Args:
+            send: Coroutine function sending one prompt and returning the text answer
+            window_ms: How long to wait for more requests (defaults to
+                       GEMINI_TEXT_BATCH_WINDOW_MS or 50; 0 disables batching)
+            max_batch: Largest batch (defaults to GEMINI_TEXT_BATCH_MAX or 20)
+        """
+        self.send = send
+        self.window = (window_ms if window_ms is not None else float(
+            os.environ.get("GEMINI_TEXT_BATCH_WINDOW_MS", DEFAULT_WINDOW_MS))) / 1000
+        self.max_batch = max(1, max_batch if max_batch is not None else int(
+            os.environ.get("GEMINI_TEXT_BATCH_MAX", DEFAULT_MAX_BATCH)))
+        self._pending: Dict[Hashable, List[_Pending]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.requests = 0
+        self.batches = 0
+
+    async def submit(self, prompt: str, group: Hashable = None) -> str:
+        """Queue a prompt and wait for its answer.
+
+        Cancelling the caller drops its prompt from the batch if the batch
+        has not been sent yet.
+
+        Args:
+            prompt: Self-contained text prompt
+            group: Only prompts of the same group share a request (e.g. one
+                   per client session, so clients never see each other's prompts)
+        """
+        if self.window <= 0:
+            return await self.send(prompt)
+
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[str]" = loop.create_future()
+        pending = self._pending.setdefault(group, [])
+        pending.append((prompt, future))
+        self.requests += 1
+        if len(pending) >= self.max_batch:
+            self._start_flush(group)
+        elif group not in self._timers:
+            # Run the flush outside the first caller's context (request id, deadline)
+            self._timers[group] = loop.call_later(self.window, self._start_flush, group,
+                                                  context=contextvars.Context())
+        return await future
+
+    def _start_flush(self, group: Hashable) -> None:
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(group, [])
+        if batch:
+            loop = asyncio.get_running_loop()
+            task = contextvars.Context().run(loop.create_task, self._flush(batch))
+            # The loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_one(self, prompt: str, future: "asyncio.Future[str]") -> None:
+        try:
+            answer = await self.send(prompt)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(answer)
+
+    async def _flush(self, batch: List[_Pending]) -> None:
+        batch = [(prompt, future) for prompt, future in batch if not future.done()]
+        if not batch:
+            return
+        self.batches += 1
+        if len(batch) == 1:
+            await self._send_one(*batch[0])
+            return
+
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            answers = parse_batch_answer(await self.send(build_batch_prompt(prompts)), len(batch))
+            if answers is None:
+                logger.warning(f"Could not parse the batched answer; sending {len(batch)} requests individually")
+        except Exception as e:
+            logger.warning(f"Batched text request failed ({str(e)}); sending {len(batch)} requests individually")
+            answers = None
+        if answers is None:
+            await asyncio.gather(*(self._send_one(prompt, future) for prompt, future in batch))
+            return
+
+        logger.info(f"Answered {len(batch)} text requests with one Gemini call")
+        for (_, future), answer in zip(batch, answers):
+            if not future.done():
+                future.set_result(answer)
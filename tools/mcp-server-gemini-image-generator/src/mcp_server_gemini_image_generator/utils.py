@@ -2,20 +2,100 @@
 Utility functions for image processing and file operations
 """
 
+import json
+import logging
 import os
+import tempfile
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 import PIL.Image
 from io import BytesIO
 
-def save_image(image_data: bytes, filename: Optional[str] = None, output_dir: Optional[str] = None) -> str:
-    """Save image data to file
+logger = logging.getLogger(__name__)
+
+def get_file_mode() -> int:
+    """Get the permission bits a plainly created file would receive
+    
+    tempfile.mkstemp() creates files as 0600; files that are renamed into
+    place afterwards are chmod-ed to this so the web server can still read them.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+def get_public_dir() -> Path:
+    """Get the site's public directory
+    
+    Returns:
+        Path from the PUBLIC_DIR_PATH environment variable, or the repository's
+        public/ directory when it is not set
+    """
+    public_dir = os.environ.get("PUBLIC_DIR_PATH")
+    if public_dir:
+        return Path(public_dir)
+    # src/mcp_server_gemini_image_generator -> tools/<server> -> repository root
+    return Path(__file__).resolve().parents[4] / "public"
+
+def get_state_dir() -> Path:
+    """Get the directory for build state that must not be deployed with the site
+    
+    Returns:
+        Path from the BUILD_STATE_DIR environment variable, or generated-images/.state
+        next to the server when it is not set
+    """
+    state_dir = os.environ.get("BUILD_STATE_DIR")
+    if state_dir:
+        return Path(state_dir)
+    # src/mcp_server_gemini_image_generator -> tools/<server>
+    return Path(__file__).resolve().parents[2] / "generated-images" / ".state"
+
+@contextmanager
+def file_lock(path: Union[str, Path]) -> Iterator[None]:
+    """Hold an exclusive lock on a lock file, across processes
+    
+    Args:
+        path: Lock file; created if missing and never removed
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def save_image(image_data: bytes, filename: Optional[str] = None, output_dir: Optional[str] = None,
+               prompt: Optional[str] = None, provider: Optional[str] = None,
+               task_id: Optional[str] = None, product_id: Optional[str] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Save image data to file and record it in the asset registry
     
     Args:
         image_data: Raw image data as bytes
         filename: Optional filename (will generate UUID if not provided)
         output_dir: Optional output directory (will use environment variable if not provided)
+        prompt: Prompt the image was generated from
+        provider: Image provider, e.g. "kie" or "gemini"
+        task_id: Provider task id
+        product_id: Catalog product the image belongs to
+        metadata: Extra fields stored with the asset, e.g. the requested image size
         
     Returns:
         Path to saved image file
@@ -37,13 +117,114 @@ def save_image(image_data: bytes, filename: Optional[str] = None, output_dir: Op
     if not filename.lower().endswith(('.png', '.jpg', '.jpeg')):
         filename += '.png'
     
-    # Save the image
+    # Save the image to a temporary file and swap it in. Writing in place would
+    # modify every hardlink that shares the old inode (see blob_store).
     file_path = output_path / filename
-    with open(file_path, 'wb') as f:
-        f.write(image_data)
+    fd, tmp_path = tempfile.mkstemp(dir=output_path, prefix=f".{filename}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image_data)
+        os.chmod(tmp_path, get_file_mode())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    
+    # A registry failure must not lose an image that was already paid for
+    try:
+        try:
+            from .asset_registry import get_asset_registry
+        except ImportError:
+            from asset_registry import get_asset_registry
+        get_asset_registry(output_path).register(
+            file_path, data=image_data, product_id=product_id, prompt=prompt,
+            provider=provider, task_id=task_id, metadata=metadata,
+        )
+    except Exception as e:
+        logger.warning(f"Could not register {file_path} in the asset registry: {str(e)}")
     
     return str(file_path)
 
+def prepare_json_write(path: Union[str, Path], data: Any) -> str:
+    """Serialize data next to a JSON file without replacing it yet
+    
+    The output matches the formatting of the files in public/data: two-space
+    indentation, non-ASCII kept as-is and the existing trailing newline (if any)
+    preserved.
+    
+    Args:
+        path: JSON file that will be replaced
+        data: JSON-serializable data
+        
+    Returns:
+        Path to the temporary file; pass it to os.replace() to commit
+    """
+    path = Path(path)
+    trailing_newline = False
+    if path.exists():
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                trailing_newline = f.read(1) == b'\n'
+    
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            if trailing_newline:
+                f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, path.stat().st_mode & 0o777 if path.exists() else get_file_mode())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+def write_json_files_atomic(files: Dict[Union[str, Path], Any]) -> None:
+    """Atomically write one or more JSON files
+    
+    Every file is fully written to a temporary sibling before any of them is
+    renamed into place, so a failure while writing leaves all of the
+    originals untouched. Each rename is atomic on its own, but the files are
+    renamed one after another: a concurrent reader may see some updated and
+    others not yet.
+    
+    Args:
+        files: Mapping of destination path to JSON-serializable data
+    """
+    pending = []
+    try:
+        for path, data in files.items():
+            pending.append((prepare_json_write(path, data), path))
+    except BaseException:
+        for tmp_path, _ in pending:
+            os.unlink(tmp_path)
+        raise
+    
+    for tmp_path, path in pending:
+        os.replace(tmp_path, path)
+
+def write_text_atomic(path: Union[str, Path], text: str) -> None:
+    """Replace a text file's content in one rename
+    
+    Args:
+        path: File to write
+        text: New content
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp_path, get_file_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
 def validate_image_data(image_data: bytes) -> bool:
     """Validate that the image data is a valid image
     
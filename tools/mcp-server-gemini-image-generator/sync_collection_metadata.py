@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Re-derive record counts and update times in public/data/_metadata.json
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.collection_store import CollectionStore
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Collection directory (default: repository public/data)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Show which collections are stale without writing")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    
+    store = CollectionStore(args.data_dir)
+    print(f"🗂️  Syncing {store.metadata_path}")
+    print("=" * 60)
+    
+    changed = store.sync_metadata(dry_run=args.dry_run)
+    
+    if not changed:
+        print("✅ Metadata already matches the collections")
+        return
+    
+    verb = "Would update" if args.dry_run else "Updated"
+    for name in changed:
+        entry = store.metadata["collections"][name]
+        print(f"📝 {verb}: {name} (count {entry['count']}, lastUpdated {entry['lastUpdated']})")
+
+if __name__ == "__main__":
+    main()
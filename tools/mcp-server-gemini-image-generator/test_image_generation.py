@@ -12,13 +12,13 @@ from pathlib import Path
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-from kie_client import get_kie_client
+from kie_client import close_kie_client, get_kie_client
 
 async def test_image_generation():
     """Test generating one image with KIE.ai API"""
     
     # Check if API key is set
-    if not os.environ.get("KIE_API_KEY"):
+    if not (os.environ.get("KIE_API_KEY") or os.environ.get("KIE_API_KEYS")):
         print("❌ KIE_API_KEY environment variable not set!")
         print("Please set your KIE.ai API key:")
         print("export KIE_API_KEY='your_api_key_here'")
@@ -40,7 +40,7 @@ async def test_image_generation():
         print(f"📝 Generating image with prompt: {prompt[:100]}...")
         
         # Generate the image
-        image_data, image_url = await client.generate_image(
+        image_data, image_url, task_id = await client.generate_image(
             prompt=prompt,
             output_format="png",
             image_size="16:9"
@@ -49,6 +49,7 @@ async def test_image_generation():
         print(f"✅ Image generated successfully!")
         print(f"📊 Image size: {len(image_data)} bytes")
         print(f"🔗 Image URL: {image_url}")
+        print(f"🆔 Task ID: {task_id}")
         
         # Save the image
         output_dir = Path(__file__).parent.parent / "generated-images"
@@ -64,6 +65,8 @@ async def test_image_generation():
     except Exception as e:
         print(f"❌ Error generating image: {str(e)}")
         return False
+    finally:
+        await close_kie_client()
 
 if __name__ == "__main__":
     # Run the test
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Record generated product images in public/data/products.json
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+# Add the src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from mcp_server_gemini_image_generator.catalog_writeback import products_with_real_images, write_back_images
+from mcp_server_gemini_image_generator.utils import get_public_dir
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--public-dir", type=Path, default=None,
+                        help="Site public directory (default: repository public/)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Show which products would change without writing")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    
+    public_dir = args.public_dir or get_public_dir()
+    print(f"🪵 Writing image metadata back to {public_dir / 'data' / 'products.json'}")
+    print("=" * 60)
+    
+    changed = write_back_images(public_dir, dry_run=args.dry_run)
+    
+    if not changed:
+        print("✅ All products already up to date")
+    else:
+        verb = "Would update" if args.dry_run else "Updated"
+        for product_id in changed:
+            print(f"📝 {verb}: {product_id}")
+    
+    if args.dry_run:
+        return
+    
+    # Catch discovery silently matching nothing: the catalog must end up showing real images
+    with open(public_dir / "data" / "products.json", "r", encoding="utf-8") as f:
+        products = json.load(f)
+    real = products_with_real_images(products, public_dir)
+    print(f"🖼️  {len(real)} of {len(products)} products show a real primary image")
+    if not real:
+        print("❌ No product has a real primary image; check the files under images/products")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()